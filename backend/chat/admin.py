@@ -1,5 +1,11 @@
 from django.contrib import admin
-from .models import Conversation, Message
+from .models import Conversation, ConversationParticipant, Message
+
+class ConversationParticipantInline(admin.TabularInline):
+    model = ConversationParticipant
+    raw_id_fields = ['user']
+    readonly_fields = ['last_read_message_id', 'unread_count']
+    extra = 0
 
 @admin.register(Conversation)
 class ConversationAdmin(admin.ModelAdmin):
@@ -7,7 +13,7 @@ class ConversationAdmin(admin.ModelAdmin):
     list_filter = ['created_at', 'last_message_at']
     search_fields = ['participants__username', 'participants__handle']
     readonly_fields = ['created_at', 'updated_at']
-    filter_horizontal = ['participants']
+    inlines = [ConversationParticipantInline]
     
     def get_participants(self, obj):
         return ', '.join([user.username for user in obj.participants.all()[:2]])
@@ -15,8 +21,8 @@ class ConversationAdmin(admin.ModelAdmin):
 
 @admin.register(Message)
 class MessageAdmin(admin.ModelAdmin):
-    list_display = ['id', 'conversation', 'sender', 'content_preview', 'created_at', 'is_read']
-    list_filter = ['created_at', 'is_read']
+    list_display = ['id', 'conversation', 'sender', 'content_preview', 'created_at']
+    list_filter = ['created_at']
     search_fields = ['content', 'sender__username', 'sender__handle']
     readonly_fields = ['created_at']
     raw_id_fields = ['conversation', 'sender']
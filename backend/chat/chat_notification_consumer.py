@@ -1,11 +1,12 @@
-import json
 from channels.generic.websocket import AsyncWebsocketConsumer
 from channels.db import database_sync_to_async
 from django.contrib.auth import get_user_model
+from core.consumers import FastJSONConsumerMixin, event_payload
+from core.presence import PresenceMixin
 
 User = get_user_model()
 
-class ChatNotificationConsumer(AsyncWebsocketConsumer):
+class ChatNotificationConsumer(PresenceMixin, FastJSONConsumerMixin, AsyncWebsocketConsumer):
     async def connect(self):
         if self.scope["user"].is_anonymous:
             await self.close()
@@ -19,8 +20,10 @@ class ChatNotificationConsumer(AsyncWebsocketConsumer):
                 self.channel_name
             )
             await self.accept()
+            await self.join_presence(self.scope["user"].id)
 
     async def disconnect(self, close_code):
+        await self.leave_presence()
         # Leave room group
         if hasattr(self, 'room_group_name'):
             await self.channel_layer.group_discard(
@@ -38,7 +41,5 @@ class ChatNotificationConsumer(AsyncWebsocketConsumer):
         """
         Receive chat notification from room group and send to WebSocket
         """
-        notification = event['notification']
-
-        # Send notification to WebSocket
-        await self.send(text_data=json.dumps(notification)) 
\ No newline at end of file
+        # Sent as encoded once by the sender (chat.consumers.broadcast_message)
+        await self.send_json(event_payload(event, 'notification')) 
\ No newline at end of file
@@ -1,12 +1,297 @@
-import json
+import asyncio
+import time
+
 from channels.generic.websocket import AsyncWebsocketConsumer
-from channels.db import database_sync_to_async
+from channels.layers import get_channel_layer
+from asgiref.sync import async_to_sync, sync_to_async
 from django.contrib.auth import get_user_model
-from .models import Conversation, Message
+from django.db import IntegrityError
+from core.consumers import FastJSONConsumerMixin
+from core.encoding import dumps
+from core.db import db_async
+from core.presence import PresenceMixin, online_user_ids
+from .models import Conversation, Message, bulk_create_messages, mark_read_through
 
 User = get_user_model()
 
-class ChatConsumer(AsyncWebsocketConsumer):
+# Messages accepted by one send_messages action
+MAX_BATCHED_MESSAGES = 50
+
+def batched_contents(contents):
+    """
+    The non-blank strings of a send_messages ``contents`` list, capped at
+    MAX_BATCHED_MESSAGES. Anything but a list is ignored, so a bare string
+    is not split into one message per character.
+    """
+    if not isinstance(contents, list):
+        return []
+    return [content for content in contents if isinstance(content, str) and content.strip()][:MAX_BATCHED_MESSAGES]
+
+
+def conversation_participant_ids(conversation_id):
+    """
+    Ids of the participants of a (not deleted) conversation, resolved with
+    one query against the participants table. Consumers cache these at
+    connect and refresh them on participants_changed events.
+    """
+    through = Conversation.participants.through
+    return set(
+        through.objects.filter(
+            conversation_id=conversation_id, conversation__is_deleted=False
+        ).values_list('user_id', flat=True)
+    )
+
+
+def notify_participants_changed(conversation_ids):
+    """
+    Push the current participant ids of each conversation to its group, so
+    connected consumers refresh their cached membership
+    """
+    channel_layer = get_channel_layer()
+    for conversation_id in conversation_ids:
+        try:
+            async_to_sync(channel_layer.group_send)(
+                f"chat_{conversation_id}",
+                {
+                    'type': 'participants_changed',
+                    'conversation_id': conversation_id,
+                    'participant_ids': list(conversation_participant_ids(conversation_id))
+                }
+            )
+        except Exception as e:
+            print(f"❌ Error sending participants_changed for conversation {conversation_id}: {str(e)}")
+
+
+def message_payload(message):
+    """
+    WebSocket payload of a saved message
+    """
+    # Construct absolute URL for profile picture
+    profile_picture_url = None
+    if message.sender.profile_picture:
+        # Build absolute URL for profile picture
+        try:
+            profile_picture_url = f"http://localhost:8000{message.sender.profile_picture.url}"
+        except:
+            profile_picture_url = None
+    
+    return {
+        'id': message.id,
+        'content': message.content,
+        'sender': {
+            'id': message.sender.id,
+            'username': message.sender.username,
+            'handle': message.sender.handle,
+            'profile_picture': profile_picture_url
+        },
+        'created_at': message.created_at.isoformat(),
+        'is_read': message.is_read
+    }
+
+
+def create_message(conversation_id, user, content):
+    """
+    Save message to database and return its WebSocket payload. The caller has
+    already checked membership, so the conversation is not loaded: saving
+    costs the INSERT, the conversation's last message UPDATE and the unread
+    counters UPDATE.
+    """
+    try:
+        message = Message.objects.create(
+            conversation_id=conversation_id,
+            sender=user,
+            content=content
+        )
+        return message_payload(message)
+    except IntegrityError:
+        # The conversation was deleted since membership was cached
+        return None
+
+
+def create_messages(conversation_id, user, contents):
+    """
+    Save several messages with one INSERT (bulk_create_messages) and return
+    their WebSocket payloads, oldest first
+    """
+    try:
+        return [message_payload(message) for message in bulk_create_messages(conversation_id, user, contents)]
+    except IntegrityError:
+        # The conversation was deleted since membership was cached
+        return []
+
+
+def mark_message_read(conversation_id, user, message_id):
+    """
+    Mark the conversation as read up to a message (a single-row update of
+    the user's read watermark). Returns the new watermark, or None if it did
+    not move. ``message_id`` comes from the client; ids that are not
+    integers are ignored.
+    """
+    try:
+        message_id = int(message_id)
+    except (TypeError, ValueError):
+        return None
+    return mark_read_through(conversation_id, user, message_id)
+
+
+def member_group_name(conversation_id, user_id):
+    """
+    Group of one participant's connections to a conversation. Typing and
+    read-receipt events go to the other participants' groups only, so they
+    never travel back to the sender's own sockets.
+    """
+    return f"chat_{conversation_id}_user_{user_id}"
+
+
+async def broadcast_message(channel_layer, conversation_id, message, participant_ids):
+    """
+    Send a saved message to the conversation group and a chat notification
+    to each of the other participants that is online. Both frames are
+    encoded once here and forwarded as-is by every subscribed consumer.
+    """
+    await channel_layer.group_send(
+        f"chat_{conversation_id}",
+        {
+            'type': 'chat_message',
+            'conversation_id': conversation_id,
+            'text': dumps({'type': 'chat_message', 'message': message})
+        }
+    )
+
+    notification = dumps({
+        'conversation_id': conversation_id,
+        'sender': message['sender'],
+        'content': message['content'],
+        'created_at': message['created_at']
+    })
+    for participant_id in await sync_to_async(online_user_ids, thread_sensitive=False)(participant_ids):
+        # Send notification to each participant's global chat notification channel
+        await channel_layer.group_send(
+            f"chat_notifications_{participant_id}",
+            {'type': 'chat_notification', 'text': notification}
+        )
+
+
+async def broadcast_read_receipt(channel_layer, conversation_id, user_id, last_read_message_id, recipient_ids):
+    """Tell the other participants how far a participant has read"""
+    for recipient_id in recipient_ids:
+        await channel_layer.group_send(
+            member_group_name(conversation_id, recipient_id),
+            {
+                'type': 'read_receipt',
+                'conversation_id': conversation_id,
+                'user_id': user_id,
+                'last_read_message_id': last_read_message_id
+            }
+        )
+
+
+async def broadcast_typing(channel_layer, conversation_id, user, is_typing, recipient_ids):
+    for recipient_id in recipient_ids:
+        await channel_layer.group_send(
+            member_group_name(conversation_id, recipient_id),
+            {
+                'type': 'typing_indicator',
+                'conversation_id': conversation_id,
+                'user_id': user.id,
+                'username': user.username,
+                'is_typing': is_typing
+            }
+        )
+
+
+class TypingStateMixin:
+    """
+    Per-connection typing state for chat consumers.
+
+    Clients may send ``typing`` actions on every keystroke; the other
+    participants only hear about transitions between typing and stopped, at
+    most once per ``typing_min_interval`` seconds per conversation, and a
+    connection that sends nothing for ``typing_timeout`` seconds is reported
+    as stopped. Subclasses provide ``typing_recipients(conversation_id)``.
+    """
+    typing_min_interval = 1.0
+    typing_timeout = 5.0
+
+    def _typing_state(self, conversation_id):
+        if not hasattr(self, '_typing_states'):
+            self._typing_states = {}
+        state = self._typing_states.get(conversation_id)
+        if state is None:
+            state = self._typing_states[conversation_id] = {
+                'wanted': False, 'sent': False, 'sent_at': None, 'flush_task': None, 'timeout_task': None,
+            }
+        return state
+
+    async def update_typing(self, conversation_id, is_typing):
+        """Record a typing action; emits only if the reported state changes"""
+        state = self._typing_state(conversation_id)
+        state['wanted'] = bool(is_typing)
+        if state['timeout_task'] is not None:
+            state['timeout_task'].cancel()
+            state['timeout_task'] = None
+        if state['wanted']:
+            state['timeout_task'] = asyncio.ensure_future(self._typing_timed_out(conversation_id))
+        await self._flush_typing(conversation_id, state)
+
+    async def stop_typing(self, conversation_id):
+        """
+        Report a stop right away, if typing was reported, and forget the
+        state (message sent, unsubscribed or disconnected)
+        """
+        state = getattr(self, '_typing_states', {}).pop(conversation_id, None)
+        if state is None:
+            return
+        for task in (state['flush_task'], state['timeout_task']):
+            if task is not None:
+                task.cancel()
+        if state['sent']:
+            state['wanted'] = False
+            await self._send_typing(conversation_id, state)
+
+    async def stop_all_typing(self):
+        for conversation_id in list(getattr(self, '_typing_states', {})):
+            await self.stop_typing(conversation_id)
+
+    async def _typing_timed_out(self, conversation_id):
+        await asyncio.sleep(self.typing_timeout)
+        state = self._typing_states.get(conversation_id)
+        if state is not None:
+            state['timeout_task'] = None
+            state['wanted'] = False
+            await self._flush_typing(conversation_id, state)
+
+    async def _flush_typing(self, conversation_id, state):
+        if state['wanted'] == state['sent'] or state['flush_task'] is not None:
+            # Nothing to report, or a flush is already scheduled (it reads the latest state)
+            return
+        wait = 0 if state['sent_at'] is None else state['sent_at'] + self.typing_min_interval - time.monotonic()
+        if wait > 0:
+            state['flush_task'] = asyncio.ensure_future(self._delayed_typing_flush(conversation_id, wait))
+        else:
+            await self._send_typing(conversation_id, state)
+
+    async def _delayed_typing_flush(self, conversation_id, wait):
+        await asyncio.sleep(wait)
+        state = self._typing_states.get(conversation_id)
+        if state is not None:
+            state['flush_task'] = None
+            if state['wanted'] != state['sent']:
+                await self._send_typing(conversation_id, state)
+
+    async def _send_typing(self, conversation_id, state):
+        state['sent'] = state['wanted']
+        state['sent_at'] = time.monotonic()
+        try:
+            await broadcast_typing(
+                self.channel_layer, conversation_id, self.scope["user"], state['sent'],
+                self.typing_recipients(conversation_id)
+            )
+        except Exception as e:
+            print(f"❌ Error sending typing state for conversation {conversation_id}: {str(e)}")
+
+
+class ChatConsumer(PresenceMixin, TypingStateMixin, FastJSONConsumerMixin, AsyncWebsocketConsumer):
     async def connect(self):
 
         
@@ -17,27 +302,35 @@ class ChatConsumer(AsyncWebsocketConsumer):
         try:
             self.conversation_id = self.scope['url_route']['kwargs']['conversation_id']
             self.room_group_name = f"chat_{self.conversation_id}"
+            self.member_group_name = member_group_name(self.conversation_id, self.scope["user"].id)
             
-            # Check if user is a participant in this conversation
-            if await self.is_participant():
-                # Join room group
+            # Participant ids are resolved once here and kept current by
+            # participants_changed events, so messages need no membership lookups
+            self.participant_ids = await self.get_participant_ids()
+            if self.scope["user"].id in self.participant_ids:
+                # Join room group and this participant's group
                 await self.channel_layer.group_add(
                     self.room_group_name,
                     self.channel_name
                 )
+                await self.channel_layer.group_add(self.member_group_name, self.channel_name)
                 await self.accept()
+                await self.join_presence(self.scope["user"].id)
             else:
                 await self.close()
         except Exception as e:
             await self.close()
 
     async def disconnect(self, close_code):
+        await self.leave_presence()
         # Leave room group
         if hasattr(self, 'room_group_name'):
+            await self.stop_all_typing()
             await self.channel_layer.group_discard(
                 self.room_group_name,
                 self.channel_name
             )
+            await self.channel_layer.group_discard(self.member_group_name, self.channel_name)
 
     async def receive(self, text_data):
         """
@@ -45,7 +338,7 @@ class ChatConsumer(AsyncWebsocketConsumer):
         Handle sending chat messages and other actions.
         """
         try:
-            text_data_json = json.loads(text_data)
+            text_data_json = self.decode_json(text_data)
             action = text_data_json.get('action')
             
             if action == 'send_message':
@@ -53,172 +346,108 @@ class ChatConsumer(AsyncWebsocketConsumer):
 
                 if content.strip():
                     # Save message to database
+                    await self.stop_typing(self.conversation_id)
                     message = await self.save_message(content)
 
                     if message:
-                        # Send message to room group
-                        await self.channel_layer.group_send(
-                            self.room_group_name,
-                            {
-                                'type': 'chat_message',
-                                'message': {
-                                    'id': message['id'],
-                                    'content': message['content'],
-                                    'sender': message['sender'],
-                                    'created_at': message['created_at'],
-                                    'is_read': message['is_read']
-                                }
-                            }
+                        # Send message to room group and chat notifications to other participants
+                        await broadcast_message(
+                            self.channel_layer, self.conversation_id, message, self.other_participant_ids()
                         )
+                        
+            elif action == 'send_messages':
+                contents = batched_contents(text_data_json.get('contents'))
 
-                        # Send chat notification to other participants
-                        await self.send_chat_notification(message)
+                if contents:
+                    # Save the batch with one INSERT, then broadcast each message in order
+                    await self.stop_typing(self.conversation_id)
+                    messages = await self.save_messages(contents)
+                    for message in messages:
+                        await broadcast_message(
+                            self.channel_layer, self.conversation_id, message, self.other_participant_ids()
+                        )
                         
             elif action == 'typing':
                 is_typing = text_data_json.get('is_typing', False)
-                # Send typing indicator to room group
-                await self.channel_layer.group_send(
-                    self.room_group_name,
-                    {
-                        'type': 'typing_indicator',
-                        'user_id': self.scope["user"].id,
-                        'username': self.scope["user"].username,
-                        'is_typing': is_typing
-                    }
-                )
+                # Other participants only hear about typing state changes
+                await self.update_typing(self.conversation_id, is_typing)
                 
             elif action == 'mark_as_read':
                 message_id = text_data_json.get('message_id')
                 if message_id:
-                    await self.mark_message_as_read(message_id)
+                    last_read_message_id = await self.mark_message_as_read(message_id)
+                    if last_read_message_id:
+                        await broadcast_read_receipt(
+                            self.channel_layer, self.conversation_id, self.scope["user"].id, last_read_message_id,
+                            self.other_participant_ids()
+                        )
                     
-        except json.JSONDecodeError:
-            await self.send(text_data=json.dumps({
+        except self.JSONDecodeError:
+            await self.send_json({
                 'error': 'Invalid JSON format'
-            }))
+            })
 
     async def chat_message(self, event):
         """
         Receive chat message from room group
         """
-        message = event['message']
-
-        # Send message to WebSocket
-        await self.send(text_data=json.dumps({
-            'type': 'chat_message',
-            'message': message
-        }))
+        if 'text' in event:
+            # Encoded once by the sender (broadcast_message)
+            await self.send(text_data=event['text'])
+        else:
+            await self.send_json({'type': 'chat_message', 'message': event['message']})
 
     async def typing_indicator(self, event):
         """
-        Receive typing indicator from room group
+        Receive another participant's typing state from this participant's group
         """
-        # Don't send typing indicator to the user who is typing
-        if event['user_id'] != self.scope["user"].id:
-            await self.send(text_data=json.dumps({
-                'type': 'typing_indicator',
-                'user_id': event['user_id'],
-                'username': event['username'],
-                'is_typing': event['is_typing']
-            }))
+        await self.send_json({
+            'type': 'typing_indicator',
+            'user_id': event['user_id'],
+            'username': event['username'],
+            'is_typing': event['is_typing']
+        })
 
-    @database_sync_to_async
-    def is_participant(self):
+    async def read_receipt(self, event):
         """
-        Check if the current user is a participant in the conversation
+        Receive another participant's new read watermark from this participant's group
         """
-        try:
-            conversation = Conversation.objects.get(id=self.conversation_id)
-            is_participant = conversation.participants.filter(id=self.scope["user"].id).exists()
-            return is_participant
-        except Conversation.DoesNotExist:
-            return False
+        await self.send_json({
+            'type': 'read_receipt',
+            'user_id': event['user_id'],
+            'last_read_message_id': event['last_read_message_id']
+        })
 
-    @database_sync_to_async
-    def save_message(self, content):
+    async def participants_changed(self, event):
         """
-        Save message to database
+        Refresh the cached participant ids; a user removed from the
+        conversation is disconnected
         """
-        try:
-            conversation = Conversation.objects.get(id=self.conversation_id)
-            message = Message.objects.create(
-                conversation=conversation,
-                sender=self.scope["user"],
-                content=content
-            )
-            
-            # Construct absolute URL for profile picture
-            profile_picture_url = None
-            if message.sender.profile_picture:
-                # Build absolute URL for profile picture
-                try:
-                    profile_picture_url = f"http://localhost:8000{message.sender.profile_picture.url}"
-                except:
-                    profile_picture_url = None
-            
-            return {
-                'id': message.id,
-                'content': message.content,
-                'sender': {
-                    'id': message.sender.id,
-                    'username': message.sender.username,
-                    'handle': message.sender.handle,
-                    'profile_picture': profile_picture_url
-                },
-                'created_at': message.created_at.isoformat(),
-                'is_read': message.is_read
-            }
-        except Conversation.DoesNotExist:
-            return None
+        self.participant_ids = set(event['participant_ids'])
+        if self.scope["user"].id not in self.participant_ids:
+            await self.stop_all_typing()
+            await self.channel_layer.group_discard(self.room_group_name, self.channel_name)
+            await self.channel_layer.group_discard(self.member_group_name, self.channel_name)
+            await self.close()
 
-    @database_sync_to_async
-    def mark_message_as_read(self, message_id):
-        """
-        Mark a message as read
-        """
-        try:
-            message = Message.objects.get(
-                id=message_id,
-                conversation_id=self.conversation_id
-            )
-            # Only mark as read if the user is not the sender
-            if message.sender != self.scope["user"]:
-                message.is_read = True
-                message.save()
-                return True
-        except Message.DoesNotExist:
-            return False
-
-    async def send_chat_notification(self, message):
-        """
-        Send chat notification to other participants via global chat notification system
-        """
-        # Get other participants in the conversation
-        other_participants = await self.get_other_participants()
-        
-        for participant_id in other_participants:
-            # Send notification to each participant's global chat notification channel
-            await self.channel_layer.group_send(
-                f"chat_notifications_{participant_id}",
-                {
-                    'type': 'chat_notification',
-                    'notification': {
-                        'conversation_id': self.conversation_id,
-                        'sender': message['sender'],
-                        'content': message['content'],
-                        'created_at': message['created_at']
-                    }
-                }
-            )
+    def other_participant_ids(self):
+        return [user_id for user_id in self.participant_ids if user_id != self.scope["user"].id]
 
-    @database_sync_to_async
-    def get_other_participants(self):
-        """
-        Get other participants in the conversation (excluding current user)
-        """
-        try:
-            conversation = Conversation.objects.get(id=self.conversation_id)
-            other_participants = conversation.participants.exclude(id=self.scope["user"].id).values_list('id', flat=True)
-            return list(other_participants)
-        except Conversation.DoesNotExist:
-            return [] 
\ No newline at end of file
+    def typing_recipients(self, conversation_id):
+        return self.other_participant_ids()
+
+    @db_async
+    def get_participant_ids(self):
+        return conversation_participant_ids(self.conversation_id)
+
+    @db_async
+    def save_message(self, content):
+        return create_message(self.conversation_id, self.scope["user"], content)
+
+    @db_async
+    def save_messages(self, contents):
+        return create_messages(self.conversation_id, self.scope["user"], contents)
+
+    @db_async
+    def mark_message_as_read(self, message_id):
+        return mark_message_read(self.conversation_id, self.scope["user"], message_id)
@@ -0,0 +1,49 @@
+"""
+Keyset pagination of a conversation's messages.
+
+Pages are addressed by message ids: ``before_id`` returns the messages older
+than that message and ``after_id`` the ones newer than it, both compared on
+(created_at, id). The scan walks the partial (conversation, -created_at, -id)
+index on messages that are not deleted, so an old page costs the same as
+the newest one: there is no OFFSET and no COUNT.
+"""
+from django.db.models import Q, Subquery
+
+from .models import Message
+
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+
+def _cursor_created_at(conversation_id, message_id):
+    return Subquery(
+        Message.all_objects.filter(id=message_id, conversation_id=conversation_id).values('created_at')[:1]
+    )
+
+
+def message_page(conversation_id, before_id=None, after_id=None, limit=DEFAULT_PAGE_SIZE):
+    """
+    Return (messages, has_more): up to ``limit`` messages, newest first, and
+    whether more exist in the direction of the cursor (older without a
+    cursor or with ``before_id``, newer with ``after_id``)
+    """
+    messages = Message.objects.filter(conversation_id=conversation_id)
+    if after_id is not None:
+        created_at = _cursor_created_at(conversation_id, after_id)
+        messages = messages.filter(
+            Q(created_at__gt=created_at) | Q(created_at=created_at, id__gt=after_id)
+        ).order_by('created_at', 'id')
+    else:
+        if before_id is not None:
+            created_at = _cursor_created_at(conversation_id, before_id)
+            messages = messages.filter(
+                Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=before_id)
+            )
+        messages = messages.order_by('-created_at', '-id')
+
+    page = list(messages[:limit + 1])
+    has_more = len(page) > limit
+    page = page[:limit]
+    if after_id is not None:
+        page.reverse()
+    return page, has_more
@@ -0,0 +1,93 @@
+"""
+Batch loaders for conversation data used by the chat serializers (see core.loaders).
+"""
+from collections import defaultdict
+
+from core.loaders import register_loader
+from .models import Conversation, Message
+
+Participant = Conversation.participants.through
+
+
+@register_loader('chat.participants', default=list)
+def participants(keys, registry):
+    """Participant user ids of each conversation (their read watermarks come with them)"""
+    grouped = defaultdict(list)
+    watermarks = defaultdict(dict)
+    rows = Participant.objects.filter(conversation_id__in=keys).order_by('user_id').values_list(
+        'conversation_id', 'user_id', 'last_read_message_id'
+    )
+    for conversation_id, user_id, last_read_message_id in rows:
+        grouped[conversation_id].append(user_id)
+        watermarks[conversation_id][user_id] = last_read_message_id
+    read_watermarks = registry.named('chat.read_watermarks')
+    for conversation_id in keys:
+        read_watermarks.prime(conversation_id, watermarks.get(conversation_id, {}))
+    return grouped
+
+
+@register_loader('chat.read_watermarks', default=dict)
+def read_watermarks(keys, registry):
+    """{user_id: last_read_message_id} of the participants of each conversation"""
+    watermarks = defaultdict(dict)
+    rows = Participant.objects.filter(conversation_id__in=keys).values_list(
+        'conversation_id', 'user_id', 'last_read_message_id'
+    )
+    for conversation_id, user_id, last_read_message_id in rows:
+        watermarks[conversation_id][user_id] = last_read_message_id
+    return watermarks
+
+
+@register_loader('chat.last_message')
+def last_message(keys, registry):
+    latest_ids = Conversation.all_objects.filter(pk__in=keys).values('last_message_id')
+    messages = Message.objects.filter(pk__in=latest_ids)
+    return {message.conversation_id: message for message in messages}
+
+
+@register_loader('chat.unread_count', default=0)
+def unread_count(keys, registry):
+    if registry.viewer is None:
+        return {}
+    rows = Participant.objects.filter(
+        conversation_id__in=keys, user_id=registry.viewer.pk
+    ).values_list('conversation_id', 'unread_count')
+    return dict(rows)
+
+
+def prime_conversations(conversations, loaders):
+    """Queue participants, last messages and unread counts of a page of conversations"""
+    ids = [conversation.id for conversation in conversations]
+    _prime_last_messages(conversations, loaders)
+    for conversation in conversations:
+        if loaders.viewer is not None and hasattr(conversation, 'inbox_unread_count'):
+            # Annotated by chat.views.annotate_inbox
+            loaders.named('chat.unread_count').prime(conversation.id, conversation.inbox_unread_count)
+        prefetched = getattr(conversation, '_prefetched_objects_cache', {})
+        if 'participants' in prefetched:
+            user_ids = sorted(user.pk for user in prefetched['participants'])
+            loaders.named('chat.participants').prime(conversation.id, user_ids)
+    if loaders.viewer is not None:
+        loaders.named('chat.unread_count').defer_many(ids)
+
+    # The author cards of participants and last senders are needed right away
+    participant_ids = loaders.named('chat.participants').load_many(ids)
+    last_messages = loaders.named('chat.last_message').load_many(ids)
+    loaders.named('users.author_card').defer_many(user_id for user_ids in participant_ids for user_id in user_ids)
+    # Presence of the page's participants is one lookup (core.presence)
+    loaders.named('users.online').defer_many(user_id for user_ids in participant_ids for user_id in user_ids)
+    prime_messages([message for message in last_messages if message is not None], loaders)
+
+
+def _prime_last_messages(conversations, loaders):
+    """Seed the last messages from the conversations' last_message pointers"""
+    message_ids = [conversation.last_message_id for conversation in conversations]
+    messages = {message.id: message for message in loaders.for_model(Message).load_many(message_ids) if message}
+    for conversation in conversations:
+        loaders.named('chat.last_message').prime(conversation.id, messages.get(conversation.last_message_id))
+
+
+def prime_messages(messages, loaders):
+    """Queue the author cards of the senders and the read watermarks of a page of messages"""
+    loaders.named('users.author_card').defer_many(message.sender_id for message in messages)
+    loaders.named('chat.read_watermarks').defer_many(message.conversation_id for message in messages)
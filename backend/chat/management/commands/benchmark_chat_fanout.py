@@ -0,0 +1,92 @@
+import statistics
+import time
+
+from asgiref.sync import async_to_sync
+from channels.layers import InMemoryChannelLayer
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from chat.chat_notification_consumer import ChatNotificationConsumer
+from core.encoding import dumps
+
+GROUP = 'benchmark_chat_fanout'
+
+
+class Command(BaseCommand):
+    help = (
+        'Fan chat notifications out to the consumers of many local sockets in one group and compare '
+        'events encoded by each consumer with events encoded once by the sender'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--consumers', type=int, default=1000, help='Consumers subscribed to the group')
+        parser.add_argument('--broadcasts', type=int, default=20, help='Broadcasts timed per payload size')
+
+    def _payload(self, content_size):
+        # Shaped like chat.consumers.broadcast_message's notification of a message
+        return {
+            'conversation_id': 1,
+            'sender': {
+                'id': 1, 'username': 'benchmark_sender', 'handle': 'benchmark_sender',
+                'profile_picture': '/media/profile_pictures/benchmark_sender.png', 'is_verified': False,
+            },
+            'content': 'x' * content_size,
+            'created_at': timezone.now().isoformat(),
+        }
+
+    async def _fanout(self, layer, consumers, make_event, count):
+        timings = []
+        for _ in range(count):
+            start = time.perf_counter()
+            await layer.group_send(GROUP, make_event())
+            # What each subscribed socket's consumer does with the broadcast.
+            # The queues are drained directly: InMemoryChannelLayer.receive
+            # sweeps every channel for expired messages on each call, which
+            # would dwarf the delivery itself.
+            for consumer in consumers:
+                _, event = layer.channels[consumer.channel_name].get_nowait()
+                await consumer.chat_notification(event)
+            timings.append(time.perf_counter() - start)
+        return timings
+
+    async def _consumer(self, layer, frames):
+        consumer = ChatNotificationConsumer()
+        consumer.channel_layer = layer
+        consumer.channel_name = await layer.new_channel()
+
+        async def base_send(message):
+            frames.append(message)
+        consumer.base_send = base_send
+        await layer.group_add(GROUP, consumer.channel_name)
+        return consumer
+
+    async def _run(self, consumers, count):
+        layer = InMemoryChannelLayer()
+        frames = []
+        subscribed = [await self._consumer(layer, frames) for _ in range(consumers)]
+        try:
+            results = []
+            for size in (100, 4000):
+                payload = self._payload(size)
+                events = {
+                    'encoded by each consumer': lambda: {'type': 'chat_notification', 'notification': payload},
+                    'encoded once by the sender': lambda: {'type': 'chat_notification', 'text': dumps(payload)},
+                }
+                for name, make_event in events.items():
+                    results.append((size, name, await self._fanout(layer, subscribed, make_event, count)))
+                    frames.clear()
+            return results
+        finally:
+            await layer.flush()
+
+    def handle(self, *args, **options):
+        consumers = options['consumers']
+        results = async_to_sync(self._run)(consumers, options['broadcasts'])
+        self.stdout.write(f'{consumers} consumers in one group of an InMemoryChannelLayer')
+        for size, name, timings in results:
+            self.stdout.write(
+                f'{size:,}-character message, {name}: '
+                f'median {statistics.median(timings) * 1000:.1f} ms per broadcast, '
+                f'min {min(timings) * 1000:.1f} ms'
+            )
+        self.stdout.write(self.style.SUCCESS('Benchmark complete'))
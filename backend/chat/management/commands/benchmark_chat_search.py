@@ -0,0 +1,86 @@
+import random
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from chat.models import Conversation, ConversationParticipant, Message
+from chat.search import search_messages
+
+User = get_user_model()
+
+BATCH_SIZE = 5000
+
+
+class Command(BaseCommand):
+    help = 'Compare indexed message search with a substring scan on a generated corpus'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--messages', type=int, default=1_000_000, help='Messages in the generated corpus')
+        parser.add_argument('--conversations', type=int, default=500, help='Conversations, half of them with the searcher')
+        parser.add_argument('--vocabulary', type=int, default=20_000, help='Distinct words in the corpus')
+        parser.add_argument('--queries', type=int, default=200, help='Indexed searches per query')
+        parser.add_argument('--scans', type=int, default=3, help='Unindexed searches per query')
+
+    def _corpus(self, count, conversation_ids, sender_ids, vocabulary):
+        # Word frequencies follow Zipf's law, like natural text
+        words = [f'word{rank}' for rank in range(vocabulary)]
+        weights = [1 / (rank + 1) for rank in range(vocabulary)]
+        for offset in range(0, count, BATCH_SIZE):
+            Message.objects.bulk_create([
+                Message(
+                    conversation_id=random.choice(conversation_ids),
+                    sender_id=random.choice(sender_ids),
+                    content=' '.join(random.choices(words, weights, k=random.randint(3, 20))),
+                )
+                for _ in range(min(BATCH_SIZE, count - offset))
+            ])
+            self.stdout.write(f'\rGenerated {min(offset + BATCH_SIZE, count):,} messages', ending='')
+        self.stdout.write('')
+
+    def _rate(self, user, query, count, indexed):
+        start = time.perf_counter()
+        for _ in range(count):
+            hits, _ = search_messages(user, query, indexed=indexed)
+        return count / (time.perf_counter() - start), len(hits)
+
+    def handle(self, *args, **options):
+        random.seed(0)
+        # Run against throwaway users and leave the database untouched
+        with transaction.atomic():
+            searcher = User.objects.create_user(
+                username='benchmark_searcher', email='benchmark_searcher@example.com',
+                password='benchmark-password', handle='benchmark_searcher'
+            )
+            others = User.objects.bulk_create([
+                User(username=f'benchmark_peer{i}', email=f'benchmark_peer{i}@example.com', handle=f'benchmark_peer{i}')
+                for i in range(20)
+            ])
+            conversations = Conversation.objects.bulk_create([Conversation() for _ in range(options['conversations'])])
+            ConversationParticipant.objects.bulk_create(
+                [ConversationParticipant(conversation=c, user=random.choice(others)) for c in conversations]
+                + [ConversationParticipant(conversation=c, user=searcher) for c in conversations[::2]]
+            )
+            self._corpus(
+                options['messages'], [c.id for c in conversations],
+                [searcher.id] + [user.id for user in others], options['vocabulary']
+            )
+            self.stdout.write(f'Database: {connection.vendor}')
+
+            vocabulary = options['vocabulary']
+            queries = {
+                'common word': 'word1',
+                'rare word': f'word{vocabulary // 20}',
+                'two words': f'word5 word{vocabulary // 10}',
+            }
+            for name, query in queries.items():
+                indexed, hits = self._rate(searcher, query, options['queries'], True)
+                scanned, _ = self._rate(searcher, query, options['scans'], False)
+                self.stdout.write(
+                    f'{name} ({hits} hits on the first page): '
+                    f'indexed {indexed:,.1f} searches/s, scan {scanned:,.1f} searches/s'
+                )
+
+            transaction.set_rollback(True)
+        self.stdout.write(self.style.SUCCESS('Benchmark complete'))
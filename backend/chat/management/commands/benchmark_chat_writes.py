@@ -0,0 +1,51 @@
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from chat.consumers import create_message, create_messages
+from chat.models import Conversation
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = 'Measure message save throughput on the WebSocket path, one by one and batched'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--messages', type=int, default=2000, help='Messages saved per run')
+        parser.add_argument('--batch-size', type=int, default=20, help='Messages per batched insert')
+
+    def handle(self, *args, **options):
+        count = options['messages']
+        batch_size = options['batch_size']
+        # Run against throwaway users and leave the database untouched
+        with transaction.atomic():
+            sender = User.objects.create_user(
+                username='benchmark_sender', email='benchmark_sender@example.com',
+                password='benchmark-password', handle='benchmark_sender'
+            )
+            recipient = User.objects.create_user(
+                username='benchmark_recipient', email='benchmark_recipient@example.com',
+                password='benchmark-password', handle='benchmark_recipient'
+            )
+            conversation = Conversation.objects.create()
+            conversation.participants.add(sender, recipient)
+
+            start = time.perf_counter()
+            for i in range(count):
+                create_message(conversation.id, sender, f'Message {i}')
+            single = count / (time.perf_counter() - start)
+            self.stdout.write(f'One by one: {single:,.0f} messages/s')
+
+            start = time.perf_counter()
+            for offset in range(0, count, batch_size):
+                create_messages(conversation.id, sender, [
+                    f'Message {i}' for i in range(offset, min(offset + batch_size, count))
+                ])
+            batched = count / (time.perf_counter() - start)
+            self.stdout.write(f'Batches of {batch_size}: {batched:,.0f} messages/s')
+
+            transaction.set_rollback(True)
+        self.stdout.write(self.style.SUCCESS('Benchmark complete'))
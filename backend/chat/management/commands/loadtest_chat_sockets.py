@@ -0,0 +1,101 @@
+import asyncio
+import statistics
+import time
+
+from asgiref.sync import async_to_sync
+from channels.routing import URLRouter
+from channels.testing import WebsocketCommunicator
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.test.utils import override_settings
+from django.urls import path
+
+from chat.consumers import ChatConsumer
+from chat.models import Conversation, ConversationParticipant
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = (
+        'Drive concurrent chat sockets in process and compare round trips with consumer database '
+        'work on the thread-sensitive executor and on the DB_EXECUTOR_WORKERS pool'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sockets', type=int, default=50, help='Concurrent sockets, one conversation each')
+        parser.add_argument('--round-trips', type=int, default=20, help='Round trips of each socket')
+        parser.add_argument('--workers', type=int, default=8, help='Database threads for the pooled run')
+        parser.add_argument(
+            '--workload', choices=['messages', 'connects'], default='messages',
+            help='Round trips measured: sending a message (writes) or opening a socket (membership read)'
+        )
+
+    async def _connect(self, application, user, conversation_id):
+        communicator = WebsocketCommunicator(application, f'/ws/chat/{conversation_id}/')
+        communicator.scope['user'] = user
+        connected, _ = await communicator.connect(timeout=60)
+        if not connected:
+            raise RuntimeError(f'Socket of {user.username} was refused')
+        return communicator
+
+    async def _connects(self, application, user, conversation_id, count, latencies):
+        for _ in range(count):
+            start = time.perf_counter()
+            communicator = await self._connect(application, user, conversation_id)
+            latencies.append(time.perf_counter() - start)
+            await communicator.disconnect()
+
+    async def _messages(self, application, user, conversation_id, count, latencies):
+        communicator = await self._connect(application, user, conversation_id)
+        for i in range(count):
+            start = time.perf_counter()
+            await communicator.send_json_to({'action': 'send_message', 'content': f'Load test message {i}'})
+            # The message comes back through the conversation group once saved
+            await communicator.receive_json_from(timeout=60)
+            latencies.append(time.perf_counter() - start)
+        await communicator.disconnect()
+
+    async def _run(self, client, users, conversations, count):
+        application = URLRouter([path('ws/chat/<int:conversation_id>/', ChatConsumer.as_asgi())])
+        latencies = []
+        start = time.perf_counter()
+        await asyncio.gather(*(
+            client(application, user, conversation.id, count, latencies)
+            for user, conversation in zip(users, conversations)
+        ))
+        return latencies, time.perf_counter() - start
+
+    def _report(self, name, latencies, elapsed):
+        latencies = sorted(latencies)
+        p95 = latencies[int(len(latencies) * 0.95) - 1]
+        self.stdout.write(
+            f'{name}: {len(latencies) / elapsed:,.0f} round trips/s, '
+            f'p50 {statistics.median(latencies) * 1000:.1f} ms, p95 {p95 * 1000:.1f} ms'
+        )
+
+    def handle(self, *args, **options):
+        sockets, count = options['sockets'], options['round_trips']
+        # Consumers write from other threads, so the data is committed and
+        # deleted afterwards instead of rolled back
+        users = User.objects.bulk_create([
+            User(username=f'loadtest_user{i}', email=f'loadtest_user{i}@example.com', handle=f'loadtest_user{i}')
+            for i in range(sockets + 1)
+        ])
+        peer, users = users[0], users[1:]
+        conversations = Conversation.objects.bulk_create([Conversation() for _ in users])
+        ConversationParticipant.objects.bulk_create(
+            [ConversationParticipant(conversation=c, user=user) for c, user in zip(conversations, users)]
+            + [ConversationParticipant(conversation=c, user=peer) for c in conversations]
+        )
+        client = self._messages if options['workload'] == 'messages' else self._connects
+        try:
+            self.stdout.write(f'{sockets} sockets x {count} {options["workload"]}')
+            for name, workers in (('thread-sensitive executor', 0), (f'{options["workers"]} database threads', options['workers'])):
+                with override_settings(DB_EXECUTOR_WORKERS=workers):
+                    latencies, elapsed = async_to_sync(self._run)(client, users, conversations, count)
+                self._report(name, latencies, elapsed)
+        finally:
+            Conversation.all_objects.filter(id__in=[c.id for c in conversations]).delete()
+            User.objects.filter(id__in=[peer.id] + [user.id for user in users]).delete()
+        self.stdout.write(self.style.SUCCESS('Load test complete'))
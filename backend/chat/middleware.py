@@ -1,19 +1,19 @@
 from django.contrib.auth.models import AnonymousUser
 from django.contrib.auth import get_user_model
 from channels.middleware import BaseMiddleware
-from channels.db import database_sync_to_async
 from rest_framework_simplejwt.tokens import AccessToken
 from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
 from urllib.parse import parse_qs
 import jwt
 from django.conf import settings
+from core.db import db_async
+from users.authentication import get_cached_user, get_local_user
 
 User = get_user_model()
 
-@database_sync_to_async
-def get_user_from_jwt(token_string):
+async def get_user_from_jwt(token_string):
     try:
-        # Decode the JWT token
+        # Decode the JWT token (signature and expiry checks only, no I/O)
         token = AccessToken(token_string)
         user_id = token.get('user_id')
         
@@ -21,7 +21,16 @@ def get_user_from_jwt(token_string):
             print(f"❌ JWT token missing user_id")
             return AnonymousUser()
         
-        user = User.objects.get(id=user_id)
+        # Cached per user (see users.authentication); only a miss of the
+        # in-process tier leaves the event loop
+        user = get_local_user(user_id)
+        if user is None:
+            user = await db_async(get_cached_user)(user_id)
+        if user is None:
+            raise User.DoesNotExist(f"User {user_id} does not exist")
+        if not user.is_active:
+            print(f"❌ User {user_id} is inactive")
+            return AnonymousUser()
 
         return user
         
@@ -0,0 +1,70 @@
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def read_state_from_is_read(apps, schema_editor):
+    """
+    Each participant's watermark becomes the newest message from someone
+    else that was marked read, and their unread count the messages from
+    others after it
+    """
+    ConversationParticipant = apps.get_model('chat', 'ConversationParticipant')
+    Message = apps.get_model('chat', 'Message')
+    others = Message.objects.filter(conversation_id=OuterRef('conversation_id')).exclude(sender_id=OuterRef('user_id'))
+    ConversationParticipant.objects.update(
+        last_read_message_id=Subquery(others.filter(is_read=True).order_by('-id').values('id')[:1])
+    )
+    unread = others.filter(
+        is_deleted=False, id__gt=Coalesce(OuterRef('last_read_message_id'), Value(0))
+    ).order_by().values('conversation_id').annotate(n=Count('pk')).values('n')
+    ConversationParticipant.objects.update(
+        unread_count=Coalesce(Subquery(unread, output_field=models.IntegerField()), Value(0))
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0002_conversation_deleted_at_conversation_is_deleted_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        # The auto-created participants table becomes the explicit through
+        # model; only the state changes, the table and its rows stay
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.CreateModel(
+                    name='ConversationParticipant',
+                    fields=[
+                        ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                        ('conversation', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='memberships', to='chat.conversation')),
+                        ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='conversation_memberships', to=settings.AUTH_USER_MODEL)),
+                    ],
+                    options={
+                        'db_table': 'chat_conversation_participants',
+                        'unique_together': {('conversation', 'user')},
+                    },
+                ),
+                migrations.AlterField(
+                    model_name='conversation',
+                    name='participants',
+                    field=models.ManyToManyField(related_name='conversations', through='chat.ConversationParticipant', to=settings.AUTH_USER_MODEL),
+                ),
+            ],
+        ),
+        migrations.AddField(
+            model_name='conversationparticipant',
+            name='last_read_message_id',
+            field=models.BigIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='conversationparticipant',
+            name='unread_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(read_state_from_is_read, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.1 on 2026-10-19 06:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0003_conversationparticipant'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='message',
+            index=models.Index(condition=models.Q(('is_deleted', False)), fields=['conversation', '-created_at', '-id'], name='chat_message_history_idx'),
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.1 on 2026-10-19 06:22
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def backfill_last_message(apps, schema_editor):
+    Conversation = apps.get_model('chat', 'Conversation')
+    Message = apps.get_model('chat', 'Message')
+    newest = Message.objects.filter(
+        conversation_id=OuterRef('pk'), is_deleted=False
+    ).order_by('-created_at', '-id')
+    Conversation.objects.update(last_message_id=Subquery(newest.values('id')[:1]))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0004_message_chat_message_history_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='conversation',
+            name='last_message',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='chat.message'),
+        ),
+        migrations.RunPython(backfill_last_message, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,78 @@
+# Generated by Django 5.2.1 on 2026-10-19 06:40
+
+from collections import defaultdict
+
+from django.db import migrations, models
+from django.db.models import Max, OuterRef, Subquery
+
+
+def merge_direct_conversations(apps, schema_editor):
+    """
+    Key every live one-to-one conversation by its user pair. Where a pair has
+    several, the oldest one keeps the key and the messages of the others,
+    which are then deleted. Conversations with a single participant left
+    (the other account was deleted) are not direct conversations of anyone
+    and stay unkeyed.
+    """
+    Conversation = apps.get_model('chat', 'Conversation')
+    ConversationParticipant = apps.get_model('chat', 'ConversationParticipant')
+    Message = apps.get_model('chat', 'Message')
+
+    members = defaultdict(set)
+    rows = ConversationParticipant.objects.filter(conversation__is_deleted=False).values_list('conversation_id', 'user_id')
+    for conversation_id, user_id in rows:
+        members[conversation_id].add(user_id)
+    pairs = defaultdict(list)
+    for conversation_id, user_ids in members.items():
+        if len(user_ids) == 2:
+            pairs[(min(user_ids), max(user_ids))].append(conversation_id)
+
+    for (low, high), conversation_ids in pairs.items():
+        keep, *duplicates = sorted(conversation_ids)
+        if duplicates:
+            Message.objects.filter(conversation_id__in=duplicates).update(conversation_id=keep)
+            for user_id in {low, high}:
+                # Whatever was read in any of the duplicates stays read
+                last_read = ConversationParticipant.objects.filter(
+                    conversation_id__in=conversation_ids, user_id=user_id
+                ).aggregate(last_read=Max('last_read_message_id'))['last_read']
+                unread = Message.objects.filter(conversation_id=keep, is_deleted=False).exclude(sender_id=user_id)
+                if last_read is not None:
+                    unread = unread.filter(id__gt=last_read)
+                ConversationParticipant.objects.filter(conversation_id=keep, user_id=user_id).update(
+                    last_read_message_id=last_read, unread_count=unread.count()
+                )
+            Conversation.objects.filter(id__in=duplicates).delete()
+            newest = Message.objects.filter(conversation_id=keep, is_deleted=False).order_by('-created_at', '-id')
+            Conversation.objects.filter(id=keep).update(
+                last_message_id=Subquery(newest.values('id')[:1]),
+                last_message_at=Subquery(
+                    Message.objects.filter(conversation_id=OuterRef('pk')).order_by('-created_at').values('created_at')[:1]
+                ),
+            )
+        Conversation.objects.filter(id=keep).update(dm_user_low=low, dm_user_high=high)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0005_conversation_last_message'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='conversation',
+            name='dm_user_high',
+            field=models.BigIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='conversation',
+            name='dm_user_low',
+            field=models.BigIntegerField(blank=True, null=True),
+        ),
+        migrations.RunPython(merge_direct_conversations, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='conversation',
+            constraint=models.UniqueConstraint(condition=models.Q(('dm_user_low__isnull', False), ('is_deleted', False)), fields=('dm_user_low', 'dm_user_high'), name='chat_conversation_dm_pair_uniq'),
+        ),
+    ]
@@ -0,0 +1,69 @@
+# Generated by Django 5.2.1 on 2026-10-19 09:10
+
+from django.db import migrations
+
+# Partial GIN index on the text of messages that are not deleted, matched by
+# chat.search; PostgreSQL keeps it current on every write
+POSTGRESQL_FORWARD = [
+    "CREATE INDEX chat_message_search_idx ON chat_message "
+    "USING GIN (to_tsvector('simple', content)) WHERE is_deleted = false",
+]
+POSTGRESQL_REVERSE = [
+    "DROP INDEX IF EXISTS chat_message_search_idx",
+]
+
+# External-content FTS5 table over the same messages, kept current by
+# triggers on inserts, deletes and updates (soft deletes and restores)
+SQLITE_FORWARD = [
+    "CREATE VIRTUAL TABLE chat_message_fts USING fts5(content, content='chat_message', content_rowid='id')",
+    """
+    CREATE TRIGGER chat_message_fts_insert AFTER INSERT ON chat_message WHEN new.is_deleted = 0 BEGIN
+        INSERT INTO chat_message_fts (rowid, content) VALUES (new.id, new.content);
+    END
+    """,
+    """
+    CREATE TRIGGER chat_message_fts_delete AFTER DELETE ON chat_message WHEN old.is_deleted = 0 BEGIN
+        INSERT INTO chat_message_fts (chat_message_fts, rowid, content) VALUES ('delete', old.id, old.content);
+    END
+    """,
+    """
+    CREATE TRIGGER chat_message_fts_update AFTER UPDATE OF content, is_deleted ON chat_message BEGIN
+        INSERT INTO chat_message_fts (chat_message_fts, rowid, content)
+            SELECT 'delete', old.id, old.content WHERE old.is_deleted = 0;
+        INSERT INTO chat_message_fts (rowid, content)
+            SELECT new.id, new.content WHERE new.is_deleted = 0;
+    END
+    """,
+    "INSERT INTO chat_message_fts (rowid, content) SELECT id, content FROM chat_message WHERE is_deleted = 0",
+]
+SQLITE_REVERSE = [
+    "DROP TRIGGER IF EXISTS chat_message_fts_update",
+    "DROP TRIGGER IF EXISTS chat_message_fts_delete",
+    "DROP TRIGGER IF EXISTS chat_message_fts_insert",
+    "DROP TABLE IF EXISTS chat_message_fts",
+]
+
+
+def _run(schema_editor, statements):
+    for statement in statements.get(schema_editor.connection.vendor, []):
+        schema_editor.execute(statement)
+
+
+def create_search_index(apps, schema_editor):
+    # Other databases search with an unindexed scan
+    _run(schema_editor, {'postgresql': POSTGRESQL_FORWARD, 'sqlite': SQLITE_FORWARD})
+
+
+def drop_search_index(apps, schema_editor):
+    _run(schema_editor, {'postgresql': POSTGRESQL_REVERSE, 'sqlite': SQLITE_REVERSE})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0006_conversation_dm_pair'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
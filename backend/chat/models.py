@@ -1,6 +1,10 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models.signals import m2m_changed
+from django.dispatch import receiver
 from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.core.exceptions import ValidationError
+from django.db.models.functions import Coalesce
 from django.utils import timezone
 import os
 import uuid
@@ -41,10 +45,18 @@ class Conversation(models.Model):
     """
     Model for chat conversations between users.
     """
-    participants = models.ManyToManyField(User, related_name='conversations')
+    participants = models.ManyToManyField(User, related_name='conversations', through='ConversationParticipant')
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     last_message_at = models.DateTimeField(null=True, blank=True)
+    # Newest message that is not deleted, maintained as messages are sent
+    last_message = models.ForeignKey(
+        'Message', null=True, blank=True, on_delete=models.SET_NULL, related_name='+'
+    )
+    # Canonical key of a one-to-one conversation: the two user ids, lowest
+    # first (empty for group conversations)
+    dm_user_low = models.BigIntegerField(null=True, blank=True)
+    dm_user_high = models.BigIntegerField(null=True, blank=True)
     
     # Soft delete fields
     is_deleted = models.BooleanField(default=False)
@@ -56,6 +68,14 @@ class Conversation(models.Model):
     
     class Meta:
         ordering = ['-last_message_at', '-created_at']
+        constraints = [
+            # One live direct conversation per pair of users
+            models.UniqueConstraint(
+                fields=['dm_user_low', 'dm_user_high'],
+                condition=models.Q(dm_user_low__isnull=False, is_deleted=False),
+                name='chat_conversation_dm_pair_uniq',
+            ),
+        ]
     
     def __str__(self):
         participant_names = ', '.join([user.username for user in self.participants.all()[:2]])
@@ -71,7 +91,8 @@ class Conversation(models.Model):
     
     def get_unread_count(self, user):
         """Get unread message count for a specific user"""
-        return self.messages.filter(is_read=False).exclude(sender=user).count()
+        membership = self.memberships.filter(user=user).values_list('unread_count', flat=True).first()
+        return membership or 0
     
     def soft_delete(self):
         """Soft delete this conversation by marking it as deleted"""
@@ -80,11 +101,37 @@ class Conversation(models.Model):
         self.save()
     
     def restore(self):
-        """Restore a soft-deleted conversation"""
+        """
+        Restore a soft-deleted conversation. A direct conversation cannot come
+        back while its pair has a live one, which holds the pair key.
+        """
+        if self.dm_user_low is not None and Conversation.objects.filter(
+            dm_user_low=self.dm_user_low, dm_user_high=self.dm_user_high
+        ).exclude(id=self.id).exists():
+            raise ValidationError('These users already have a direct conversation')
         self.is_deleted = False
         self.deleted_at = None
         self.save()
 
+class ConversationParticipant(models.Model):
+    """
+    Membership of a user in a conversation, with their read state: a
+    watermark (the last message they have read) and the number of messages
+    from others after it, maintained as messages are sent and read.
+    """
+    conversation = models.ForeignKey(Conversation, on_delete=models.CASCADE, related_name='memberships')
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='conversation_memberships')
+    last_read_message_id = models.BigIntegerField(null=True, blank=True)
+    unread_count = models.PositiveIntegerField(default=0)
+    
+    class Meta:
+        # The table of the former auto-created participants many-to-many
+        db_table = 'chat_conversation_participants'
+        unique_together = [('conversation', 'user')]
+    
+    def __str__(self):
+        return f'{self.user_id} in conversation {self.conversation_id}'
+
 class MessageManager(models.Manager):
     """Custom manager that excludes soft-deleted messages by default"""
     def get_queryset(self):
@@ -99,6 +146,8 @@ class Message(models.Model):
     content = models.TextField(blank=True)
     image = models.ImageField(upload_to=message_image_path, null=True, blank=True, storage=get_storage)
     created_at = models.DateTimeField(auto_now_add=True)
+    # Legacy two-party read flag, superseded by the participants' read
+    # watermarks (ConversationParticipant) and no longer written
     is_read = models.BooleanField(default=False)
     
     # Soft delete fields
@@ -111,24 +160,168 @@ class Message(models.Model):
     
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Keyset pages of a conversation's history (chat.history)
+            models.Index(
+                fields=['conversation', '-created_at', '-id'],
+                name='chat_message_history_idx',
+                condition=models.Q(is_deleted=False),
+            ),
+        ]
     
     def __str__(self):
         return f'{self.sender.username}: {self.content[:50]}'
     
     def save(self, *args, **kwargs):
-        # Update conversation's last_message_at when saving a message
+        # Only new messages touch the conversation (soft deletes and other
+        # updates are a single write)
+        adding = self._state.adding
         super().save(*args, **kwargs)
-        self.conversation.last_message_at = self.created_at
-        self.conversation.save()
+        if adding and record_new_messages(self, 1) and Message.conversation.is_cached(self):
+            self.conversation.last_message_at = self.created_at
+            self.conversation.last_message_id = self.id
+    
+    def _unread_by(self):
+        """Memberships of the other participants who have not read this message"""
+        return ConversationParticipant.objects.filter(conversation_id=self.conversation_id).exclude(
+            user_id=self.sender_id
+        ).filter(models.Q(last_read_message_id__lt=self.id) | models.Q(last_read_message_id__isnull=True))
     
     def soft_delete(self):
         """Soft delete this message by marking it as deleted"""
+        was_deleted = self.is_deleted
         self.is_deleted = True
         self.deleted_at = timezone.now()
         self.save()
+        if not was_deleted:
+            self._unread_by().filter(unread_count__gt=0).update(unread_count=models.F('unread_count') - 1)
+            # Point the conversation at the newest message left
+            newest = Message.objects.filter(conversation_id=self.conversation_id).order_by('-created_at', '-id')
+            Conversation.all_objects.filter(id=self.conversation_id, last_message_id=self.id).update(
+                last_message_id=models.Subquery(newest.values('id')[:1])
+            )
     
     def restore(self):
         """Restore a soft-deleted message"""
+        was_deleted = self.is_deleted
         self.is_deleted = False
         self.deleted_at = None
         self.save()
+        if was_deleted:
+            self._unread_by().update(unread_count=models.F('unread_count') + 1)
+            _advance_last_message(self)
+
+
+def get_or_create_direct_conversation(user, other_user):
+    """
+    The live one-to-one conversation of two users, created if needed.
+
+    The lookup is one probe of the dm pair key. Creation inserts with ON
+    CONFLICT DO NOTHING against the pair's unique constraint and then reads
+    the row back, so concurrent requests for the same pair end up with the
+    same conversation.
+    """
+    low, high = sorted((user.id, other_user.id))
+    conversation = Conversation.objects.filter(dm_user_low=low, dm_user_high=high).first()
+    if conversation:
+        return conversation
+    with transaction.atomic():
+        Conversation.objects.bulk_create([Conversation(dm_user_low=low, dm_user_high=high)], ignore_conflicts=True)
+        conversation = Conversation.objects.get(dm_user_low=low, dm_user_high=high)
+        ConversationParticipant.objects.bulk_create([
+            ConversationParticipant(conversation=conversation, user_id=user_id) for user_id in {low, high}
+        ], ignore_conflicts=True)
+    return conversation
+
+
+def _advance_last_message(message):
+    """
+    Make ``message`` the conversation's last message unless a newer one is
+    already recorded: a single conditional UPDATE, which leaves the row
+    alone when messages are saved out of order
+    """
+    newer = (
+        models.Q(last_message_at__isnull=True)
+        | models.Q(last_message_at__lt=message.created_at)
+        | models.Q(last_message_at=message.created_at, last_message_id__isnull=True)
+        | models.Q(last_message_at=message.created_at, last_message_id__lt=message.id)
+    )
+    return Conversation.all_objects.filter(newer, id=message.conversation_id).update(
+        last_message_at=message.created_at, last_message_id=message.id
+    )
+
+
+def record_new_messages(last_message, count):
+    """
+    Account for ``count`` new messages of one sender ending with
+    ``last_message``: advance the conversation's last message and add them to
+    the unread counters of everyone but the sender. Returns whether the
+    conversation's last message moved.
+    """
+    advanced = _advance_last_message(last_message)
+    ConversationParticipant.objects.filter(conversation_id=last_message.conversation_id).exclude(
+        user_id=last_message.sender_id
+    ).update(unread_count=models.F('unread_count') + count)
+    return bool(advanced)
+
+
+def bulk_create_messages(conversation_id, sender, contents):
+    """
+    Save several text messages from one sender with a single INSERT, and
+    account for them with the same two UPDATEs a single message costs.
+    Returns the messages, oldest first.
+    """
+    messages = Message.objects.bulk_create([
+        Message(conversation_id=conversation_id, sender=sender, content=content) for content in contents
+    ])
+    if messages:
+        record_new_messages(messages[-1], len(messages))
+    return messages
+
+
+def mark_read_through(conversation_id, user, message_id=None):
+    """
+    Move the user's read watermark in a conversation forward to
+    ``message_id`` (by default the latest message) and recount their unread
+    messages, as a single-row UPDATE. Returns the new watermark, or None when
+    it did not move (already read, or not a message of the conversation).
+    """
+    messages = Message.objects.filter(conversation_id=conversation_id)
+    if message_id is None:
+        message_id = messages.order_by('-id').values_list('id', flat=True).first()
+        if message_id is None:
+            return None
+    unread_after = messages.filter(id__gt=message_id).exclude(sender_id=user.id).order_by().values(
+        'conversation_id'
+    ).annotate(n=models.Count('pk')).values('n')
+    updated = ConversationParticipant.objects.filter(
+        models.Q(last_read_message_id__lt=message_id) | models.Q(last_read_message_id__isnull=True),
+        models.Exists(messages.filter(id=message_id)),
+        conversation_id=conversation_id, user_id=user.id,
+    ).update(
+        last_read_message_id=message_id,
+        unread_count=Coalesce(models.Subquery(unread_after, output_field=models.IntegerField()), 0),
+    )
+    return message_id if updated else None
+
+
+@receiver(m2m_changed, sender=Conversation.participants.through)
+def refresh_cached_participants(sender, instance, action, reverse, pk_set, **kwargs):
+    """
+    Chat consumers cache the participant ids of their conversation at
+    connect, so membership changes are pushed to them (chat.consumers)
+    """
+    from .consumers import notify_participants_changed
+    if action == 'pre_clear' and reverse:
+        # The user's conversations are only known before they are cleared
+        instance._cleared_conversation_ids = list(
+            sender.objects.filter(user_id=instance.pk).values_list('conversation_id', flat=True)
+        )
+    elif action in ('post_add', 'post_remove', 'post_clear'):
+        if not reverse:
+            conversation_ids = [instance.pk]
+        elif action == 'post_clear':
+            conversation_ids = getattr(instance, '_cleared_conversation_ids', [])
+        else:
+            conversation_ids = list(pk_set)
+        transaction.on_commit(lambda: notify_participants_changed(conversation_ids))
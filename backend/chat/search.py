@@ -0,0 +1,146 @@
+"""
+Full-text search over the messages of a user's conversations.
+
+The index only covers messages that are not deleted and is kept current by
+the database itself (migration 0007), so inserts, bulk inserts, soft deletes
+and restores need no application code:
+
+- PostgreSQL: a partial GIN index on ``to_tsvector('simple', content)``.
+- SQLite: an external-content FTS5 table, ``chat_message_fts``, maintained
+  by triggers on chat_message.
+
+Other databases fall back to a case-insensitive substring scan. Every word
+of the query must appear. Hits are returned newest first and paged with
+``before_id`` like the conversation history (chat.history).
+"""
+import html
+import re
+
+from django.db import connection
+
+from .models import Message
+
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 50
+
+# Private-use characters around matches in raw snippets; the content is
+# escaped before they become <mark> tags
+_MARK_START = '\ue000'
+_MARK_END = '\ue001'
+SNIPPET_WORDS = 12
+
+
+def search_terms(query):
+    """Words of a search query (punctuation and operators are ignored)"""
+    return re.findall(r'\w+', query)[:16]
+
+
+def render_snippet(snippet):
+    """HTML of a raw snippet: the message text escaped, matches in <mark>"""
+    return html.escape(snippet).replace(_MARK_START, '<mark>').replace(_MARK_END, '</mark>')
+
+
+def _scope_sql(conversation_id):
+    """Restriction to the live conversations of a user (and optionally one of them)"""
+    sql = """
+        m.conversation_id IN (
+            SELECT p.conversation_id FROM chat_conversation_participants p
+            JOIN chat_conversation c ON c.id = p.conversation_id
+            WHERE p.user_id = %s AND c.is_deleted = %s
+        )
+    """
+    if conversation_id is not None:
+        sql += ' AND m.conversation_id = %s'
+    return sql
+
+
+def _scope_params(user, conversation_id):
+    params = [user.id, False]
+    if conversation_id is not None:
+        params.append(conversation_id)
+    return params
+
+
+def _cursor(column, before_id):
+    if before_id is None:
+        return '', []
+    return f'AND {column} < %s', [before_id]
+
+
+def _postgresql_hits(terms, user, conversation_id, before_id, limit):
+    query = ' '.join(terms)
+    cursor_sql, cursor_params = _cursor('m.id', before_id)
+    # The literal is_deleted = false lets the planner use the partial index,
+    # and headlines are only computed for the page, outside the LIMIT
+    sql = f"""
+        SELECT hits.*, ts_headline(
+            'simple', hits.content, plainto_tsquery('simple', %s),
+            'StartSel={_MARK_START}, StopSel={_MARK_END}, MaxWords={SNIPPET_WORDS * 2}, MinWords={SNIPPET_WORDS // 2}'
+        ) AS snippet
+        FROM (
+            SELECT m.* FROM chat_message m
+            WHERE to_tsvector('simple', m.content) @@ plainto_tsquery('simple', %s)
+            AND m.is_deleted = false AND {_scope_sql(conversation_id)} {cursor_sql}
+            ORDER BY m.id DESC LIMIT %s
+        ) hits
+        ORDER BY hits.id DESC
+    """
+    params = [query, query, *_scope_params(user, conversation_id), *cursor_params, limit]
+    return Message.objects.raw(sql, params)
+
+
+def _sqlite_hits(terms, user, conversation_id, before_id, limit):
+    match = ' '.join(f'"{term}"' for term in terms)
+    cursor_sql, cursor_params = _cursor('chat_message_fts.rowid', before_id)
+    sql = f"""
+        SELECT m.*, snippet(chat_message_fts, 0, '{_MARK_START}', '{_MARK_END}', '…', {SNIPPET_WORDS}) AS snippet
+        FROM chat_message_fts JOIN chat_message m ON m.id = chat_message_fts.rowid
+        WHERE chat_message_fts MATCH %s AND {_scope_sql(conversation_id)} {cursor_sql}
+        ORDER BY chat_message_fts.rowid DESC LIMIT %s
+    """
+    params = [match, *_scope_params(user, conversation_id), *cursor_params, limit]
+    return Message.objects.raw(sql, params)
+
+
+def _scan_hits(terms, user, conversation_id, before_id, limit):
+    """Unindexed fallback: a case-insensitive substring scan"""
+    messages = Message.objects.filter(
+        conversation__participants=user, conversation__is_deleted=False
+    )
+    if conversation_id is not None:
+        messages = messages.filter(conversation_id=conversation_id)
+    if before_id is not None:
+        messages = messages.filter(id__lt=before_id)
+    for term in terms:
+        messages = messages.filter(content__icontains=term)
+    hits = list(messages.order_by('-id')[:limit])
+    for message in hits:
+        message.snippet = message.content
+    return hits
+
+
+def search_messages(user, query, conversation_id=None, before_id=None, limit=DEFAULT_PAGE_SIZE, indexed=True):
+    """
+    Return (messages, has_more): up to ``limit`` messages of the user's
+    conversations matching every word of ``query``, newest first, each with
+    a ``snippet`` of HTML around the matches. ``indexed=False`` forces the
+    unindexed scan (for comparison).
+    """
+    terms = search_terms(query)
+    if not terms:
+        return [], False
+    if not indexed:
+        find = _scan_hits
+    elif connection.vendor == 'postgresql':
+        find = _postgresql_hits
+    elif connection.vendor == 'sqlite':
+        find = _sqlite_hits
+    else:
+        find = _scan_hits
+
+    hits = list(find(terms, user, conversation_id, before_id, limit + 1))
+    has_more = len(hits) > limit
+    hits = hits[:limit]
+    for message in hits:
+        message.snippet = render_snippet(message.snippet)
+    return hits, has_more
@@ -1,9 +1,17 @@
 from rest_framework import serializers
 from django.contrib.auth import get_user_model
+from core.loaders import BatchingListSerializer, get_loaders
+from users.caching import render_author_card
+from users.serializers import AuthorCardField
 from .models import Conversation, Message
+from .history import message_page
+from .loaders import prime_conversations, prime_messages
 
 User = get_user_model()
 
+# Messages embedded in a conversation detail
+DETAIL_MESSAGES = 50
+
 class UserSerializer(serializers.ModelSerializer):
     profile_picture = serializers.SerializerMethodField()
     
@@ -18,74 +26,124 @@ class UserSerializer(serializers.ModelSerializer):
         return None
 
 class MessageSerializer(serializers.ModelSerializer):
-    sender = UserSerializer(read_only=True)
+    sender = AuthorCardField(source='sender_id')
     image_url = serializers.SerializerMethodField()
+    is_read = serializers.SerializerMethodField()
     
     class Meta:
         model = Message
         fields = ['id', 'content', 'image', 'image_url', 'sender', 'created_at', 'is_read']
         read_only_fields = ['created_at', 'sender']
+        list_serializer_class = BatchingListSerializer
+    
+    def prime_loaders(self, messages, loaders):
+        prime_messages(messages, loaders)
     
     def get_image_url(self, obj):
         request = self.context.get('request')
         if obj.image and hasattr(obj.image, 'url'):
             return request.build_absolute_uri(obj.image.url) if request else obj.image.url
         return None
+    
+    def get_is_read(self, obj):
+        # Read once every other participant's watermark has reached the message
+        watermarks = get_loaders(self.context).named('chat.read_watermarks').load(obj.conversation_id)
+        others = [last_read for user_id, last_read in watermarks.items() if user_id != obj.sender_id]
+        return bool(others) and all(last_read is not None and last_read >= obj.id for last_read in others)
 
-class ConversationSerializer(serializers.ModelSerializer):
-    participants = UserSerializer(many=True, read_only=True)
+class MessageSearchResultSerializer(MessageSerializer):
+    """A search hit: the message, its conversation and a highlighted snippet (chat.search)"""
+    conversation_id = serializers.IntegerField(read_only=True)
+    snippet = serializers.CharField(read_only=True)
+    
+    class Meta(MessageSerializer.Meta):
+        fields = MessageSerializer.Meta.fields + ['conversation_id', 'snippet']
+
+class ParticipantFieldsMixin:
+    """
+    Participant fields resolved through the request's loader registry (chat.loaders)
+    """
+    
+    def _cards(self, user_ids):
+        cards = get_loaders(self.context).named('users.author_card').load_many(user_ids)
+        request = self.context.get('request')
+        return [render_author_card(card, request) for card in cards]
+    
+    def get_participants(self, obj):
+        user_ids = get_loaders(self.context).named('chat.participants').load(obj.id)
+        return self._cards(user_ids)
+    
+    def get_other_participant(self, obj):
+        loaders = get_loaders(self.context)
+        if loaders.viewer is None:
+            return None
+        
+        if hasattr(obj, 'other_participant_id'):
+            # Annotated on inbox rows (chat.views.annotate_inbox)
+            other_ids = [obj.other_participant_id] if obj.other_participant_id else []
+        else:
+            user_ids = loaders.named('chat.participants').load(obj.id)
+            other_ids = [user_id for user_id in user_ids if user_id != loaders.viewer.id]
+        if other_ids:
+            return self._cards(other_ids[:1])[0]
+        return None
+    
+    def get_other_participant_online(self, obj):
+        other_participant = self.get_other_participant(obj)
+        if other_participant is None:
+            return False
+        return get_loaders(self.context).named('users.online').load(other_participant['id'])
+
+class ConversationSerializer(ParticipantFieldsMixin, serializers.ModelSerializer):
+    participants = serializers.SerializerMethodField()
     other_participant = serializers.SerializerMethodField()
+    other_participant_online = serializers.SerializerMethodField()
     last_message = serializers.SerializerMethodField()
     unread_count = serializers.SerializerMethodField()
     
     class Meta:
         model = Conversation
-        fields = ['id', 'participants', 'other_participant', 'last_message', 'unread_count', 'created_at', 'updated_at', 'last_message_at']
+        fields = ['id', 'participants', 'other_participant', 'other_participant_online', 'last_message', 'unread_count', 'created_at', 'updated_at', 'last_message_at']
         read_only_fields = ['created_at', 'updated_at', 'last_message_at']
+        list_serializer_class = BatchingListSerializer
     
-    def get_other_participant(self, obj):
-        request = self.context.get('request')
-        if not request or not request.user.is_authenticated:
-            return None
-        
-        other_user = obj.get_other_participant(request.user)
-        if other_user:
-            return UserSerializer(other_user, context=self.context).data
-        return None
+    def prime_loaders(self, conversations, loaders):
+        prime_conversations(conversations, loaders)
     
     def get_last_message(self, obj):
-        last_message = obj.get_last_message()
+        last_message = get_loaders(self.context).named('chat.last_message').load(obj.id)
         if last_message:
             return MessageSerializer(last_message, context=self.context).data
         return None
     
     def get_unread_count(self, obj):
-        request = self.context.get('request')
-        if not request or not request.user.is_authenticated:
+        loaders = get_loaders(self.context)
+        if loaders.viewer is None:
             return 0
-        return obj.get_unread_count(request.user)
+        return loaders.named('chat.unread_count').load(obj.id)
 
-class ConversationDetailSerializer(serializers.ModelSerializer):
-    participants = UserSerializer(many=True, read_only=True)
+class ConversationDetailSerializer(ParticipantFieldsMixin, serializers.ModelSerializer):
+    participants = serializers.SerializerMethodField()
     other_participant = serializers.SerializerMethodField()
+    other_participant_online = serializers.SerializerMethodField()
     messages = serializers.SerializerMethodField()
+    has_more_messages = serializers.SerializerMethodField()
     
     class Meta:
         model = Conversation
-        fields = ['id', 'participants', 'other_participant', 'messages', 'created_at', 'updated_at', 'last_message_at']
+        fields = ['id', 'participants', 'other_participant', 'other_participant_online', 'messages', 'has_more_messages', 'created_at', 'updated_at', 'last_message_at']
         read_only_fields = ['created_at', 'updated_at', 'last_message_at']
     
-    def get_other_participant(self, obj):
-        request = self.context.get('request')
-        if not request or not request.user.is_authenticated:
-            return None
-        
-        other_user = obj.get_other_participant(request.user)
-        if other_user:
-            return UserSerializer(other_user, context=self.context).data
-        return None
+    def _message_page(self, obj):
+        # Newest page of messages; older ones are fetched with ?before_id=
+        if not hasattr(obj, '_message_page'):
+            obj._message_page = message_page(obj.id, limit=DETAIL_MESSAGES)
+        return obj._message_page
     
     def get_messages(self, obj):
-        # Get recent messages (last 50) in reverse order for chat display
-        messages = obj.messages.all()[:50]
-        return MessageSerializer(messages, many=True, context=self.context).data 
\ No newline at end of file
+        messages, _ = self._message_page(obj)
+        return MessageSerializer(messages, many=True, context=self.context).data
+    
+    def get_has_more_messages(self, obj):
+        _, has_more = self._message_page(obj)
+        return has_more
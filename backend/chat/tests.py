@@ -1,8 +1,32 @@
-from django.test import TestCase
+import threading
+from importlib import import_module
+from unittest import mock, skipIf
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from channels.testing import WebsocketCommunicator
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.db import connection
+from django.db.models import QuerySet
+from django.test.utils import CaptureQueriesContext
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from rest_framework.test import APIClient
 from django.contrib.auth import get_user_model
 from django.utils import timezone
 from datetime import timedelta
-from .models import Conversation, Message
+from channels.db import database_sync_to_async
+from channels.routing import URLRouter
+from django.urls import path
+from django.apps import apps as global_apps
+from core.encoding import loads
+from core.multiplex import MultiplexConsumer
+from core.presence import CachePresence, LocalPresence, get_presence
+from .chat_notification_consumer import ChatNotificationConsumer
+from .consumers import ChatConsumer, create_message, member_group_name
+from .models import (
+    Conversation, ConversationParticipant, Message, bulk_create_messages, get_or_create_direct_conversation,
+    mark_read_through,
+)
 
 User = get_user_model()
 
@@ -493,3 +517,923 @@ class MessageModelTest(TestCase):
         messages = self.conversation.messages.all()
         self.assertEqual(messages[0], message1)  # Newest first
         self.assertEqual(messages[1], message2)  # Oldest last
+
+
+class ConversationListQueryCountTest(TestCase):
+    """Test that listing conversations does not issue queries per conversation"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            username='inboxowner',
+            email='inbox@example.com',
+            password='testpass123',
+            handle='inboxowner'
+        )
+        self.client.force_authenticate(user=self.user)
+        self.created = 0
+
+    def _add_conversations(self, count):
+        for _ in range(count):
+            self.created += 1
+            other = User.objects.create_user(
+                username=f'chatpartner{self.created}',
+                email=f'partner{self.created}@example.com',
+                password='testpass123',
+                handle=f'chatpartner{self.created}'
+            )
+            conversation = Conversation.objects.create()
+            conversation.participants.add(self.user, other)
+            Message.objects.create(conversation=conversation, sender=self.user, content='Hi')
+            Message.objects.create(conversation=conversation, sender=other, content='Hello')
+
+    def _list_conversations(self):
+        cache.clear()  # Compare cold renders so cached bodies and cards do not skew counts
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/chat/conversations/')
+        self.assertEqual(response.status_code, 200)
+        return response.json()['results'], len(queries)
+
+    def test_conversation_list_query_count_is_constant(self):
+        """Test that more conversations cost the same number of queries"""
+        self._add_conversations(2)
+        small, small_queries = self._list_conversations()
+        self._add_conversations(4)
+        large, large_queries = self._list_conversations()
+
+        self.assertEqual(len(small), 2)
+        self.assertEqual(len(large), 6)
+        self.assertEqual(small_queries, large_queries)
+
+    def test_conversation_list_batched_fields(self):
+        """Test that batched fields still describe each conversation"""
+        self._add_conversations(1)
+        conversations, _ = self._list_conversations()
+        conversation = conversations[0]
+
+        self.assertEqual(conversation['other_participant']['handle'], 'chatpartner1')
+        self.assertEqual(conversation['last_message']['content'], 'Hello')
+        self.assertEqual(conversation['unread_count'], 1)
+        self.assertEqual(len(conversation['participants']), 2)
+
+    def test_conversation_list_is_keyset_paginated_by_activity(self):
+        """Test that the inbox pages by last activity with a cursor, newest first"""
+        self._add_conversations(3)
+        quiet = Conversation.objects.create()
+        quiet.participants.add(self.user)
+        # Order the conversations explicitly: quiet has no messages, so its creation counts
+        base = timezone.now() - timedelta(days=1)
+        conversations = list(Conversation.objects.exclude(id=quiet.id).order_by('id'))
+        for offset, conversation in enumerate(conversations):
+            Conversation.objects.filter(id=conversation.id).update(last_message_at=base + timedelta(hours=offset))
+        Conversation.objects.filter(id=quiet.id).update(created_at=base + timedelta(minutes=30))
+
+        first = self.client.get('/api/chat/conversations/', {'page_size': 2}).json()
+        second = self.client.get(first['next']).json()
+
+        expected = [conversations[2].id, conversations[1].id, quiet.id, conversations[0].id]
+        self.assertEqual([row['id'] for row in first['results'] + second['results']], expected)
+        self.assertIsNone(second['next'])
+
+
+class ReadWatermarkTest(TestCase):
+    """Test per-participant read watermarks and unread counters"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.alice = User.objects.create_user(
+            username='alice', email='alice@example.com', password='testpass123', handle='alice'
+        )
+        self.bob = User.objects.create_user(
+            username='bob', email='bob@example.com', password='testpass123', handle='bob'
+        )
+        self.carol = User.objects.create_user(
+            username='carol', email='carol@example.com', password='testpass123', handle='carol'
+        )
+        self.conversation = Conversation.objects.create()
+        self.conversation.participants.add(self.alice, self.bob)
+
+    def _membership(self, user):
+        return ConversationParticipant.objects.get(conversation=self.conversation, user=user)
+
+    def test_messages_count_as_unread_for_other_participants(self):
+        """Test that sending and deleting messages maintains the unread counters"""
+        first = Message.objects.create(conversation=self.conversation, sender=self.alice, content='One')
+        Message.objects.create(conversation=self.conversation, sender=self.alice, content='Two')
+        self.assertEqual(self._membership(self.bob).unread_count, 2)
+        self.assertEqual(self._membership(self.alice).unread_count, 0)
+
+        first.soft_delete()
+        self.assertEqual(self.conversation.get_unread_count(self.bob), 1)
+        first.restore()
+        self.assertEqual(self.conversation.get_unread_count(self.bob), 2)
+
+    def test_mark_read_through_is_a_single_update(self):
+        """Test that reading up to a message moves the watermark with one query"""
+        first = Message.objects.create(conversation=self.conversation, sender=self.alice, content='One')
+        second = Message.objects.create(conversation=self.conversation, sender=self.alice, content='Two')
+
+        with self.assertNumQueries(1):
+            self.assertEqual(mark_read_through(self.conversation.id, self.bob, first.id), first.id)
+        membership = self._membership(self.bob)
+        self.assertEqual(membership.last_read_message_id, first.id)
+        self.assertEqual(membership.unread_count, 1)
+
+        # The watermark never moves back
+        mark_read_through(self.conversation.id, self.bob, second.id)
+        self.assertIsNone(mark_read_through(self.conversation.id, self.bob, first.id))
+        self.assertEqual(self._membership(self.bob).last_read_message_id, second.id)
+        self.assertEqual(self._membership(self.bob).unread_count, 0)
+
+    def test_mark_as_read_broadcasts_read_receipt(self):
+        """Test that marking a conversation read zeroes the count and tells the room"""
+        message = Message.objects.create(conversation=self.conversation, sender=self.alice, content='Hi')
+        channel_layer = get_channel_layer()
+        channel = async_to_sync(channel_layer.new_channel)()
+        async_to_sync(channel_layer.group_add)(member_group_name(self.conversation.id, self.alice.id), channel)
+
+        self.client.force_authenticate(user=self.bob)
+        response = self.client.post(f'/api/chat/conversations/{self.conversation.id}/mark_as_read/')
+        self.assertEqual(response.status_code, 200)
+
+        receipt = async_to_sync(channel_layer.receive)(channel)
+        self.assertEqual(receipt['type'], 'read_receipt')
+        self.assertEqual(receipt['user_id'], self.bob.id)
+        self.assertEqual(receipt['last_read_message_id'], message.id)
+        self.assertEqual(self.conversation.get_unread_count(self.bob), 0)
+
+    def test_message_is_read_once_every_other_participant_read_it(self):
+        """Test that is_read follows the watermarks of all other participants"""
+        self.conversation.participants.add(self.carol)
+        message = Message.objects.create(conversation=self.conversation, sender=self.alice, content='Hi all')
+        self.client.force_authenticate(user=self.alice)
+
+        def is_read():
+            response = self.client.get(f'/api/chat/conversations/{self.conversation.id}/messages/')
+            return response.json()['results'][0]['is_read']
+
+        mark_read_through(self.conversation.id, self.bob, message.id)
+        self.assertFalse(is_read())
+        mark_read_through(self.conversation.id, self.carol, message.id)
+        self.assertTrue(is_read())
+
+
+class MessageWriteTest(TestCase):
+    """Test that message writes touch the conversation only when needed"""
+
+    def setUp(self):
+        self.alice = User.objects.create_user(
+            username='alice', email='alice@example.com', password='testpass123', handle='alice'
+        )
+        self.bob = User.objects.create_user(
+            username='bob', email='bob@example.com', password='testpass123', handle='bob'
+        )
+        self.conversation = Conversation.objects.create()
+        self.conversation.participants.add(self.alice, self.bob)
+
+    def test_new_message_advances_last_message(self):
+        """Test that a new message moves last_message without bumping updated_at"""
+        updated_at = self.conversation.updated_at
+        message = Message.objects.create(conversation=self.conversation, sender=self.alice, content='Hi')
+        self.conversation.refresh_from_db()
+        self.assertEqual(self.conversation.last_message_id, message.id)
+        self.assertEqual(self.conversation.last_message_at, message.created_at)
+        self.assertEqual(self.conversation.updated_at, updated_at)
+
+    def test_updating_a_message_is_a_single_write(self):
+        """Test that saving an existing message does not touch the conversation"""
+        message = Message.objects.create(conversation=self.conversation, sender=self.alice, content='Hi')
+        message.content = 'Hi there'
+        with self.assertNumQueries(1):
+            message.save()
+
+    def test_older_message_does_not_move_last_message(self):
+        """Test that the conditional update keeps the newest message"""
+        older = Message.objects.create(conversation=self.conversation, sender=self.bob, content='Old')
+        newest = Message.objects.create(conversation=self.conversation, sender=self.alice, content='New')
+
+        older.soft_delete()
+        older.restore()
+        self.conversation.refresh_from_db()
+        self.assertEqual(self.conversation.last_message_id, newest.id)
+        self.assertEqual(self.conversation.last_message_at, newest.created_at)
+
+    def test_soft_deleting_last_message_moves_pointer_back(self):
+        """Test that deleting and restoring the last message keeps the pointer right"""
+        first = Message.objects.create(conversation=self.conversation, sender=self.alice, content='One')
+        second = Message.objects.create(conversation=self.conversation, sender=self.alice, content='Two')
+
+        second.soft_delete()
+        self.conversation.refresh_from_db()
+        self.assertEqual(self.conversation.last_message_id, first.id)
+
+        second.restore()
+        self.conversation.refresh_from_db()
+        self.assertEqual(self.conversation.last_message_id, second.id)
+
+    def test_bulk_create_messages_costs_three_queries(self):
+        """Test that a batch of messages costs one INSERT and two UPDATEs"""
+        with self.assertNumQueries(3):
+            messages = bulk_create_messages(self.conversation.id, self.alice, ['One', 'Two', 'Three'])
+        self.assertEqual([message.content for message in messages], ['One', 'Two', 'Three'])
+        self.conversation.refresh_from_db()
+        self.assertEqual(self.conversation.last_message_id, messages[-1].id)
+        self.assertEqual(self.conversation.get_unread_count(self.bob), 3)
+
+
+class DirectConversationTest(TestCase):
+    """Test the canonical pair key of one-to-one conversations"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.alice = User.objects.create_user(
+            username='alice', email='alice@example.com', password='testpass123', handle='alice'
+        )
+        self.bob = User.objects.create_user(
+            username='bob', email='bob@example.com', password='testpass123', handle='bob'
+        )
+        self.carol = User.objects.create_user(
+            username='carol', email='carol@example.com', password='testpass123', handle='carol'
+        )
+
+    def test_get_or_create_returns_the_pair_conversation_from_either_side(self):
+        """Test that both users of a pair get the same conversation"""
+        self.client.force_authenticate(user=self.alice)
+        first = self.client.post('/api/chat/conversations/get_or_create/', {'user_id': self.bob.id}).json()
+        self.client.force_authenticate(user=self.bob)
+        second = self.client.post('/api/chat/conversations/get_or_create/', {'user_id': self.alice.id}).json()
+
+        self.assertEqual(first['id'], second['id'])
+        conversation = Conversation.objects.get()
+        low, high = sorted((self.alice.id, self.bob.id))
+        self.assertEqual((conversation.dm_user_low, conversation.dm_user_high), (low, high))
+        self.assertEqual(set(conversation.participants.values_list('id', flat=True)), {self.alice.id, self.bob.id})
+
+    def test_existing_conversation_is_one_probe(self):
+        """Test that finding an existing direct conversation costs one query"""
+        conversation = get_or_create_direct_conversation(self.alice, self.bob)
+        with self.assertNumQueries(1):
+            self.assertEqual(get_or_create_direct_conversation(self.bob, self.alice), conversation)
+
+    def test_group_conversation_is_not_a_direct_conversation(self):
+        """Test that a group including the pair does not count as their direct conversation"""
+        group = Conversation.objects.create()
+        group.participants.add(self.alice, self.bob, self.carol)
+        conversation = get_or_create_direct_conversation(self.alice, self.bob)
+        self.assertNotEqual(conversation.id, group.id)
+
+    def test_deleted_direct_conversation_is_replaced(self):
+        """Test that a soft-deleted direct conversation frees the pair key"""
+        deleted = get_or_create_direct_conversation(self.alice, self.bob)
+        deleted.soft_delete()
+        conversation = get_or_create_direct_conversation(self.alice, self.bob)
+        self.assertNotEqual(conversation.id, deleted.id)
+
+    def test_deleted_direct_conversation_is_not_restored_over_a_live_one(self):
+        """Test that restoring a replaced direct conversation is refused and the pair keeps the live one"""
+        deleted = get_or_create_direct_conversation(self.alice, self.bob)
+        deleted.soft_delete()
+        live = get_or_create_direct_conversation(self.alice, self.bob)
+
+        with self.assertRaises(ValidationError):
+            deleted.restore()
+
+        deleted.refresh_from_db()
+        self.assertTrue(deleted.is_deleted)
+        self.assertEqual(get_or_create_direct_conversation(self.bob, self.alice), live)
+        live.soft_delete()
+        deleted.restore()
+        self.assertEqual(get_or_create_direct_conversation(self.bob, self.alice), deleted)
+
+    def test_get_or_create_returns_the_row_of_a_competing_insert(self):
+        """Test that a pair probe missing a conversation inserted meanwhile returns that row with both participants"""
+        low, high = sorted((self.alice.id, self.bob.id))
+        competing = Conversation.objects.create(dm_user_low=low, dm_user_high=high)
+
+        # The probe ran before the competing insert was committed
+        with mock.patch.object(QuerySet, 'first', return_value=None):
+            conversation = get_or_create_direct_conversation(self.alice, self.bob)
+
+        self.assertEqual(conversation, competing)
+        self.assertEqual(Conversation.all_objects.count(), 1)
+        self.assertEqual(set(conversation.participants.values_list('id', flat=True)), {self.alice.id, self.bob.id})
+
+    def test_migration_keys_only_two_member_conversations(self):
+        """Test that migration 0006 leaves conversations whose other member is gone untouched"""
+        merge_direct_conversations = import_module('chat.migrations.0006_conversation_dm_pair').merge_direct_conversations
+        with_bob, with_carol, pair = Conversation.objects.create(), Conversation.objects.create(), Conversation.objects.create()
+        with_bob.participants.add(self.alice)
+        with_carol.participants.add(self.alice)
+        pair.participants.add(self.alice, self.bob)
+        Message.objects.create(conversation=with_bob, sender=self.alice, content='To Bob')
+        Message.objects.create(conversation=with_carol, sender=self.alice, content='To Carol')
+
+        merge_direct_conversations(global_apps, None)
+
+        self.assertEqual(Conversation.objects.count(), 3)
+        self.assertEqual(list(with_bob.messages.values_list('content', flat=True)), ['To Bob'])
+        self.assertEqual(list(with_carol.messages.values_list('content', flat=True)), ['To Carol'])
+        self.assertFalse(Conversation.objects.filter(id__in=[with_bob.id, with_carol.id], dm_user_low__isnull=False).exists())
+        pair.refresh_from_db()
+        self.assertEqual((pair.dm_user_low, pair.dm_user_high), tuple(sorted((self.alice.id, self.bob.id))))
+
+
+@skipIf(connection.vendor == 'sqlite', 'SQLite test databases lock whole tables across threads')
+class DirectConversationConcurrencyTest(TransactionTestCase):
+    """Test that concurrent get_or_create calls for one pair create one conversation"""
+
+    def test_concurrent_get_or_create(self):
+        alice = User.objects.create_user(
+            username='alice', email='alice@example.com', password='testpass123', handle='alice'
+        )
+        bob = User.objects.create_user(
+            username='bob', email='bob@example.com', password='testpass123', handle='bob'
+        )
+        results, errors = [], []
+
+        def open_conversation():
+            try:
+                results.append(get_or_create_direct_conversation(alice, bob).id)
+            except Exception as e:
+                errors.append(e)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=open_conversation) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        self.assertEqual(len(set(results)), 1)
+        self.assertEqual(Conversation.objects.count(), 1)
+        self.assertEqual(ConversationParticipant.objects.count(), 2)
+
+
+class MessageHistoryTest(TestCase):
+    """Test keyset pagination of conversation history"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.alice = User.objects.create_user(
+            username='alice', email='alice@example.com', password='testpass123', handle='alice'
+        )
+        self.bob = User.objects.create_user(
+            username='bob', email='bob@example.com', password='testpass123', handle='bob'
+        )
+        self.conversation = Conversation.objects.create()
+        self.conversation.participants.add(self.alice, self.bob)
+        self.messages = [
+            Message.objects.create(conversation=self.conversation, sender=self.alice, content=f'Message {i}')
+            for i in range(7)
+        ]
+        # Two messages sharing a timestamp are ordered by id
+        Message.objects.filter(id=self.messages[3].id).update(created_at=self.messages[2].created_at)
+        self.client.force_authenticate(user=self.bob)
+
+    def _page(self, **params):
+        response = self.client.get(f'/api/chat/conversations/{self.conversation.id}/messages/', params)
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        return [message['content'] for message in data['results']], data['has_more']
+
+    def test_before_id_pages_back_through_history(self):
+        """Test that before_id walks from the newest page to the oldest without gaps"""
+        ids = [message.id for message in self.messages]
+        newest, has_more = self._page(page_size=3)
+        self.assertEqual(newest, ['Message 6', 'Message 5', 'Message 4'])
+        self.assertTrue(has_more)
+
+        older, has_more = self._page(page_size=3, before_id=ids[4])
+        self.assertEqual(older, ['Message 3', 'Message 2', 'Message 1'])
+        self.assertTrue(has_more)
+
+        oldest, has_more = self._page(page_size=3, before_id=ids[1])
+        self.assertEqual(oldest, ['Message 0'])
+        self.assertFalse(has_more)
+
+    def test_after_id_returns_newer_messages_newest_first(self):
+        """Test that after_id returns the messages right after the cursor"""
+        newer, has_more = self._page(page_size=2, after_id=self.messages[2].id)
+        self.assertEqual(newer, ['Message 4', 'Message 3'])
+        self.assertTrue(has_more)
+
+    def test_history_pages_skip_deleted_messages(self):
+        """Test that deleted messages are left out and cursors on them still work"""
+        self.messages[5].soft_delete()
+        page, _ = self._page(page_size=2, before_id=self.messages[5].id)
+        self.assertEqual(page, ['Message 4', 'Message 3'])
+        newest, _ = self._page(page_size=2)
+        self.assertEqual(newest, ['Message 6', 'Message 4'])
+
+    def test_invalid_cursor_is_rejected(self):
+        """Test that a non-integer cursor is a bad request"""
+        response = self.client.get(f'/api/chat/conversations/{self.conversation.id}/messages/', {'before_id': 'x'})
+        self.assertEqual(response.status_code, 400)
+
+
+class MessageSearchTest(TestCase):
+    """Test the indexed message search endpoint"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.alice = User.objects.create_user(
+            username='alice', email='alice@example.com', password='testpass123', handle='alice'
+        )
+        self.bob = User.objects.create_user(
+            username='bob', email='bob@example.com', password='testpass123', handle='bob'
+        )
+        self.carol = User.objects.create_user(
+            username='carol', email='carol@example.com', password='testpass123', handle='carol'
+        )
+        self.with_bob = get_or_create_direct_conversation(self.alice, self.bob)
+        self.with_carol = get_or_create_direct_conversation(self.alice, self.carol)
+        self.between_others = get_or_create_direct_conversation(self.bob, self.carol)
+        self.client.force_authenticate(user=self.alice)
+
+    def _search(self, **params):
+        response = self.client.get('/api/chat/messages/search/', params)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_search_is_scoped_to_the_users_conversations(self):
+        """Test that hits come from the user's conversations only, newest first, with escaped highlights"""
+        first = Message.objects.create(conversation=self.with_bob, sender=self.bob, content='Lunch on <b>Friday</b>?')
+        Message.objects.create(conversation=self.with_bob, sender=self.alice, content='Sounds good')
+        second, = bulk_create_messages(self.with_carol.id, self.carol, ['Friday lunch is booked'])
+        Message.objects.create(conversation=self.between_others, sender=self.bob, content='Lunch friday without Alice')
+
+        data = self._search(q='friday LUNCH')
+        self.assertEqual([hit['id'] for hit in data['results']], [second.id, first.id])
+        self.assertFalse(data['has_more'])
+        self.assertIn('<mark>Friday</mark>', data['results'][1]['snippet'])
+        self.assertIn('&lt;b&gt;', data['results'][1]['snippet'])
+        self.assertEqual(data['results'][0]['conversation_id'], self.with_carol.id)
+
+        scoped = self._search(q='lunch', conversation_id=self.with_bob.id)
+        self.assertEqual([hit['id'] for hit in scoped['results']], [first.id])
+        self.assertEqual(self._search(q='  ?! ')['results'], [])
+
+    def test_index_follows_soft_deletes_and_restores(self):
+        """Test that soft-deleted messages drop out of the results and come back when restored"""
+        message = Message.objects.create(conversation=self.with_bob, sender=self.bob, content='The parcel arrived')
+        message.soft_delete()
+        self.assertEqual(self._search(q='parcel')['results'], [])
+        message.restore()
+        self.assertEqual([hit['id'] for hit in self._search(q='parcel')['results']], [message.id])
+
+    def test_results_are_keyset_paginated(self):
+        """Test paging back through hits with before_id"""
+        messages = bulk_create_messages(self.with_bob.id, self.bob, [f'Reminder number {i}' for i in range(5)])
+        first_page = self._search(q='reminder', page_size=3)
+        second_page = self._search(q='reminder', page_size=3, before_id=first_page['results'][-1]['id'])
+
+        ids = [message.id for message in reversed(messages)]
+        self.assertEqual([hit['id'] for hit in first_page['results']], ids[:3])
+        self.assertTrue(first_page['has_more'])
+        self.assertEqual([hit['id'] for hit in second_page['results']], ids[3:])
+        self.assertFalse(second_page['has_more'])
+        response = self.client.get('/api/chat/messages/search/', {'q': 'reminder', 'before_id': 'latest'})
+        self.assertEqual(response.status_code, 400)
+
+
+class ChatConsumerMembershipTest(TestCase):
+    """Test that ChatConsumer caches participant ids instead of querying per message"""
+
+    def setUp(self):
+        self.alice = User.objects.create_user(
+            username='alice', email='alice@example.com', password='testpass123', handle='alice'
+        )
+        self.bob = User.objects.create_user(
+            username='bob', email='bob@example.com', password='testpass123', handle='bob'
+        )
+        self.carol = User.objects.create_user(
+            username='carol', email='carol@example.com', password='testpass123', handle='carol'
+        )
+        self.conversation = Conversation.objects.create()
+        self.conversation.participants.add(self.alice, self.bob)
+
+    def _communicator(self, user):
+        application = URLRouter([path('ws/chat/<int:conversation_id>/', ChatConsumer.as_asgi())])
+        communicator = WebsocketCommunicator(application, f'/ws/chat/{self.conversation.id}/')
+        communicator.scope['user'] = user
+        return communicator
+
+    def _change_participants(self, change):
+        @database_sync_to_async
+        def run():
+            with self.captureOnCommitCallbacks(execute=True):
+                change(self.conversation.participants)
+        return run()
+
+    def test_messages_cost_one_insert_and_two_updates(self):
+        """Test that membership is resolved once at connect and each message costs three queries"""
+        async def run():
+            communicator = self._communicator(self.alice)
+            connected, _ = await communicator.connect()
+            for content in ('first', 'second'):
+                await communicator.send_json_to({'action': 'send_message', 'content': content})
+                await communicator.receive_json_from()
+            await communicator.disconnect()
+            return connected
+
+        with CaptureQueriesContext(connection) as queries:
+            connected = async_to_sync(run)()
+        self.assertTrue(connected)
+        # One participants query at connect, then per message the INSERT, the
+        # conversation timestamp UPDATE and the unread counters UPDATE
+        self.assertEqual(len(queries), 7)
+        self.conversation.refresh_from_db()
+        self.assertEqual(self.conversation.last_message_at, Message.objects.first().created_at)
+
+    def test_invalid_read_marks_are_ignored(self):
+        """Test that a mark_as_read with a message_id that is not an integer leaves the socket working"""
+        async def run():
+            communicator = self._communicator(self.alice)
+            await communicator.connect()
+            for message_id in ('abc', {'id': 1}, [1]):
+                await communicator.send_json_to({'action': 'mark_as_read', 'message_id': message_id})
+            await communicator.send_json_to({'action': 'send_message', 'content': 'Still here'})
+            frame = await communicator.receive_json_from()
+            await communicator.disconnect()
+            return frame
+
+        self.assertEqual(async_to_sync(run)()['message']['content'], 'Still here')
+        self.assertIsNone(ConversationParticipant.objects.get(conversation=self.conversation, user=self.alice).last_read_message_id)
+
+    def test_send_messages_ignores_contents_that_are_not_lists(self):
+        """Test that a string is not split into letters and a number leaves the socket working"""
+        async def run():
+            communicator = self._communicator(self.alice)
+            await communicator.connect()
+            for contents in ('hello', 5):
+                await communicator.send_json_to({'action': 'send_messages', 'contents': contents})
+            await communicator.send_json_to({'action': 'send_messages', 'contents': ['Still here', ' ', 7]})
+            frame = await communicator.receive_json_from()
+            nothing_more = await communicator.receive_nothing(timeout=0.1)
+            await communicator.disconnect()
+            return frame, nothing_more
+
+        frame, nothing_more = async_to_sync(run)()
+        self.assertEqual(frame['message']['content'], 'Still here')
+        self.assertTrue(nothing_more)
+        self.assertEqual(list(Message.objects.values_list('content', flat=True)), ['Still here'])
+
+    def test_typing_is_reported_on_transitions_only(self):
+        """Test that keystroke-rate typing actions reach others as one start and one timed-out stop"""
+        async def run():
+            alice, bob = self._communicator(self.alice), self._communicator(self.bob)
+            await alice.connect()
+            await bob.connect()
+            for _ in range(5):
+                await alice.send_json_to({'action': 'typing', 'is_typing': True})
+            # A stop and restart within the minimum interval is never reported
+            await alice.send_json_to({'action': 'typing', 'is_typing': False})
+            await alice.send_json_to({'action': 'typing', 'is_typing': True})
+            frames = [await bob.receive_json_from(timeout=2) for _ in range(2)]
+            nothing_more = await bob.receive_nothing(timeout=0.3)
+            echoed = not await alice.receive_nothing(timeout=0.1)
+            await alice.disconnect()
+            await bob.disconnect()
+            return frames, nothing_more, echoed
+
+        with mock.patch.object(ChatConsumer, 'typing_min_interval', 0.2), \
+                mock.patch.object(ChatConsumer, 'typing_timeout', 0.4):
+            frames, nothing_more, echoed = async_to_sync(run)()
+        self.assertEqual([frame['is_typing'] for frame in frames], [True, False])
+        self.assertEqual({frame['type'] for frame in frames}, {'typing_indicator'})
+        self.assertTrue(nothing_more)
+        self.assertFalse(echoed)
+
+    def test_sending_a_message_stops_typing(self):
+        """Test that a sent message reports the sender as stopped right away"""
+        async def run():
+            alice, bob = self._communicator(self.alice), self._communicator(self.bob)
+            await alice.connect()
+            await bob.connect()
+            await alice.send_json_to({'action': 'typing', 'is_typing': True})
+            await alice.send_json_to({'action': 'send_message', 'content': 'Done typing'})
+            frames = [await bob.receive_json_from() for _ in range(3)]
+            await alice.disconnect()
+            await bob.disconnect()
+            return frames
+
+        frames = async_to_sync(run)()
+        self.assertEqual(
+            [(frame['type'], frame.get('is_typing')) for frame in frames],
+            [('typing_indicator', True), ('typing_indicator', False), ('chat_message', None)]
+        )
+
+    def test_participants_changed_refreshes_cached_membership(self):
+        """Test that added participants get chat notifications and removed ones are disconnected"""
+        async def run():
+            channel_layer = get_channel_layer()
+            carol_channel = await channel_layer.new_channel()
+            await channel_layer.group_add(f'chat_notifications_{self.carol.id}', carol_channel)
+            get_presence().connect(self.carol.id, carol_channel)
+            alice, bob = self._communicator(self.alice), self._communicator(self.bob)
+            await alice.connect()
+            await bob.connect()
+
+            await self._change_participants(lambda participants: participants.add(self.carol))
+            await alice.send_json_to({'action': 'send_message', 'content': 'Welcome Carol'})
+            carol_notification = await channel_layer.receive(carol_channel)
+
+            await self._change_participants(lambda participants: participants.remove(self.bob))
+            bob_output = [await bob.receive_output() for _ in range(2)]
+            await alice.disconnect()
+            return carol_notification, bob_output
+
+        carol_notification, bob_output = async_to_sync(run)()
+        self.assertEqual(loads(carol_notification['text'])['content'], 'Welcome Carol')
+        self.assertEqual(bob_output[0]['type'], 'websocket.send')
+        self.assertEqual(bob_output[1]['type'], 'websocket.close')
+
+
+@override_settings(DB_EXECUTOR_WORKERS=2)
+class ConsumerDatabaseExecutorTest(TransactionTestCase):
+    """Test that consumer database work runs on the dedicated pool when it is enabled"""
+
+    def test_messages_are_saved_on_database_threads(self):
+        """Test that a socket's connect and message writes run on the db threads"""
+        alice = User.objects.create_user(
+            username='alice', email='alice@example.com', password='testpass123', handle='alice'
+        )
+        bob = User.objects.create_user(
+            username='bob', email='bob@example.com', password='testpass123', handle='bob'
+        )
+        conversation = get_or_create_direct_conversation(alice, bob)
+        threads = []
+        real_create_message = create_message
+
+        def recording_create_message(*args):
+            threads.append(threading.current_thread().name)
+            return real_create_message(*args)
+
+        async def run():
+            application = URLRouter([path('ws/chat/<int:conversation_id>/', ChatConsumer.as_asgi())])
+            communicator = WebsocketCommunicator(application, f'/ws/chat/{conversation.id}/')
+            communicator.scope['user'] = alice
+            connected, _ = await communicator.connect()
+            await communicator.send_json_to({'action': 'send_message', 'content': 'From a pool thread'})
+            frame = await communicator.receive_json_from()
+            await communicator.disconnect()
+            return connected, frame
+
+        with mock.patch('chat.consumers.create_message', recording_create_message):
+            connected, frame = async_to_sync(run)()
+        self.assertTrue(connected)
+        self.assertEqual(frame['message']['content'], 'From a pool thread')
+        self.assertEqual(len(threads), 1)
+        self.assertTrue(threads[0].startswith('db'))
+        self.assertTrue(Message.objects.filter(conversation=conversation, content='From a pool thread').exists())
+
+
+class MultiplexConsumerTest(TestCase):
+    """Test the multiplexed ws/ endpoint carrying chat and notification streams"""
+
+    def setUp(self):
+        cache.clear()
+        self.alice = User.objects.create_user(
+            username='alice', email='alice@example.com', password='testpass123', handle='alice'
+        )
+        self.bob = User.objects.create_user(
+            username='bob', email='bob@example.com', password='testpass123', handle='bob'
+        )
+        self.outsider = User.objects.create_user(
+            username='outsider', email='outsider@example.com', password='testpass123', handle='outsider'
+        )
+        self.conversation = Conversation.objects.create()
+        self.conversation.participants.add(self.alice, self.bob)
+
+    def _communicator(self, user):
+        communicator = WebsocketCommunicator(MultiplexConsumer.as_asgi(), '/ws/')
+        communicator.scope['user'] = user
+        return communicator
+
+    def test_streams_share_one_socket(self):
+        """Test subscribing to chat and notification streams and routing their frames"""
+        conversation_id = self.conversation.id
+
+        async def run():
+            alice, bob = self._communicator(self.alice), self._communicator(self.bob)
+            await alice.connect()
+            await bob.connect()
+            for communicator in (alice, bob):
+                await communicator.send_json_to({'action': 'subscribe', 'stream': 'chat', 'conversation_id': conversation_id})
+                await communicator.receive_json_from()
+            await bob.send_json_to({'action': 'subscribe', 'stream': 'chat_notifications'})
+            await bob.send_json_to({'action': 'subscribe', 'stream': 'notifications'})
+            acks = [await bob.receive_json_from(), await bob.receive_json_from()]
+
+            await alice.send_json_to({
+                'stream': 'chat', 'conversation_id': conversation_id, 'action': 'send_message', 'content': 'Hi Bob'
+            })
+            await get_channel_layer().group_send(f'notifications_{self.bob.id}', {
+                'type': 'notification_message', 'message': {'type': 'unread_count', 'count': 1}
+            })
+            bob_frames = [await bob.receive_json_from() for _ in range(3)]
+            alice_frame = await alice.receive_json_from()
+            await alice.disconnect()
+            await bob.disconnect()
+            return acks, bob_frames, alice_frame
+
+        acks, bob_frames, alice_frame = async_to_sync(run)()
+        self.assertEqual([ack['stream'] for ack in acks], ['chat_notifications', 'notifications'])
+        by_stream = {frame['stream']: frame for frame in bob_frames}
+        self.assertEqual(by_stream['chat']['conversation_id'], conversation_id)
+        self.assertEqual(by_stream['chat']['payload']['message']['content'], 'Hi Bob')
+        self.assertEqual(by_stream['chat_notifications']['payload']['conversation_id'], conversation_id)
+        self.assertEqual(by_stream['notifications']['payload'], {'type': 'unread_count', 'count': 1})
+        self.assertEqual(alice_frame['payload']['type'], 'chat_message')
+        self.assertEqual(Message.objects.get().sender, self.alice)
+
+    def test_encoded_broadcasts_are_forwarded_unchanged(self):
+        """Test that payloads encoded by the sender are wrapped without being encoded again"""
+        async def run():
+            bob = self._communicator(self.bob)
+            await bob.connect()
+            await bob.send_json_to({'action': 'subscribe', 'stream': 'chat_notifications'})
+            await bob.receive_json_from()
+            await get_channel_layer().group_send(f'chat_notifications_{self.bob.id}', {
+                'type': 'chat_notification', 'text': '{"conversation_id":7,"content":"Encoded once"}'
+            })
+            frame = await bob.receive_from()
+            await bob.disconnect()
+            return frame
+
+        self.assertEqual(
+            async_to_sync(run)(),
+            '{"stream":"chat_notifications","payload":{"conversation_id":7,"content":"Encoded once"}}'
+        )
+
+    def test_chat_frames_survive_a_notification_burst(self):
+        """Test that a burst overflowing the send queue drops notifications only, and says so"""
+        conversation_id = self.conversation.id
+
+        async def run():
+            layer = get_channel_layer()
+            bob = self._communicator(self.bob)
+            await bob.connect()
+            await bob.send_json_to({'action': 'subscribe', 'stream': 'chat', 'conversation_id': conversation_id})
+            await bob.send_json_to({'action': 'subscribe', 'stream': 'notifications'})
+            await bob.receive_json_from()
+            await bob.receive_json_from()
+            for i in range(5):
+                await layer.group_send(f'notifications_{self.bob.id}', {
+                    'type': 'notification_message', 'message': {'type': 'notification', 'id': i}
+                })
+                await layer.group_send(f'chat_{conversation_id}', {
+                    'type': 'chat_message', 'conversation_id': conversation_id, 'message': {'id': i}
+                })
+            frames = [await bob.receive_json_from() for _ in range(6)]
+            await bob.disconnect()
+            return frames
+
+        with mock.patch.object(MultiplexConsumer, 'send_queue_limit', 3):
+            frames = async_to_sync(run)()
+        chat = [frame['payload']['message']['id'] for frame in frames if frame['stream'] == 'chat']
+        notifications = [frame['payload'] for frame in frames if frame['stream'] == 'notifications']
+        self.assertEqual(chat, [0, 1, 2, 3, 4])
+        self.assertEqual([n['id'] for n in notifications[0]['notifications']], [2, 3, 4])
+        self.assertTrue(notifications[0]['truncated'])
+
+    def test_send_messages_ignores_contents_that_are_not_lists(self):
+        """Test that a string is not split into letters and a number leaves the socket working"""
+        conversation_id = self.conversation.id
+
+        async def run():
+            alice = self._communicator(self.alice)
+            await alice.connect()
+            await alice.send_json_to({'action': 'subscribe', 'stream': 'chat', 'conversation_id': conversation_id})
+            await alice.receive_json_from()
+            for contents in ('hello', 5, ['Still here']):
+                await alice.send_json_to({
+                    'stream': 'chat', 'conversation_id': conversation_id, 'action': 'send_messages', 'contents': contents
+                })
+            frame = await alice.receive_json_from()
+            nothing_more = await alice.receive_nothing(timeout=0.1)
+            await alice.disconnect()
+            return frame, nothing_more
+
+        frame, nothing_more = async_to_sync(run)()
+        self.assertEqual(frame['payload']['message']['content'], 'Still here')
+        self.assertTrue(nothing_more)
+        self.assertEqual(list(Message.objects.values_list('content', flat=True)), ['Still here'])
+
+    def test_chat_subscription_requires_participation(self):
+        """Test that outsiders cannot join a conversation stream"""
+        conversation_id = self.conversation.id
+
+        async def run():
+            communicator = self._communicator(self.outsider)
+            await communicator.connect()
+            await communicator.send_json_to({'action': 'subscribe', 'stream': 'chat', 'conversation_id': conversation_id})
+            refused = await communicator.receive_json_from()
+            await communicator.send_json_to({
+                'stream': 'chat', 'conversation_id': conversation_id, 'action': 'send_message', 'content': 'Hi'
+            })
+            not_subscribed = await communicator.receive_json_from()
+            await communicator.disconnect()
+            return refused, not_subscribed
+
+        refused, not_subscribed = async_to_sync(run)()
+        self.assertEqual(refused['type'], 'error')
+        self.assertEqual(not_subscribed['message'], 'Not subscribed')
+        self.assertFalse(Message.objects.exists())
+
+
+@override_settings(PRESENCE_BACKEND='core.presence.LocalPresence')
+class PresenceTest(TestCase):
+    """Test the presence registry and the sends it lets senders skip"""
+
+    def setUp(self):
+        get_presence().clear()
+        self.client = APIClient()
+        self.alice = User.objects.create_user(
+            username='alice', email='alice@example.com', password='testpass123', handle='alice'
+        )
+        self.bob = User.objects.create_user(
+            username='bob', email='bob@example.com', password='testpass123', handle='bob'
+        )
+        self.conversation = Conversation.objects.create()
+        self.conversation.participants.add(self.alice, self.bob)
+
+    def test_connections_expire_without_heartbeats(self):
+        """Test that a user is online while any connection is open and fresh, with either backend"""
+        cache.clear()
+        for backend in (LocalPresence(60), CachePresence(60)):
+            backend.connect(self.alice.id, 'first')
+            backend.connect(self.alice.id, 'second')
+            backend.disconnect(self.alice.id, 'first')
+            self.assertEqual(backend.online_user_ids([self.alice.id, self.bob.id]), {self.alice.id})
+
+            later = mock.patch('core.presence.time.time', return_value=timezone.now().timestamp() + 61)
+            with later:
+                self.assertFalse(backend.is_online(self.alice.id))
+            backend.heartbeat(self.alice.id, 'second')
+            backend.disconnect(self.alice.id, 'second')
+            self.assertFalse(backend.is_online(self.alice.id))
+
+    def test_concurrent_connects_are_all_counted(self):
+        """Test that sockets opening at once keep their user online until the last one closes"""
+        cache.clear()
+        backend = CachePresence(60)
+        barrier = threading.Barrier(8)
+
+        def open_socket(name):
+            barrier.wait()
+            backend.connect(self.alice.id, name)
+
+        threads = [threading.Thread(target=open_socket, args=(f'socket{i}',)) for i in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        for i in range(7):
+            backend.disconnect(self.alice.id, f'socket{i}')
+        self.assertTrue(backend.is_online(self.alice.id))
+        backend.disconnect(self.alice.id, 'socket7')
+        self.assertFalse(backend.is_online(self.alice.id))
+
+    def test_consumers_register_their_connections(self):
+        """Test that a socket makes its user online until it closes"""
+        async def run():
+            communicator = WebsocketCommunicator(ChatNotificationConsumer.as_asgi(), '/ws/chat_notifications/')
+            communicator.scope['user'] = self.bob
+            await communicator.connect()
+            online = get_presence().is_online(self.bob.id)
+            await communicator.disconnect()
+            return online, get_presence().is_online(self.bob.id)
+
+        self.assertEqual(async_to_sync(run)(), (True, False))
+
+    def test_chat_notifications_skip_offline_participants(self):
+        """Test that a REST message only notifies the participants with sockets open"""
+        channel_layer = get_channel_layer()
+        channel = async_to_sync(channel_layer.new_channel)()
+        async_to_sync(channel_layer.group_add)(f'chat_notifications_{self.bob.id}', channel)
+        self.client.force_authenticate(user=self.alice)
+
+        def send(content):
+            response = self.client.post(
+                f'/api/chat/conversations/{self.conversation.id}/send_message/', {'content': content}
+            )
+            self.assertEqual(response.status_code, 201)
+
+        send('Nobody is listening')
+        self.assertNotIn(channel, channel_layer.channels)
+        get_presence().connect(self.bob.id, channel)
+        send('Bob is online')
+        notification = loads(async_to_sync(channel_layer.receive)(channel)['text'])
+        self.assertEqual(notification['content'], 'Bob is online')
+
+    def test_inbox_reports_presence_of_the_other_participant(self):
+        """Test that conversation lists carry the other participant's presence"""
+        self.client.force_authenticate(user=self.alice)
+        offline = self.client.get('/api/chat/conversations/').json()['results'][0]
+        get_presence().connect(self.bob.id, 'bob-socket')
+        online = self.client.get('/api/chat/conversations/').json()['results'][0]
+        self.assertFalse(offline['other_participant_online'])
+        self.assertTrue(online['other_participant_online'])
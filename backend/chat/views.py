@@ -3,14 +3,22 @@ from rest_framework import viewsets, status, filters
 from rest_framework.decorators import action, permission_classes
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
-from rest_framework.pagination import PageNumberPagination
+from rest_framework.pagination import CursorPagination, PageNumberPagination
 from django.contrib.auth import get_user_model
 from django.db import models, transaction
-from django.db.models import Q, Max
+from django.db.models import Q, Max, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
 from channels.layers import get_channel_layer
 from asgiref.sync import async_to_sync
-from .models import Conversation, Message
-from .serializers import ConversationSerializer, ConversationDetailSerializer, MessageSerializer
+from .consumers import broadcast_message, broadcast_read_receipt, conversation_participant_ids, message_payload
+from .history import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, message_page
+from .models import (
+    Conversation, ConversationParticipant, Message, get_or_create_direct_conversation, mark_read_through,
+)
+from .search import DEFAULT_PAGE_SIZE as SEARCH_PAGE_SIZE, MAX_PAGE_SIZE as SEARCH_MAX_PAGE_SIZE, search_messages
+from .serializers import (
+    ConversationSerializer, ConversationDetailSerializer, MessageSearchResultSerializer, MessageSerializer,
+)
 
 User = get_user_model()
 
@@ -19,6 +27,36 @@ class ChatPagination(PageNumberPagination):
     page_size_query_param = 'page_size'
     max_page_size = 100
 
+class ConversationInboxPagination(CursorPagination):
+    """
+    Keyset pagination of the inbox by last activity (the last message, or
+    creation for conversations without messages), newest first
+    """
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    ordering = ('-activity_at', '-id')
+
+
+def annotate_inbox(queryset, user):
+    """
+    Annotate conversations with what an inbox row needs besides their
+    last_message pointer, in the same query: the user's unread count and the
+    id of the (first) other participant
+    """
+    unread_count = ConversationParticipant.objects.filter(
+        conversation_id=OuterRef('pk'), user_id=user.id
+    ).values('unread_count')[:1]
+    other_participant_id = ConversationParticipant.objects.filter(
+        conversation_id=OuterRef('pk')
+    ).exclude(user_id=user.id).order_by('user_id').values('user_id')[:1]
+    return queryset.annotate(
+        activity_at=Coalesce('last_message_at', 'created_at'),
+        inbox_unread_count=Coalesce(Subquery(unread_count, output_field=IntegerField()), 0),
+        other_participant_id=Subquery(other_participant_id),
+    )
+
+
 class ConversationViewSet(viewsets.ModelViewSet):
     """
     ViewSet for handling conversation operations.
@@ -33,7 +71,7 @@ class ConversationViewSet(viewsets.ModelViewSet):
         """
         return Conversation.objects.filter(
             participants=self.request.user
-        ).prefetch_related('participants', 'messages')
+        ).prefetch_related('participants')
     
     def get_serializer_context(self):
         context = super().get_serializer_context()
@@ -42,11 +80,15 @@ class ConversationViewSet(viewsets.ModelViewSet):
 
     def list(self, request, *args, **kwargs):
         """
-        List all conversations for the current user.
+        List the current user's conversations, one page of the inbox at a time.
         """
-        queryset = self.get_queryset()
-        serializer = self.get_serializer(queryset, many=True)
-        return Response(serializer.data)
+        queryset = annotate_inbox(
+            Conversation.objects.filter(participants=request.user), request.user
+        )
+        paginator = ConversationInboxPagination()
+        page = paginator.paginate_queryset(queryset, request, view=self)
+        serializer = self.get_serializer(page, many=True)
+        return paginator.get_paginated_response(serializer.data)
 
     def retrieve(self, request, *args, **kwargs):
         """
@@ -77,17 +119,8 @@ class ConversationViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_404_NOT_FOUND
             )
         
-        # Check if conversation already exists
-        conversation = Conversation.objects.filter(
-            participants=request.user
-        ).filter(
-            participants=other_user
-        ).first()
-        
-        if not conversation:
-            # Create new conversation
-            conversation = Conversation.objects.create()
-            conversation.participants.add(request.user, other_user)
+        # Find the direct conversation by its pair key, or create it
+        conversation = get_or_create_direct_conversation(request.user, other_user)
         
         serializer = ConversationDetailSerializer(conversation, context=self.get_serializer_context())
         return Response(serializer.data)
@@ -123,71 +156,22 @@ class ConversationViewSet(viewsets.ModelViewSet):
             image=image
         )
         
-        # Broadcast message to WebSocket connections
-        channel_layer = get_channel_layer()
-        room_group_name = f"chat_{conversation.id}"
-        
-        # Construct absolute URL for profile picture
-        profile_picture_url = None
-        if message.sender.profile_picture:
-            try:
-                profile_picture_url = f"http://localhost:8000{message.sender.profile_picture.url}"
-            except:
-                profile_picture_url = None
-        
-        message_data = {
-            'id': message.id,
-            'content': message.content,
-            'sender': {
-                'id': message.sender.id,
-                'username': message.sender.username,
-                'handle': message.sender.handle,
-                'profile_picture': profile_picture_url
-            },
-            'created_at': message.created_at.isoformat(),
-            'is_read': message.is_read,
-            'image_url': message.image.url if message.image else None
-        }
-        
-        async_to_sync(channel_layer.group_send)(
-            room_group_name,
-            {
-                'type': 'chat_message',
-                'message': message_data
-            }
+        # Broadcast message to WebSocket connections, and chat notifications
+        # to the other participants that are online, in one pass
+        message_data = message_payload(message)
+        message_data['image_url'] = message.image.url if message.image else None
+        async_to_sync(broadcast_message)(
+            get_channel_layer(), conversation.id, message_data,
+            conversation_participant_ids(conversation.id) - {request.user.id}
         )
         
-        # Send global chat notifications to other participants
-
-        other_participants = conversation.participants.exclude(id=request.user.id)
-        
-        for participant in other_participants:
-            async_to_sync(channel_layer.group_send)(
-                f"chat_notifications_{participant.id}",
-                {
-                    'type': 'chat_notification',
-                    'notification': {
-                        'conversation_id': conversation.id,
-                        'sender': {
-                            'id': message.sender.id,
-                            'username': message.sender.username,
-                            'handle': message.sender.handle,
-                            'profile_picture': profile_picture_url
-                        },
-                        'content': message.content,
-                        'created_at': message.created_at.isoformat()
-                    }
-                }
-            )
-
-        
         serializer = MessageSerializer(message, context=self.get_serializer_context())
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
     @action(detail=True, methods=['GET'])
     def messages(self, request, pk=None):
         """
-        Get messages for a conversation with pagination.
+        Get a page of messages for a conversation, newest first.
         """
         conversation = self.get_object()
         
@@ -198,18 +182,23 @@ class ConversationViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_403_FORBIDDEN
             )
         
-        messages = conversation.messages.all()
-        
-        # Apply pagination
-        paginator = self.pagination_class()
-        page = paginator.paginate_queryset(messages, request)
-        
-        if page is not None:
-            serializer = MessageSerializer(page, many=True, context=self.get_serializer_context())
-            return paginator.get_paginated_response(serializer.data)
+        # Keyset pagination: ?before_id= pages back through history,
+        # ?after_id= fetches what is newer than a message
+        try:
+            before_id, after_id = (
+                int(request.query_params[name]) if request.query_params.get(name) else None
+                for name in ('before_id', 'after_id')
+            )
+            limit = min(int(request.query_params.get('page_size', DEFAULT_PAGE_SIZE)), MAX_PAGE_SIZE)
+        except ValueError:
+            return Response(
+                {'error': 'before_id, after_id and page_size must be integers'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
         
+        messages, has_more = message_page(conversation.id, before_id, after_id, max(limit, 1))
         serializer = MessageSerializer(messages, many=True, context=self.get_serializer_context())
-        return Response(serializer.data)
+        return Response({'results': serializer.data, 'has_more': has_more})
 
     @action(detail=True, methods=['POST'])
     def mark_as_read(self, request, pk=None):
@@ -225,12 +214,13 @@ class ConversationViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_403_FORBIDDEN
             )
         
-        # Mark all messages as read except those sent by the current user
-        conversation.messages.filter(
-            is_read=False
-        ).exclude(
-            sender=request.user
-        ).update(is_read=True)
+        # Move the user's read watermark to the latest message
+        last_read_message_id = mark_read_through(conversation.id, request.user)
+        if last_read_message_id:
+            async_to_sync(broadcast_read_receipt)(
+                get_channel_layer(), conversation.id, request.user.id, last_read_message_id,
+                conversation_participant_ids(conversation.id) - {request.user.id}
+            )
         
         return Response({'message': 'Messages marked as read'})
 
@@ -253,6 +243,30 @@ class MessageViewSet(viewsets.ModelViewSet):
         context['request'] = self.request
         return context
 
+    @action(detail=False, methods=['GET'])
+    def search(self, request):
+        """
+        Search the messages of the user's conversations (optionally one of
+        them with ?conversation_id=), newest first. Older hits are fetched
+        with ?before_id= set to the last hit's id.
+        """
+        query = request.query_params.get('q', '').strip()
+        try:
+            conversation_id, before_id = (
+                int(request.query_params[name]) if request.query_params.get(name) else None
+                for name in ('conversation_id', 'before_id')
+            )
+            limit = min(int(request.query_params.get('page_size', SEARCH_PAGE_SIZE)), SEARCH_MAX_PAGE_SIZE)
+        except ValueError:
+            return Response(
+                {'error': 'conversation_id, before_id and page_size must be integers'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        messages, has_more = search_messages(request.user, query, conversation_id, before_id, max(limit, 1))
+        serializer = MessageSearchResultSerializer(messages, many=True, context=self.get_serializer_context())
+        return Response({'results': serializer.data, 'has_more': has_more})
+
     @action(detail=True, methods=['POST'])
     def mark_as_read(self, request, pk=None):
         """
@@ -267,9 +281,14 @@ class MessageViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_403_FORBIDDEN
             )
         
-        # Only mark as read if the user is not the sender
-        if message.sender != request.user:
-            message.is_read = True
-            message.save()
+        # Only mark as read if the user is not the sender; this reads
+        # everything up to the message
+        if message.sender_id != request.user.id:
+            last_read_message_id = mark_read_through(message.conversation_id, request.user, message.id)
+            if last_read_message_id:
+                async_to_sync(broadcast_read_receipt)(
+                    get_channel_layer(), message.conversation_id, request.user.id, last_read_message_id,
+                    conversation_participant_ids(message.conversation_id) - {request.user.id}
+                )
         
         return Response({'message': 'Message marked as read'})
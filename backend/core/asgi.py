@@ -47,6 +47,7 @@ from notifications.consumers import NotificationConsumer
 from chat.consumers import ChatConsumer
 from chat.chat_notification_consumer import ChatNotificationConsumer
 from chat.middleware import TokenAuthMiddlewareStack
+from core.multiplex import MultiplexConsumer
 
 # Get the Django ASGI application (for HTTP)
 django_asgi_app = get_asgi_application()
@@ -56,6 +57,7 @@ print("   WebSocket Routes:")
 print("   - /ws/notifications/")
 print("   - /ws/chat/<int:conversation_id>/")
 print("   - /ws/chat_notifications/")
+print("   - /ws/ (multiplexed)")
 
 application = ProtocolTypeRouter({
     "http": django_asgi_app,
@@ -64,6 +66,7 @@ application = ProtocolTypeRouter({
             path('ws/notifications/', TokenAuthMiddlewareStack(NotificationConsumer.as_asgi())),
             path('ws/chat/<int:conversation_id>/', TokenAuthMiddlewareStack(ChatConsumer.as_asgi())),
             path('ws/chat_notifications/', TokenAuthMiddlewareStack(ChatNotificationConsumer.as_asgi())),
+            path('ws/', TokenAuthMiddlewareStack(MultiplexConsumer.as_asgi())),
         ])
     ),
 })
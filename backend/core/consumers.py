@@ -0,0 +1,75 @@
+import asyncio
+from collections import deque
+
+from .encoding import JSONDecodeError, RawJSON, dumps, loads
+
+
+def event_payload(event, key):
+    """
+    Payload of a group event: the text its sender encoded once, as RawJSON,
+    or the object under ``key`` in events of senders that do not encode
+    """
+    if 'text' in event:
+        return RawJSON(event['text'])
+    return event[key]
+
+
+class FastJSONConsumerMixin:
+    """
+    JSON helpers for AsyncWebsocketConsumer subclasses, encoding with orjson
+    when available (see core.encoding). RawJSON content is sent as-is.
+    """
+    JSONDecodeError = JSONDecodeError
+
+    @staticmethod
+    def decode_json(text_data):
+        return loads(text_data)
+
+    async def send_json(self, content, close=False):
+        await self.send(text_data=dumps(content), close=close)
+
+
+class CoalescingSendMixin:
+    """
+    Bounded per-connection send queue for FastJSONConsumerMixin consumers.
+    Frames queued within ``coalesce_window`` seconds of each other are
+    flushed together through ``coalesce_frames``, which may merge them into
+    fewer frames. When more than ``send_queue_limit`` frames pile up the
+    oldest are dropped, and the flush is told how many.
+    """
+    coalesce_window = 0.05
+    send_queue_limit = 100
+
+    def queue_frame(self, frame):
+        if not hasattr(self, '_send_queue'):
+            self._send_queue = deque(maxlen=self.send_queue_limit)
+            self._dropped_frames = 0
+            self._flush_task = None
+        if len(self._send_queue) == self._send_queue.maxlen:
+            self._dropped_frames += 1
+        self._send_queue.append(frame)
+        if self._flush_task is None:
+            self._flush_task = asyncio.ensure_future(self._flush_after_window())
+
+    async def _flush_after_window(self):
+        await asyncio.sleep(self.coalesce_window)
+        frames, dropped = list(self._send_queue), self._dropped_frames
+        self._send_queue.clear()
+        self._dropped_frames = 0
+        self._flush_task = None
+        try:
+            for frame in self.coalesce_frames(frames, dropped):
+                await self.send_json(frame)
+        except Exception as e:
+            print(f"❌ Error flushing WebSocket frames: {str(e)}")
+
+    def coalesce_frames(self, frames, dropped):
+        """Frames to send for a window of queued frames (as queued by default)"""
+        return frames
+
+    def cancel_queued_frames(self):
+        """Drop whatever is still queued (call on disconnect)"""
+        task = getattr(self, '_flush_task', None)
+        if task is not None:
+            task.cancel()
+            self._flush_task = None
@@ -0,0 +1,54 @@
+"""
+Database work of WebSocket consumers off the event loop.
+
+Django's async ORM methods (aget, acreate, aupdate, ...) run every call
+through sync_to_async on the single thread-sensitive executor that the whole
+process shares, so each query of each socket is one more hop queued behind
+everyone else's. Consumers instead wrap each database operation (saving a
+message, for instance, is an INSERT and two UPDATEs) in ``db_async``, which
+runs it as one call on a dedicated pool of ``DB_EXECUTOR_WORKERS`` threads,
+each holding its own connection.
+
+With ``DB_EXECUTOR_WORKERS = 0`` operations run on the thread-sensitive
+executor like channels' database_sync_to_async: development and tests, whose
+TestCase transactions belong to the main thread's connection.
+"""
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from channels.db import DatabaseSyncToAsync
+from django.conf import settings
+
+_executor = None
+_executor_workers = 0
+_executor_lock = threading.Lock()
+
+
+def get_db_executor():
+    """The pool of database threads, or None when it is disabled"""
+    global _executor, _executor_workers
+    workers = settings.DB_EXECUTOR_WORKERS
+    if not workers:
+        return None
+    with _executor_lock:
+        if _executor is None or _executor_workers != workers:
+            _executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='db')
+            _executor_workers = workers
+        return _executor
+
+
+def db_async(func):
+    """
+    Make a sync database operation awaitable; stale connections are closed
+    around it as with database_sync_to_async
+    """
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        executor = get_db_executor()
+        if executor is None:
+            call = DatabaseSyncToAsync(func)
+        else:
+            call = DatabaseSyncToAsync(func, thread_sensitive=False, executor=executor)
+        return await call(*args, **kwargs)
+    return wrapper
@@ -0,0 +1,74 @@
+"""
+Fast JSON encoding shared by the API renderer and the WebSocket consumers.
+
+Uses orjson when it is installed and falls back to the standard library
+otherwise. Values orjson does not handle natively (datetimes, Decimals, lazy
+strings, ...) are converted by DRF's own encoder, so the output matches what
+``rest_framework.renderers.JSONRenderer`` produces.
+"""
+import json
+
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - exercised only without orjson
+    orjson = None
+
+_drf_encoder = JSONEncoder()
+
+if orjson is not None:
+    JSONDecodeError = orjson.JSONDecodeError  # Subclass of json.JSONDecodeError
+    # Datetimes go through DRF's encoder ("...Z" for UTC, full precision)
+    _OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+else:
+    JSONDecodeError = json.JSONDecodeError
+
+
+def _escape_line_separators(data):
+    # Same as JSONRenderer: U+2028/U+2029 are valid JSON but break JavaScript
+    return data.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
+
+
+def dumps_bytes(obj):
+    """Compact UTF-8 JSON bytes, formatted like DRF's JSONRenderer"""
+    if orjson is not None:
+        try:
+            return _escape_line_separators(orjson.dumps(obj, default=_drf_encoder.default, option=_OPTIONS))
+        except orjson.JSONEncodeError:
+            pass  # e.g. integers above 64 bits; the stdlib handles them
+    data = json.dumps(obj, cls=JSONEncoder, ensure_ascii=False, allow_nan=False, separators=(',', ':'))
+    return _escape_line_separators(data.encode('utf-8'))
+
+
+class RawJSON(str):
+    """
+    JSON text that is already encoded, e.g. the payload of a group broadcast
+    encoded once by its sender. ``dumps`` inserts it as-is when it is the
+    whole value or a top-level value of a dict (deeper down it would be
+    encoded as a string).
+    """
+
+
+def dumps(obj):
+    """Compact JSON text (for WebSocket text frames)"""
+    if isinstance(obj, RawJSON):
+        return str(obj)
+    if isinstance(obj, dict):
+        raw = [(key, value) for key, value in obj.items() if isinstance(value, RawJSON)]
+        if raw:
+            text = dumps({key: value for key, value in obj.items() if not isinstance(value, RawJSON)})
+            members = ','.join(f'{dumps(key)}:{value}' for key, value in raw)
+            return '{' + members + '}' if text == '{}' else f'{text[:-1]},{members}}}'
+    return dumps_bytes(obj).decode('utf-8')
+
+
+def decoded(value):
+    """The object behind a value that may be RawJSON"""
+    return loads(str(value)) if isinstance(value, RawJSON) else value
+
+
+def loads(data):
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
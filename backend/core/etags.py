@@ -0,0 +1,46 @@
+"""
+Conditional GET helpers for API views.
+
+ETags are built from version stamps and row timestamps (never from the
+rendered body), so a view can answer ``If-None-Match`` with a 304 before it
+runs the queries needed to serialize the resource.
+"""
+import hashlib
+
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import quote_etag
+
+
+def make_etag(*parts):
+    """Weak ETag of the given parts (anything with a stable repr)"""
+    digest = hashlib.md5(repr(parts).encode('utf-8'), usedforsecurity=False).hexdigest()
+    return 'W/' + quote_etag(digest)
+
+
+def viewer_key(request):
+    """Part of an ETag for resources that render differently per viewer"""
+    user = getattr(request, 'user', None)
+    return user.pk if user is not None and user.is_authenticated else None
+
+
+def not_modified(request, etag):
+    """A 304 response when the client already holds ``etag``, else None"""
+    response = get_conditional_response(request, etag=etag)
+    if response is not None:
+        _set_validators(response, etag)
+    return response
+
+
+def with_etag(response, etag):
+    """Attach the ETag to a successful response"""
+    if response.status_code == 200:
+        _set_validators(response, etag)
+    return response
+
+
+def _set_validators(response, etag):
+    # The body depends on the token, so shared caches must not store it and
+    # browsers always revalidate
+    response['ETag'] = etag
+    patch_cache_control(response, private=True, no_cache=True)
+    patch_vary_headers(response, ('Authorization',))
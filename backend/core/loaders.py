@@ -0,0 +1,170 @@
+"""
+Request-scoped batching of related-object lookups for serializers.
+
+Serializers ask the registry for things like "user 42" or "images of post 17"
+instead of touching the ORM per object. Keys are collected up front with
+``defer`` and every pending key of one kind is resolved by a single query the
+first time any of them is loaded.
+
+Usage in a serializer:
+
+    loaders = get_loaders(self.context)
+    author = loaders.for_model(User).load(obj.author_id)
+    images = loaders.for_model(PostImage, 'post_id', many=True).load(obj.id)
+    likes = loaders.named('posts.likes_count').load(obj.id)
+"""
+from collections import defaultdict
+
+from django.db import models
+from rest_framework import serializers
+
+# name -> (batch function, default) for loaders registered by the apps
+_named_loaders = {}
+
+
+def register_loader(name, default=None):
+    """
+    Register a batch function under ``name``.
+
+    The function is called as ``fn(keys, registry)`` and must return a dict
+    mapping each found key to its value. Missing keys resolve to ``default``
+    (a callable default is called once per missing key).
+    """
+    def decorator(fn):
+        _named_loaders[name] = (fn, default)
+        return fn
+    return decorator
+
+
+class DataLoader:
+    """
+    Collects keys of one kind and resolves them in one batch call.
+    """
+
+    def __init__(self, batch_fn, default=None):
+        self.batch_fn = batch_fn
+        self.default = default
+        self._pending = set()
+        self._results = {}
+
+    def _default(self):
+        return self.default() if callable(self.default) else self.default
+
+    def defer(self, key):
+        """Queue a key to be resolved with the next batch"""
+        if key is not None and key not in self._results:
+            self._pending.add(key)
+
+    def defer_many(self, keys):
+        for key in keys:
+            self.defer(key)
+
+    def prime(self, key, value):
+        """Seed a value that is already known so it is never queried"""
+        self._results.setdefault(key, value)
+        self._pending.discard(key)
+
+    def dispatch(self):
+        """Resolve every pending key with a single call to the batch function"""
+        if not self._pending:
+            return
+        keys = list(self._pending)
+        self._pending = set()
+        found = self.batch_fn(keys)
+        for key in keys:
+            self._results[key] = found[key] if key in found else self._default()
+
+    def load(self, key):
+        if key is None:
+            return self._default()
+        if key not in self._results:
+            self._pending.add(key)
+            self.dispatch()
+        return self._results[key]
+
+    def load_many(self, keys):
+        keys = [key for key in keys if key is not None]
+        self.defer_many(keys)
+        self.dispatch()
+        return [self._results[key] for key in keys]
+
+
+class LoaderRegistry:
+    """
+    Holds the loaders of one request, keyed by model and lookup.
+    """
+
+    def __init__(self, viewer=None):
+        # Authenticated user the response is rendered for (None for anonymous)
+        self.viewer = viewer
+        self._loaders = {}
+
+    def for_model(self, model, field='pk', many=False, manager='_default_manager'):
+        """
+        Loader returning ``model`` rows by ``field``.
+
+        With ``many=True`` every key resolves to a list of rows (in the model's
+        default ordering), e.g. ``for_model(PostImage, 'post_id', many=True)``.
+        """
+        key = (model._meta.label, field, many, manager)
+        loader = self._loaders.get(key)
+        if loader is None:
+            def batch(keys):
+                rows = getattr(model, manager).filter(**{f'{field}__in': keys})
+                if not many:
+                    return {getattr(row, field): row for row in rows}
+                grouped = defaultdict(list)
+                for row in rows:
+                    grouped[getattr(row, field)].append(row)
+                return grouped
+
+            loader = self._loaders[key] = DataLoader(batch, default=list if many else None)
+        return loader
+
+    def named(self, name):
+        """Loader registered with ``register_loader``"""
+        loader = self._loaders.get(name)
+        if loader is None:
+            batch_fn, default = _named_loaders[name]
+            loader = self._loaders[name] = DataLoader(
+                lambda keys: batch_fn(keys, self), default=default
+            )
+        return loader
+
+
+def get_loaders(context):
+    """
+    Return the loader registry for a serializer context.
+
+    The registry lives on the request when there is one, so every serializer
+    rendered for that request shares it; otherwise it is stored in the context.
+    """
+    request = context.get('request')
+    if request is None:
+        registry = context.get('_loaders')
+        if registry is None:
+            registry = context['_loaders'] = LoaderRegistry()
+        return registry
+
+    registry = getattr(request, '_loaders', None)
+    if registry is None:
+        user = getattr(request, 'user', None)
+        viewer = user if user is not None and user.is_authenticated else None
+        registry = LoaderRegistry(viewer=viewer)
+        request._loaders = registry
+    return registry
+
+
+class BatchingListSerializer(serializers.ListSerializer):
+    """
+    ListSerializer that lets the child queue the lookups of the whole page
+    (``child.prime_loaders(instances, loaders)``) before any item is rendered.
+    """
+
+    def to_representation(self, data):
+        iterable = data.all() if isinstance(data, models.manager.BaseManager) else data
+        items = list(iterable)
+        prime_loaders = getattr(self.child, 'prime_loaders', None)
+        if items and prime_loaders is not None:
+            prime_loaders(items, get_loaders(self.context))
+        return super().to_representation(items)
@@ -0,0 +1,235 @@
+"""
+Multiplexed WebSocket endpoint (``ws/``).
+
+One socket per client carries the streams that used to need a socket each,
+so the JWT is checked once per connection (TokenAuthMiddleware). Clients
+subscribe to the streams they need:
+
+    {"action": "subscribe", "stream": "notifications", "since": 123}
+    {"action": "subscribe", "stream": "chat_notifications"}
+    {"action": "subscribe", "stream": "chat", "conversation_id": 12}
+    {"action": "unsubscribe", "stream": "chat", "conversation_id": 12}
+
+and address stream actions the same way, e.g.
+``{"stream": "chat", "conversation_id": 12, "action": "send_message", "content": "hi"}``
+(``send_messages`` with a ``contents`` list saves a batch with one INSERT).
+Server frames are ``{"stream": ..., "payload": ...}`` (plus
+``conversation_id`` on the chat stream), with the payloads the dedicated
+endpoints send. Notification frames go through the connection's bounded
+send queue (CoalescingSendMixin), so a burst still collapses into one
+notification_batch payload; chat and chat_notifications frames are sent
+right away and never dropped, as by the dedicated consumers.
+"""
+from channels.generic.websocket import AsyncWebsocketConsumer
+
+from chat.consumers import (
+    TypingStateMixin, batched_contents, broadcast_message, broadcast_read_receipt, conversation_participant_ids,
+    create_message, create_messages, mark_message_read, member_group_name,
+)
+from notifications.consumers import notification_batch, replay_batch
+from .consumers import CoalescingSendMixin, FastJSONConsumerMixin, event_payload
+from .db import db_async
+from .encoding import RawJSON
+from .presence import PresenceMixin
+
+STREAMS = ('notifications', 'chat_notifications', 'chat')
+
+
+class MultiplexConsumer(PresenceMixin, TypingStateMixin, CoalescingSendMixin, FastJSONConsumerMixin, AsyncWebsocketConsumer):
+    async def connect(self):
+        if self.scope["user"].is_anonymous:
+            await self.close()
+            return
+        self.user = self.scope["user"]
+        # Channel layer groups joined, by (stream, conversation_id)
+        self.subscriptions = {}
+        # Cached participant ids of the subscribed conversations, kept current
+        # by participants_changed events
+        self.chat_participants = {}
+        await self.accept()
+        await self.join_presence(self.user.id)
+
+    async def disconnect(self, close_code):
+        self.cancel_queued_frames()
+        await self.leave_presence()
+        await self.stop_all_typing()
+        for group_names in getattr(self, 'subscriptions', {}).values():
+            for group_name in group_names:
+                await self.channel_layer.group_discard(group_name, self.channel_name)
+
+    async def receive(self, text_data):
+        try:
+            data = self.decode_json(text_data)
+        except self.JSONDecodeError:
+            await self.send_json({'type': 'error', 'message': 'Invalid JSON format'})
+            return
+
+        stream = data.get('stream')
+        action = data.get('action')
+        if stream not in STREAMS:
+            await self.send_json({'type': 'error', 'message': f'Unknown stream: {stream}'})
+            return
+        conversation_id = data.get('conversation_id') if stream == 'chat' else None
+        if stream == 'chat' and not isinstance(conversation_id, int):
+            await self.send_json({'type': 'error', 'stream': stream, 'message': 'conversation_id is required'})
+            return
+
+        try:
+            if action == 'subscribe':
+                await self.subscribe(stream, conversation_id, data)
+            elif action == 'unsubscribe':
+                await self.unsubscribe(stream, conversation_id)
+            elif (stream, conversation_id) not in self.subscriptions:
+                await self.send_json({'type': 'error', 'stream': stream, 'message': 'Not subscribed'})
+            elif stream == 'chat':
+                await self.chat_action(conversation_id, action, data)
+            elif stream == 'notifications' and action == 'mark_as_read':
+                if data.get('notification_id'):
+                    await self.mark_notification_as_read(data['notification_id'])
+        except Exception as e:
+            print(f"❌ Error handling {stream} action {action}: {str(e)}")
+            await self.send_json({'type': 'error', 'stream': stream, 'message': 'Action failed'})
+
+    async def subscribe(self, stream, conversation_id, data):
+        key = (stream, conversation_id)
+        if key not in self.subscriptions:
+            if stream == 'chat':
+                participant_ids = await db_async(conversation_participant_ids)(conversation_id)
+                if self.user.id not in participant_ids:
+                    await self.send_json({
+                        'type': 'error', 'stream': stream, 'conversation_id': conversation_id,
+                        'message': 'Not a participant'
+                    })
+                    return
+                self.chat_participants[conversation_id] = participant_ids
+                group_names = (f"chat_{conversation_id}", member_group_name(conversation_id, self.user.id))
+            else:
+                group_names = (f"{stream}_{self.user.id}",)
+            for group_name in group_names:
+                await self.channel_layer.group_add(group_name, self.channel_name)
+            self.subscriptions[key] = group_names
+
+        ack = {'type': 'subscribed', 'stream': stream}
+        if conversation_id is not None:
+            ack['conversation_id'] = conversation_id
+        await self.send_json(ack)
+
+        since = data.get('since')
+        if stream == 'notifications' and isinstance(since, int):
+            replay = await db_async(replay_batch)(self.user.id, since)
+            await self.send_json({'stream': 'notifications', 'payload': replay})
+
+    async def unsubscribe(self, stream, conversation_id):
+        group_names = self.subscriptions.pop((stream, conversation_id), ())
+        if stream == 'chat':
+            await self.stop_typing(conversation_id)
+            self.chat_participants.pop(conversation_id, None)
+        for group_name in group_names:
+            await self.channel_layer.group_discard(group_name, self.channel_name)
+        ack = {'type': 'unsubscribed', 'stream': stream}
+        if conversation_id is not None:
+            ack['conversation_id'] = conversation_id
+        await self.send_json(ack)
+
+    async def chat_action(self, conversation_id, action, data):
+        if action == 'send_message':
+            content = data.get('content', '')
+            if content.strip():
+                await self.stop_typing(conversation_id)
+                message = await db_async(create_message)(conversation_id, self.user, content)
+                if message:
+                    participant_ids = self.typing_recipients(conversation_id)
+                    await broadcast_message(self.channel_layer, conversation_id, message, participant_ids)
+        elif action == 'send_messages':
+            contents = batched_contents(data.get('contents'))
+            if contents:
+                await self.stop_typing(conversation_id)
+                messages = await db_async(create_messages)(conversation_id, self.user, contents)
+                participant_ids = self.typing_recipients(conversation_id)
+                for message in messages:
+                    await broadcast_message(self.channel_layer, conversation_id, message, participant_ids)
+        elif action == 'typing':
+            # Other participants only hear about typing state changes
+            await self.update_typing(conversation_id, data.get('is_typing', False))
+        elif action == 'mark_as_read':
+            if data.get('message_id'):
+                last_read_message_id = await db_async(mark_message_read)(
+                    conversation_id, self.user, data['message_id']
+                )
+                if last_read_message_id:
+                    await broadcast_read_receipt(
+                        self.channel_layer, conversation_id, self.user.id, last_read_message_id,
+                        self.typing_recipients(conversation_id)
+                    )
+
+    # Channel layer events of the subscribed groups; payloads encoded by the
+    # sender are wrapped in the stream envelope without being encoded again
+
+    async def notification_message(self, event):
+        self.queue_frame({'stream': 'notifications', 'payload': event_payload(event, 'message')})
+
+    async def chat_notification(self, event):
+        await self.send_json({'stream': 'chat_notifications', 'payload': event_payload(event, 'notification')})
+
+    async def chat_message(self, event):
+        if 'text' in event:
+            payload = RawJSON(event['text'])
+        else:
+            payload = {'type': 'chat_message', 'message': event['message']}
+        await self.send_json({'stream': 'chat', 'conversation_id': event['conversation_id'], 'payload': payload})
+
+    async def typing_indicator(self, event):
+        await self.send_json({
+            'stream': 'chat',
+            'conversation_id': event['conversation_id'],
+            'payload': {
+                'type': 'typing_indicator',
+                'user_id': event['user_id'],
+                'username': event['username'],
+                'is_typing': event['is_typing']
+            }
+        })
+
+    async def read_receipt(self, event):
+        await self.send_json({
+            'stream': 'chat',
+            'conversation_id': event['conversation_id'],
+            'payload': {
+                'type': 'read_receipt',
+                'user_id': event['user_id'],
+                'last_read_message_id': event['last_read_message_id']
+            }
+        })
+
+    async def participants_changed(self, event):
+        conversation_id = event['conversation_id']
+        if ('chat', conversation_id) not in self.subscriptions:
+            return
+        participant_ids = set(event['participant_ids'])
+        if self.user.id in participant_ids:
+            self.chat_participants[conversation_id] = participant_ids
+        else:
+            # Removed from the conversation: drop the subscription
+            await self.unsubscribe('chat', conversation_id)
+
+    def typing_recipients(self, conversation_id):
+        """The other participants of a subscribed conversation"""
+        return [user_id for user_id in self.chat_participants.get(conversation_id, ()) if user_id != self.user.id]
+
+    def coalesce_frames(self, frames, dropped):
+        """
+        Merge the notification frames of a window into one batch; frames
+        dropped from the queue are reported by its ``truncated`` flag
+        """
+        if len(frames) == 1 and not dropped:
+            return frames
+        payload = notification_batch([frame['payload'] for frame in frames], dropped)
+        return [{'stream': 'notifications', 'payload': payload}]
+
+    @db_async
+    def mark_notification_as_read(self, notification_id):
+        from notifications.models import Notification
+        from notifications.services import mark_notification_read
+        notification = Notification.objects.filter(id=notification_id, recipient=self.user).first()
+        if notification:
+            mark_notification_read(notification)
@@ -0,0 +1,215 @@
+"""
+Who is connected.
+
+Consumers register each WebSocket connection at connect (PresenceMixin),
+refresh it with a heartbeat while it stays open and remove it at
+disconnect. A user is online while one of their connections has a heartbeat
+younger than ``PRESENCE_TIMEOUT`` seconds, so the connections of a process
+that died expire on their own.
+
+Senders check ``online_user_ids`` before a fan-out to per-user groups and
+skip users with no sockets: what they miss is saved and fetched (or
+replayed) when they connect. Conversation lists ask for the presence of a
+page of users in one call (the ``users.online`` loader).
+
+``PRESENCE_BACKEND`` picks the registry: CachePresence counts connections
+in the shared cache, which is shared exactly when the channel layer is
+(Redis in production, local memory in development); LocalPresence keeps
+them in process memory, for tests.
+"""
+import asyncio
+import threading
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.utils.module_loading import import_string
+
+
+class BasePresence:
+    """
+    Registry of open connections. ``connect`` registers a connection,
+    ``heartbeat`` keeps it alive and ``disconnect`` removes it; a connection
+    that misses its heartbeats for ``timeout`` seconds expires.
+    """
+
+    def __init__(self, timeout):
+        self.timeout = timeout
+
+    def connect(self, user_id, channel_name):
+        raise NotImplementedError
+
+    def heartbeat(self, user_id, channel_name):
+        raise NotImplementedError
+
+    def disconnect(self, user_id, channel_name):
+        raise NotImplementedError
+
+    def online_user_ids(self, user_ids):
+        """The users of ``user_ids`` with at least one live connection"""
+        raise NotImplementedError
+
+    def is_online(self, user_id):
+        return bool(self.online_user_ids([user_id]))
+
+
+class CachePresence(BasePresence):
+    """
+    A count of open connections per user in the shared cache, changed with
+    the cache's atomic incr/decr so that sockets opening or closing at the
+    same moment are all counted. The key expires ``timeout`` seconds after
+    the newest heartbeat, which clears the count of a process that died.
+
+    A heartbeat finding the count gone (evicted or expired) or not positive
+    counts its connection again: errors only ever over-count, which costs
+    sends to a user who left until the key expires, never frames lost by a
+    user who is there.
+    """
+
+    @staticmethod
+    def _key(user_id):
+        return f'presence:{user_id}'
+
+    def connect(self, user_id, channel_name):
+        key = self._key(user_id)
+        for _ in range(3):
+            cache.add(key, 0, self.timeout)
+            try:
+                cache.incr(key)
+            except ValueError:
+                continue  # Expired between add and incr
+            cache.touch(key, self.timeout)
+            return
+
+    def heartbeat(self, user_id, channel_name):
+        count = cache.get(self._key(user_id))
+        if count is None or count <= 0:
+            self.connect(user_id, channel_name)
+        else:
+            cache.touch(self._key(user_id), self.timeout)
+
+    def disconnect(self, user_id, channel_name):
+        try:
+            cache.decr(self._key(user_id))
+        except ValueError:
+            pass  # Already expired
+
+    def online_user_ids(self, user_ids):
+        keys = {self._key(user_id): user_id for user_id in user_ids}
+        return {keys[key] for key, count in cache.get_many(list(keys)).items() if count > 0}
+
+
+class LocalPresence(BasePresence):
+    """
+    Connections in process memory as {user_id: {channel_name: last
+    heartbeat}}, changed under one lock
+    """
+
+    def __init__(self, timeout):
+        super().__init__(timeout)
+        self._connections = {}
+        self._lock = threading.Lock()
+
+    def _live(self, connections, now):
+        return {name: seen for name, seen in connections.items() if seen > now - self.timeout}
+
+    def connect(self, user_id, channel_name):
+        now = time.time()
+        with self._lock:
+            connections = self._live(self._connections.get(user_id, {}), now)
+            connections[channel_name] = now
+            self._connections[user_id] = connections
+
+    heartbeat = connect
+
+    def disconnect(self, user_id, channel_name):
+        now = time.time()
+        with self._lock:
+            connections = self._live(self._connections.get(user_id, {}), now)
+            connections.pop(channel_name, None)
+            if connections:
+                self._connections[user_id] = connections
+            else:
+                self._connections.pop(user_id, None)
+
+    def online_user_ids(self, user_ids):
+        now = time.time()
+        with self._lock:
+            return {
+                user_id for user_id in set(user_ids)
+                if self._live(self._connections.get(user_id, {}), now)
+            }
+
+    def clear(self):
+        with self._lock:
+            self._connections.clear()
+
+
+_presence = None
+
+
+def get_presence():
+    """The configured presence registry"""
+    global _presence
+    if _presence is None:
+        _presence = import_string(settings.PRESENCE_BACKEND)(settings.PRESENCE_TIMEOUT)
+    return _presence
+
+
+@receiver(setting_changed)
+def _reset_presence(setting, **kwargs):
+    global _presence
+    if setting in ('PRESENCE_BACKEND', 'PRESENCE_TIMEOUT'):
+        _presence = None
+
+
+def online_user_ids(user_ids):
+    """The users of ``user_ids`` that have a WebSocket connection open"""
+    try:
+        return get_presence().online_user_ids(user_ids)
+    except Exception as e:
+        # Without presence information, treat everyone as online
+        print(f"❌ Error reading presence: {str(e)}")
+        return set(user_ids)
+
+
+def is_online(user_id):
+    return user_id in online_user_ids([user_id])
+
+
+class PresenceMixin:
+    """
+    Presence registration for AsyncWebsocketConsumer subclasses: call
+    ``join_presence`` once the connection is accepted and ``leave_presence``
+    on disconnect. A heartbeat refreshes the connection every third of the
+    timeout while it stays open.
+    """
+
+    async def join_presence(self, user_id):
+        self._presence_user_id = user_id
+        await self._presence_call('connect')
+        self._presence_task = asyncio.ensure_future(self._presence_heartbeats())
+
+    async def leave_presence(self):
+        task = getattr(self, '_presence_task', None)
+        if task is None:
+            return
+        task.cancel()
+        self._presence_task = None
+        await self._presence_call('disconnect')
+
+    async def _presence_heartbeats(self):
+        while True:
+            await asyncio.sleep(settings.PRESENCE_TIMEOUT / 3)
+            await self._presence_call('heartbeat')
+
+    async def _presence_call(self, method):
+        try:
+            # Cache calls are thread-safe and need no thread of their own
+            update = sync_to_async(getattr(get_presence(), method), thread_sensitive=False)
+            await update(self._presence_user_id, self.channel_name)
+        except Exception as e:
+            print(f"❌ Error updating presence: {str(e)}")
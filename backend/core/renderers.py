@@ -0,0 +1,19 @@
+from rest_framework.renderers import JSONRenderer
+
+from .encoding import dumps_bytes
+
+
+class ORJSONRenderer(JSONRenderer):
+    """
+    Drop-in JSONRenderer encoding with orjson (see core.encoding).
+
+    Indented output (``?indent=`` / ``Accept: application/json; indent=4``)
+    is left to the stdlib renderer.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        if self.get_indent(accepted_media_type or '', renderer_context or {}):
+            return super().render(data, accepted_media_type, renderer_context)
+        return dumps_bytes(data)
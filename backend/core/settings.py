@@ -91,6 +91,19 @@ CHANNEL_LAYERS = {
     }
 }
 
+# Queued notifications are delivered by the deliver_notifications worker when
+# True; the in-memory channel layer only reaches this process, so deliver inline
+NOTIFICATION_QUEUE_WORKER = False
+
+# WebSocket presence (core.presence): connections are counted in the cache and
+# expire PRESENCE_TIMEOUT seconds after their last heartbeat
+PRESENCE_BACKEND = 'core.presence.CachePresence'
+PRESENCE_TIMEOUT = 90
+
+# Threads running the database work of WebSocket consumers (core.db); 0 keeps
+# it on the thread-sensitive executor, which TestCase transactions need
+DB_EXECUTOR_WORKERS = 0
+
 # Cache configuration (development uses local memory)
 CACHES = {
     'default': {
@@ -231,12 +244,16 @@ AUTH_USER_MODEL = 'users.User'
 # REST Framework settings
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'users.authentication.CachedJWTAuthentication',
     ),
     'DEFAULT_PERMISSION_CLASSES': (
         'rest_framework.permissions.IsAuthenticated',
     ),
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
+    'DEFAULT_RENDERER_CLASSES': (
+        'core.renderers.ORJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ),
     'PAGE_SIZE': 10,
     'EXCEPTION_HANDLER': 'core.exceptions.custom_exception_handler'
 }
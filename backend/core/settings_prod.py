@@ -81,6 +81,15 @@ TEMPLATES = [
 # Channels
 ASGI_APPLICATION = 'core.asgi.application'
 
+# WebSocket presence (core.presence): connections are counted in the cache and
+# expire PRESENCE_TIMEOUT seconds after their last heartbeat
+PRESENCE_BACKEND = 'core.presence.CachePresence'
+PRESENCE_TIMEOUT = 90
+
+# Threads running the database work of WebSocket consumers (core.db), each
+# with its own database connection
+DB_EXECUTOR_WORKERS = int(os.getenv('DB_EXECUTOR_WORKERS', '8'))
+
 # Redis for production (Render provides free Redis)
 REDIS_URL = os.getenv('REDIS_URL', 'redis://localhost:6379')
 
@@ -109,6 +118,9 @@ if REDIS_URL != 'redis://localhost:6379':
         },
     }
     
+    # Queued notifications are delivered by the deliver_notifications worker
+    NOTIFICATION_QUEUE_WORKER = True
+
     # Cache configuration (production uses Redis DB 1)
     CACHES = {
         'default': {
@@ -126,6 +138,7 @@ else:
             'BACKEND': 'channels.layers.InMemoryChannelLayer'
         }
     }
+    NOTIFICATION_QUEUE_WORKER = False
     CACHES = {
         'default': {
             'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
@@ -200,12 +213,16 @@ AUTH_USER_MODEL = 'users.User'
 # REST Framework settings
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'users.authentication.CachedJWTAuthentication',
     ),
     'DEFAULT_PERMISSION_CLASSES': (
         'rest_framework.permissions.IsAuthenticated',
     ),
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
+    'DEFAULT_RENDERER_CLASSES': (
+        'core.renderers.ORJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ),
     'PAGE_SIZE': 10
 }
 
@@ -0,0 +1,37 @@
+"""
+Version stamps kept in the shared cache.
+
+A version is an opaque nanosecond timestamp that is replaced whenever the
+thing it describes changes. Cached data is stored under keys that include the
+version, and ETags are built from versions, so bumping a stamp retires both
+without having to know every key derived from it.
+"""
+import time
+
+from django.core.cache import cache
+
+
+def new_version():
+    return time.time_ns()
+
+
+def bump_versions(keys):
+    """Give every key a new stamp"""
+    version = new_version()
+    cache.set_many({key: version for key in keys}, None)
+
+
+def get_versions(keys):
+    """
+    Return {key: version} for the given keys. Keys without a stamp get a fresh
+    one (not 0), so data cached before an eviction is never served again.
+    """
+    keys = list(keys)
+    found = cache.get_many(keys)
+    missing = [key for key in keys if key not in found]
+    if missing:
+        version = new_version()
+        for key in missing:
+            cache.add(key, version, None)
+        found.update(cache.get_many(missing))
+    return found
@@ -1,11 +1,46 @@
-import json
+from urllib.parse import parse_qs
+
 from channels.generic.websocket import AsyncWebsocketConsumer
-from channels.db import database_sync_to_async
 from django.contrib.auth import get_user_model
+from core.consumers import CoalescingSendMixin, FastJSONConsumerMixin, event_payload
+from core.db import db_async
+from core.encoding import decoded
+from core.presence import PresenceMixin
 
 User = get_user_model()
 
-class NotificationConsumer(AsyncWebsocketConsumer):
+
+def notification_batch(frames, dropped=0):
+    """
+    Merge a window of notification frames into one ``notification_batch``
+    frame; only the latest unread count is kept. ``truncated`` tells the
+    client that notifications were left out and the list should be refetched.
+    Frames still encoded (RawJSON) are decoded to be merged.
+    """
+    batch = {'type': 'notification_batch', 'notifications': []}
+    for frame in map(decoded, frames):
+        if frame.get('type') == 'unread_count':
+            batch['unread_count'] = frame['count']
+        else:
+            batch['notifications'].append(frame)
+    if dropped:
+        batch['truncated'] = True
+    return batch
+
+
+def replay_batch(user_id, since_id):
+    """notification_batch frame replaying the user's notifications after ``since_id``"""
+    from .services import get_unread_count, replay_notifications
+    payloads, truncated = replay_notifications(user_id, since_id)
+    batch = notification_batch(payloads)
+    batch['replay'] = True
+    batch['unread_count'] = get_unread_count(user_id)
+    if truncated:
+        batch['truncated'] = True
+    return batch
+
+
+class NotificationConsumer(PresenceMixin, CoalescingSendMixin, FastJSONConsumerMixin, AsyncWebsocketConsumer):
     async def connect(self):
         if self.scope["user"].is_anonymous:
             print("❌ Rejecting anonymous user notification connection")
@@ -21,6 +56,12 @@ class NotificationConsumer(AsyncWebsocketConsumer):
                     self.channel_name
                 )
                 await self.accept()
+                await self.join_presence(self.scope["user"].id)
+
+                # Catch up on what a reconnecting client missed (?since=<last notification id>)
+                since = parse_qs(self.scope["query_string"].decode()).get("since", [None])[0]
+                if since and since.isdigit():
+                    await self.send_json(await self.get_replay(int(since)))
             except Exception as e:
                 print(f"❌ Error during connection: {str(e)}")
                 import traceback
@@ -28,6 +69,8 @@ class NotificationConsumer(AsyncWebsocketConsumer):
                 await self.close()
 
     async def disconnect(self, close_code):
+        self.cancel_queued_frames()
+        await self.leave_presence()
         # Leave room group
         if hasattr(self, 'room_group_name'):
             await self.channel_layer.group_discard(
@@ -42,47 +85,49 @@ class NotificationConsumer(AsyncWebsocketConsumer):
         Currently used for marking notifications as read.
         """
         try:
-            text_data_json = json.loads(text_data)
+            text_data_json = self.decode_json(text_data)
             action = text_data_json.get('action')
             
             if action == 'mark_as_read':
                 notification_id = text_data_json.get('notification_id')
                 if notification_id:
                     await self.mark_notification_as_read(notification_id)
-                    await self.send(text_data=json.dumps({
+                    await self.send_json({
                         'status': 'success',
                         'message': 'Notification marked as read'
-                    }))
-        except json.JSONDecodeError:
-            await self.send(text_data=json.dumps({
+                    })
+        except self.JSONDecodeError:
+            await self.send_json({
                 'status': 'error',
                 'message': 'Invalid JSON format'
-            }))
+            })
 
     async def notification_message(self, event):
         """
-        Receive notification from room group
+        Receive notification from room group; bursts are coalesced into
+        notification_batch frames, a lone frame is sent as encoded by the sender
         """
-        message = event['message']
+        self.queue_frame(event_payload(event, 'message'))
 
-        try:
-            # Send message to WebSocket
-            await self.send(text_data=json.dumps(message))
-        except Exception as e:
-            print(f"❌ Error sending notification to WebSocket: {str(e)}")
-            import traceback
-            traceback.print_exc()
-
-    @database_sync_to_async
+    def coalesce_frames(self, frames, dropped):
+        if len(frames) == 1 and not dropped:
+            return frames
+        return [notification_batch(frames, dropped)]
+
+    @db_async
+    def get_replay(self, since_id):
+        return replay_batch(self.scope["user"].id, since_id)
+
+    @db_async
     def mark_notification_as_read(self, notification_id):
         from .models import Notification
+        from .services import mark_notification_read
         try:
             notification = Notification.objects.get(
                 id=notification_id,
                 recipient=self.scope["user"]
             )
-            notification.is_read = True
-            notification.save()
+            mark_notification_read(notification)
             return True
         except Notification.DoesNotExist:
-            return False 
\ No newline at end of file
+            return False
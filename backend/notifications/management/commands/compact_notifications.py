@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand
+
+from notifications.retention import (
+    DEFAULT_BATCH_SIZE, DEFAULT_RETENTION_DAYS, compact_notifications, expired_notifications,
+)
+
+
+class Command(BaseCommand):
+    help = 'Delete read notifications older than the retention period, keeping their groups as summaries'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=DEFAULT_RETENTION_DAYS,
+                            help='Retention period in days')
+        parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE,
+                            help='Notifications deleted per transaction')
+        parser.add_argument('--max-batches', type=int, default=None,
+                            help='Stop after this many batches')
+        parser.add_argument('--pause', type=float, default=0,
+                            help='Seconds to wait between batches')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Only count the notifications that would be deleted')
+
+    def handle(self, *args, **options):
+        days = options['days']
+        if options['dry_run']:
+            count = expired_notifications(days).count()
+            self.stdout.write(f'{count} read notifications older than {days} days would be deleted')
+            return
+
+        deleted, batches = compact_notifications(
+            days, options['batch_size'], options['max_batches'], options['pause']
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f'Deleted {deleted} read notifications older than {days} days in {batches} batches'
+        ))
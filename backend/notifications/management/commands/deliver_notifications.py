@@ -0,0 +1,34 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from notifications.queue import DEFAULT_BATCH_SIZE, deliver_pending_notifications
+
+
+class Command(BaseCommand):
+    help = 'Deliver queued notifications (run continuously as a worker, or once with --once)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE,
+                            help='Queue rows delivered per transaction')
+        parser.add_argument('--interval', type=float, default=0.5,
+                            help='Seconds to wait when the queue is empty')
+        parser.add_argument('--once', action='store_true',
+                            help='Drain the queue and exit')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        delivered = 0
+        while True:
+            try:
+                count = deliver_pending_notifications(batch_size)
+            except Exception as e:
+                print(f"❌ Error delivering notifications: {str(e)}")
+                count = 0
+                time.sleep(options['interval'])
+            delivered += count
+            if count < batch_size:
+                if options['once']:
+                    break
+                time.sleep(options['interval'])
+        self.stdout.write(self.style.SUCCESS(f'Delivered {delivered} queued notifications'))
@@ -0,0 +1,50 @@
+# Generated by Django 5.2.1 on 2026-10-19 04:15
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notifications', '0008_add_deduplication_fields'),
+        ('posts', '0034_post_is_removed_alter_appealevidencefile_file_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NotificationGroup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('notification_type', models.CharField(choices=[('like', 'Like'), ('comment', 'Comment'), ('follow', 'Follow'), ('repost', 'Repost'), ('donation', 'Donation'), ('report_received', 'Report Received'), ('post_removed', 'Post Removed for Multiple Reports'), ('appeal_approved', 'Appeal Approved'), ('appeal_rejected', 'Appeal Rejected'), ('art_verified', 'Art Verified')], max_length=20)),
+                ('latest_time', models.DateTimeField(default=django.utils.timezone.now)),
+                ('recent_sender_ids', models.JSONField(blank=True, default=list, help_text='Most recent distinct senders first, capped at RECENT_SENDER_LIMIT')),
+                ('sender_count', models.PositiveIntegerField(default=0, help_text='Number of distinct senders')),
+                ('total_count', models.PositiveIntegerField(default=0, help_text='Number of notifications in the group')),
+                ('is_read', models.BooleanField(default=False)),
+                ('comment', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='comment_notification_groups', to='posts.post')),
+                ('latest_notification', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='notifications.notification')),
+                ('post', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='notification_groups', to='posts.post')),
+                ('recipient', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='notification_groups', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-latest_time', '-id'],
+            },
+        ),
+        migrations.AddField(
+            model_name='notification',
+            name='group',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='notifications', to='notifications.notificationgroup'),
+        ),
+        migrations.AddIndex(
+            model_name='notificationgroup',
+            index=models.Index(fields=['recipient', '-latest_time', '-id'], name='notif_group_recipient_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='notificationgroup',
+            constraint=models.UniqueConstraint(condition=models.Q(('post__isnull', False)), fields=('recipient', 'notification_type', 'post'), name='notif_group_unique_post'),
+        ),
+    ]
@@ -0,0 +1,71 @@
+# Fold existing notifications into NotificationGroup rows
+
+from django.db import migrations
+
+RECENT_SENDER_LIMIT = 10
+
+
+def _fold(group, senders, notification):
+    # Same rules as NotificationGroup.record
+    if notification.sender_id and group.notification_type != 'report_received':
+        if notification.sender_id in group.recent_sender_ids:
+            group.recent_sender_ids.remove(notification.sender_id)
+        senders.add(notification.sender_id)
+        group.recent_sender_ids = [notification.sender_id, *group.recent_sender_ids][:RECENT_SENDER_LIMIT]
+    group.sender_count = len(senders)
+    group.total_count += 1
+    group.latest_time = notification.created_at
+    group.latest_notification_id = notification.id
+    if notification.comment_id:
+        group.comment_id = notification.comment_id
+    group.is_read = group.is_read and notification.is_read
+
+
+def backfill_groups(apps, schema_editor):
+    Notification = apps.get_model('notifications', 'Notification')
+    NotificationGroup = apps.get_model('notifications', 'NotificationGroup')
+
+    recipient_ids = set(
+        Notification.objects.filter(group__isnull=True).values_list('recipient_id', flat=True)
+    )
+    for recipient_id in recipient_ids:
+        groups = {}
+        notifications = Notification.objects.filter(
+            recipient_id=recipient_id, group__isnull=True
+        ).order_by('created_at', 'id')
+        for notification in notifications:
+            if notification.post_id:
+                key = (notification.notification_type, notification.post_id)
+            else:
+                key = ('single', notification.id)
+            if key not in groups:
+                group = NotificationGroup(
+                    recipient_id=recipient_id,
+                    notification_type=notification.notification_type,
+                    post_id=notification.post_id,
+                    recent_sender_ids=[],
+                    is_read=True,
+                )
+                groups[key] = (group, set(), [])
+            group, senders, members = groups[key]
+            _fold(group, senders, notification)
+            members.append(notification)
+
+        NotificationGroup.objects.bulk_create([group for group, _, _ in groups.values()])
+        updated = []
+        for group, _, members in groups.values():
+            for notification in members:
+                notification.group_id = group.id
+                updated.append(notification)
+        Notification.objects.bulk_update(updated, ['group'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notifications', '0009_notificationgroup'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_groups, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.1 on 2026-10-19 04:34
+
+import django.db.models.functions.comparison
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contenttypes', '0002_remove_content_type_name'),
+        ('notifications', '0011_notificationreadmarker'),
+        ('posts', '0034_post_is_removed_alter_appealevidencefile_file_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='notification',
+            name='dedup_bucket',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddConstraint(
+            model_name='notification',
+            constraint=models.UniqueConstraint(models.F('recipient'), models.F('sender'), models.F('notification_type'), django.db.models.functions.comparison.Coalesce(models.F('post'), models.Value(0)), models.F('dedup_bucket'), condition=models.Q(('dedup_bucket__isnull', False)), name='notifications_dedup_bucket_uniq'),
+        ),
+    ]
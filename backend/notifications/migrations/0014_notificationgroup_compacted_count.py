@@ -0,0 +1,18 @@
+# Generated by Django 5.2.1 on 2026-10-19 05:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notifications', '0013_pendingnotification'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='notificationgroup',
+            name='compacted_count',
+            field=models.PositiveIntegerField(default=0, help_text='Notifications of the group deleted by the retention policy (still part of total_count)'),
+        ),
+    ]
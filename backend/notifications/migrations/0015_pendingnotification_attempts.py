@@ -0,0 +1,28 @@
+# Generated by Django 5.2.1 on 2026-10-19 08:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notifications', '0014_notificationgroup_compacted_count'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='pendingnotification',
+            name='attempts',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='pendingnotification',
+            name='failed_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='pendingnotification',
+            name='last_error',
+            field=models.TextField(blank=True),
+        ),
+    ]
@@ -0,0 +1,55 @@
+# Key existing like/follow/repost notifications by their deduplication window
+
+from django.db import migrations
+
+DEDUPLICATED_TYPES = ('follow', 'like', 'repost')
+DEDUP_WINDOW_SECONDS = 24 * 60 * 60
+BATCH_SIZE = 1000
+
+
+def backfill_dedup_buckets(apps, schema_editor):
+    """
+    Give notifications saved before dedup_bucket existed the bucket of their
+    last action (as services.dedup_bucket), so that new actions in the same
+    window bump them instead of adding a second row. Where several old rows
+    share a window, only the newest is keyed; the others are left as they
+    were rather than merged.
+    """
+    Notification = apps.get_model('notifications', 'Notification')
+    deduplicated = Notification.objects.filter(notification_type__in=DEDUPLICATED_TYPES, sender__isnull=False)
+
+    def key(notification, bucket):
+        return (
+            notification.recipient_id, notification.sender_id, notification.notification_type,
+            notification.post_id or 0, bucket
+        )
+
+    fields = ('id', 'recipient_id', 'sender_id', 'notification_type', 'post_id', 'dedup_bucket', 'action_timestamp')
+    keyed = {
+        key(notification, notification.dedup_bucket)
+        for notification in deduplicated.filter(dedup_bucket__isnull=False).only(*fields).iterator()
+    }
+    changed = []
+    rows = deduplicated.filter(dedup_bucket__isnull=True).only(*fields).order_by('-action_timestamp', '-id')
+    for notification in rows.iterator():
+        bucket = int(notification.action_timestamp.timestamp()) // DEDUP_WINDOW_SECONDS
+        if key(notification, bucket) in keyed:
+            continue
+        keyed.add(key(notification, bucket))
+        notification.dedup_bucket = bucket
+        changed.append(notification)
+        if len(changed) >= BATCH_SIZE:
+            Notification.objects.bulk_update(changed, ['dedup_bucket'])
+            changed = []
+    Notification.objects.bulk_update(changed, ['dedup_bucket'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notifications', '0015_pendingnotification_attempts'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_dedup_buckets, migrations.RunPython.noop),
+    ]
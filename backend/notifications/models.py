@@ -1,4 +1,6 @@
 from django.db import models
+from django.db.models import F, Q, Value
+from django.db.models.functions import Coalesce
 from django.conf import settings
 from django.contrib.contenttypes.fields import GenericForeignKey
 from django.contrib.contenttypes.models import ContentType
@@ -63,6 +65,15 @@ class Notification(models.Model):
         default=1,
         help_text='Number of times this action was performed within the deduplication window'
     )
+    # 24-hour window of deduplicated actions (see services.dedup_bucket)
+    dedup_bucket = models.PositiveIntegerField(null=True, blank=True)
+    group = models.ForeignKey(
+        'NotificationGroup',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='notifications'
+    )
 
     class Meta:
         ordering = ['-created_at']
@@ -72,7 +83,185 @@ class Notification(models.Model):
             models.Index(fields=['is_read', '-created_at']),
             models.Index(fields=['recipient', 'sender', 'notification_type', 'action_timestamp'], name='notifications_dedup_idx'),
         ]
+        constraints = [
+            # Conflict target of the deduplication upsert; follows have no post
+            models.UniqueConstraint(
+                F('recipient'), F('sender'), F('notification_type'), Coalesce(F('post'), Value(0)), F('dedup_bucket'),
+                condition=Q(dedup_bucket__isnull=False),
+                name='notifications_dedup_bucket_uniq',
+            ),
+        ]
 
     def __str__(self):
         sender_name = self.sender.username if self.sender else "System"
         return f"{sender_name} {self.notification_type} - {self.created_at}"
+
+
+class NotificationGroup(models.Model):
+    """
+    Aggregate row behind one entry of the notification list, maintained when
+    notifications are created (see notifications.services). Notifications
+    about a post are grouped by (recipient, type, post); the others get a
+    group each.
+    """
+    RECENT_SENDER_LIMIT = 10
+
+    recipient = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='notification_groups'
+    )
+    notification_type = models.CharField(max_length=20, choices=Notification.NOTIFICATION_TYPES)
+    post = models.ForeignKey(
+        'posts.Post',
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name='notification_groups'
+    )
+    # Latest comment of comment groups, latest notification for donation details
+    comment = models.ForeignKey(
+        'posts.Post',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='comment_notification_groups'
+    )
+    latest_notification = models.ForeignKey(
+        Notification,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='+'
+    )
+    latest_time = models.DateTimeField(default=django.utils.timezone.now)
+    recent_sender_ids = models.JSONField(
+        default=list,
+        blank=True,
+        help_text='Most recent distinct senders first, capped at RECENT_SENDER_LIMIT'
+    )
+    sender_count = models.PositiveIntegerField(default=0, help_text='Number of distinct senders')
+    total_count = models.PositiveIntegerField(default=0, help_text='Number of notifications in the group')
+    compacted_count = models.PositiveIntegerField(
+        default=0,
+        help_text='Notifications of the group deleted by the retention policy (still part of total_count)'
+    )
+    is_read = models.BooleanField(default=False)
+
+    class Meta:
+        ordering = ['-latest_time', '-id']
+        indexes = [
+            models.Index(fields=['recipient', '-latest_time', '-id'], name='notif_group_recipient_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['recipient', 'notification_type', 'post'],
+                condition=Q(post__isnull=False),
+                name='notif_group_unique_post',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.notification_type} group for {self.recipient_id} ({self.total_count})"
+
+    def record(self, notification):
+        """Fold a new notification of this group into the aggregate and save"""
+        sender_id = notification.sender_id
+        # Report confirmations are system notifications: the sender is the recipient
+        if sender_id and self.notification_type != 'report_received':
+            if sender_id in self.recent_sender_ids:
+                self.recent_sender_ids.remove(sender_id)
+            elif not self.notifications.filter(sender_id=sender_id).exclude(pk=notification.pk).exists():
+                self.sender_count += 1
+            self.recent_sender_ids = [sender_id, *self.recent_sender_ids][:self.RECENT_SENDER_LIMIT]
+
+        if self.total_count == 0 or notification.created_at > self.latest_time:
+            self.latest_time = notification.created_at
+        self.total_count += 1
+        self.latest_notification = notification
+        if notification.comment_id:
+            self.comment_id = notification.comment_id
+        self.is_read = False
+        self.save()
+
+    def refresh_read_state(self, read_through_id=0):
+        """Recompute is_read after notifications of the group were marked read"""
+        is_read = not self.notifications.filter(is_read=False, id__gt=read_through_id).exists()
+        if is_read != self.is_read:
+            self.is_read = is_read
+            self.save(update_fields=['is_read'])
+
+
+class NotificationReadMarker(models.Model):
+    """
+    Per-user read watermark: every notification with an id up to
+    ``read_through_id`` counts as read, so "mark all as read" is a single-row
+    write. Notification.is_read remains as the per-item override for
+    notifications read individually above the watermark.
+    """
+    user = models.OneToOneField(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='notification_read_marker'
+    )
+    read_through_id = models.PositiveBigIntegerField(default=0)
+    read_through_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.user_id} read through {self.read_through_id}"
+
+    @classmethod
+    def read_through_for(cls, user):
+        """The user's watermark id (0 when they never marked all as read)"""
+        return cls.objects.filter(user=user).values_list('read_through_id', flat=True).first() or 0
+
+
+class PendingNotification(models.Model):
+    """
+    Durable queue of notifications requested by API views, inserted when the
+    request's transaction commits and delivered in batches by the
+    deliver_notifications command (see notifications.queue).
+    """
+    sender = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name='+'
+    )
+    recipient = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='+'
+    )
+    notification_type = models.CharField(max_length=20, choices=Notification.NOTIFICATION_TYPES)
+    post = models.ForeignKey(
+        'posts.Post',
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name='+'
+    )
+    comment = models.ForeignKey(
+        'posts.Post',
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name='+'
+    )
+    # Donation of donation notifications
+    content_type = models.ForeignKey(ContentType, on_delete=models.CASCADE, null=True, blank=True)
+    object_id = models.PositiveIntegerField(null=True, blank=True)
+    content_object = GenericForeignKey('content_type', 'object_id')
+    created_at = models.DateTimeField(default=django.utils.timezone.now)
+    # Failed deliveries; after MAX_DELIVERY_ATTEMPTS the row is set aside
+    # (failed_at) and no longer picked up by the workers
+    attempts = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    failed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['id']
+
+    def __str__(self):
+        return f"Pending {self.notification_type} for {self.recipient_id}"
@@ -0,0 +1,187 @@
+"""
+Deferred notification delivery.
+
+API views call ``enqueue_notification``, which costs the request a single
+PendingNotification insert once its transaction commits. The queue is
+drained in batches by ``deliver_pending_notifications`` (the
+deliver_notifications command): notifications are bulk-inserted and grouped,
+repeated likes/follows/reposts of a batch fold into one deduplication upsert,
+post payloads are built once per post and the WebSocket frames of the whole
+batch go out in one pass over the channel layer.
+
+A batch is saved in one savepoint; if that fails, each row is retried in a
+savepoint of its own, so one bad row does not hold up the others. A row that
+fails ``MAX_DELIVERY_ATTEMPTS`` times is set aside (``failed_at``) and left
+out of later batches.
+
+Without a worker (``NOTIFICATION_QUEUE_WORKER`` off, as with the in-memory
+channel layer, which other processes cannot reach) the queue is drained in
+process right after the insert.
+"""
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.conf import settings
+from django.contrib.contenttypes.models import ContentType
+from django.db import transaction
+from django.utils import timezone
+
+from core.encoding import dumps
+from core.presence import online_user_ids
+from .models import Notification, PendingNotification
+from .snapshots import notification_post_payloads
+from .services import (
+    DEDUPLICATED_TYPES, attach_groups, change_unread_count, notification_payload,
+    save_deduplicated_notification,
+)
+
+DEFAULT_BATCH_SIZE = 200
+MAX_DELIVERY_ATTEMPTS = 5
+
+# Notification types sent to the acting user themselves
+SELF_NOTIFICATION_TYPES = ('report_received',)
+
+
+def enqueue_notification(sender, recipient, notification_type, post=None, comment=None, content_object=None):
+    """Queue a notification for delivery after the current transaction commits"""
+    if sender and sender == recipient and notification_type not in SELF_NOTIFICATION_TYPES:
+        return
+    fields = {
+        'sender_id': sender.id if sender else None,
+        'recipient_id': recipient.id,
+        'notification_type': notification_type,
+        'post_id': post.id if post else None,
+        'comment_id': comment.id if comment else None,
+    }
+    if content_object is not None:
+        fields['content_type'] = ContentType.objects.get_for_model(content_object)
+        fields['object_id'] = content_object.pk
+    transaction.on_commit(lambda: _insert_pending(fields))
+
+
+def _insert_pending(fields):
+    try:
+        PendingNotification.objects.create(**fields)
+    except Exception as e:
+        print(f"❌ Error queueing notification: {str(e)}")
+        return
+    if not settings.NOTIFICATION_QUEUE_WORKER:
+        deliver_pending_notifications()
+
+
+def _save_batch(pending):
+    """Create the notifications of a batch of queue rows; returns the new ones"""
+    now = timezone.now()
+    plain = []
+    deduplicated = {}
+    for item in pending:
+        if item.notification_type in DEDUPLICATED_TYPES:
+            key = (item.sender_id, item.recipient_id, item.notification_type, item.post_id)
+            deduplicated.setdefault(key, [item, 0])[1] += 1
+        else:
+            plain.append(Notification(
+                sender=item.sender,
+                recipient=item.recipient,
+                notification_type=item.notification_type,
+                post=item.post,
+                comment=item.comment,
+                content_object=item.content_object,
+            ))
+
+    created = Notification.objects.bulk_create(plain)
+    attach_groups(created)
+    for item, count in deduplicated.values():
+        notification = save_deduplicated_notification(
+            item.sender, item.recipient, item.notification_type, item.post, now, count
+        )
+        if notification is not None:
+            created.append(notification)
+    return created
+
+
+async def _send_frames(channel_layer, frames):
+    for recipient_id, messages in frames.items():
+        for message in messages:
+            await channel_layer.group_send(f"notifications_{recipient_id}", {
+                'type': 'notification_message',
+                'text': dumps(message)
+            })
+
+
+def _send_batch(notifications):
+    # Frames are only built for recipients with sockets open; the others
+    # replay their notifications when they connect
+    online = online_user_ids({notification.recipient_id for notification in notifications})
+    post_payloads = notification_post_payloads(
+        [notification for notification in notifications if notification.recipient_id in online]
+    )
+    frames = {}
+    counts = {}
+    for notification in notifications:
+        counts[notification.recipient_id] = counts.get(notification.recipient_id, 0) + 1
+        if notification.recipient_id in online:
+            try:
+                payload = notification_payload(notification, post_payloads)
+            except Exception as e:
+                # Saved all the same; the client fetches it with the list
+                print(f"❌ Error building notification {notification.id}: {str(e)}")
+                continue
+            frames.setdefault(notification.recipient_id, []).append(payload)
+    try:
+        async_to_sync(_send_frames)(get_channel_layer(), frames)
+    except Exception as e:
+        print(f"❌ Error sending WebSocket notifications: {str(e)}")
+    for recipient_id, count in counts.items():
+        change_unread_count(recipient_id, count)
+
+
+def _save_rows(pending):
+    """
+    Save a batch whose bulk save failed row by row. Returns the new
+    notifications and the ids of the rows that were delivered; the others
+    have the failure recorded.
+    """
+    notifications, delivered = [], []
+    for item in pending:
+        try:
+            with transaction.atomic():
+                notifications.extend(_save_batch([item]))
+        except Exception as e:
+            print(f"❌ Error delivering queued notification {item.id}: {str(e)}")
+            item.attempts += 1
+            item.last_error = str(e)
+            if item.attempts >= MAX_DELIVERY_ATTEMPTS:
+                item.failed_at = timezone.now()
+            item.save(update_fields=['attempts', 'last_error', 'failed_at'])
+        else:
+            delivered.append(item.id)
+    return notifications, delivered
+
+
+def deliver_pending_notifications(batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Deliver up to ``batch_size`` queued notifications, oldest first. Returns
+    the number of queue rows consumed (delivered or failed).
+    """
+    with transaction.atomic():
+        # Concurrent workers skip each other's rows (PostgreSQL)
+        ids = list(
+            PendingNotification.objects.select_for_update(skip_locked=True)
+            .filter(failed_at__isnull=True).order_by('id').values_list('id', flat=True)[:batch_size]
+        )
+        if not ids:
+            return 0
+        pending = list(
+            PendingNotification.objects.filter(id__in=ids)
+            .select_related('sender', 'recipient', 'post', 'comment')
+            .prefetch_related('post__images', 'content_object')
+        )
+        try:
+            with transaction.atomic():
+                notifications = _save_batch(pending)
+            delivered = ids
+        except Exception:
+            notifications, delivered = _save_rows(pending)
+        PendingNotification.objects.filter(id__in=delivered).delete()
+
+    _send_batch(notifications)
+    return len(ids)
@@ -0,0 +1,70 @@
+"""
+Retention policy for notifications.
+
+Read notifications older than the retention period are deleted in bounded
+batches (oldest first, along the created_at index) so the table and its
+indexes stop growing with the age of the site. Their NotificationGroup stays
+as the summary row: its counts and recent senders are maintained at write
+time, and ``compacted_count`` records how many of its notifications were
+deleted. A sender coming back to a group after their notifications were
+compacted is counted as a new distinct sender unless they are still among
+the recent senders.
+"""
+import time
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Count, F, Q
+from django.utils import timezone
+
+from .models import Notification, NotificationGroup
+
+DEFAULT_RETENTION_DAYS = 90
+DEFAULT_BATCH_SIZE = 1000
+
+
+def expired_notifications(older_than_days=DEFAULT_RETENTION_DAYS):
+    """Read notifications created more than ``older_than_days`` ago"""
+    cutoff = timezone.now() - timedelta(days=older_than_days)
+    # Read individually, or under the recipient's read watermark
+    read = Q(is_read=True) | Q(recipient__notification_read_marker__read_through_id__gte=F('id'))
+    return Notification.objects.filter(read, created_at__lt=cutoff)
+
+
+def compact_batch(older_than_days=DEFAULT_RETENTION_DAYS, batch_size=DEFAULT_BATCH_SIZE):
+    """Delete one batch of expired notifications; returns how many were deleted"""
+    with transaction.atomic():
+        ids = list(
+            expired_notifications(older_than_days).order_by('created_at', 'id').values_list('id', flat=True)[:batch_size]
+        )
+        if not ids:
+            return 0
+        per_group = (
+            Notification.objects.filter(id__in=ids, group__isnull=False)
+            .values('group_id').annotate(count=Count('id')).order_by()
+        )
+        for row in per_group:
+            NotificationGroup.objects.filter(id=row['group_id']).update(
+                compacted_count=F('compacted_count') + row['count']
+            )
+        Notification.objects.filter(id__in=ids).delete()
+    return len(ids)
+
+
+def compact_notifications(older_than_days=DEFAULT_RETENTION_DAYS, batch_size=DEFAULT_BATCH_SIZE,
+                          max_batches=None, pause=0):
+    """
+    Apply the retention policy batch by batch, waiting ``pause`` seconds
+    between batches. Returns (deleted notifications, batches).
+    """
+    deleted = 0
+    batches = 0
+    while max_batches is None or batches < max_batches:
+        count = compact_batch(older_than_days, batch_size)
+        deleted += count
+        batches += 1
+        if count < batch_size:
+            break
+        if pause:
+            time.sleep(pause)
+    return deleted, batches
@@ -1,29 +1,90 @@
 from rest_framework import serializers
-from .models import Notification
+from core.loaders import BatchingListSerializer, get_loaders
+from .models import Notification, NotificationGroup, NotificationReadMarker
 from users.serializers import UserSerializer
+from users.loaders import User, prime_users
 from posts.serializers import UserPostSerializer, PostRemovalSerializer
+from posts.hydration import hydrate_posts
+from posts.loaders import post_loader, prime_posts
+from posts.models import Donation
+
+
+def read_through_id(context):
+    """The viewer's read watermark, looked up once per serializer context"""
+    if 'read_through_id' not in context:
+        request = context.get('request')
+        user = request.user if request and request.user.is_authenticated else None
+        context['read_through_id'] = NotificationReadMarker.read_through_for(user) if user else 0
+    return context['read_through_id']
+
+
+def prime_notification_payloads(posts, sender_ids, loaders):
+    """Queue the posts and senders shown by a page of notifications"""
+    for post in posts:
+        post_loader(loaders).prime(post.id, post)
+    prime_posts(posts, loaders)
+    prime_users(sender_ids, loaders)
+
+
+def notification_posts(post_ids, context):
+    """
+    {post_id: serialized post} for notifications, rendered from the shared,
+    versioned post bodies (posts.hydration) and memoized in the context
+    """
+    posts = context.setdefault('notification_posts', {})
+    missing = [post_id for post_id in dict.fromkeys(post_ids) if post_id is not None and post_id not in posts]
+    if missing:
+        for data in hydrate_posts(missing, UserPostSerializer, context):
+            posts[data['id']] = data
+    return posts
+
+
+def serialize_notification_post(obj, context):
+    """Post of a notification or group, by notification type"""
+    if obj.post_id is None:
+        return None
+    if obj.notification_type == 'post_removed':
+        # Use PostRemovalSerializer to show full content for removed posts
+        post = post_loader(get_loaders(context)).load(obj.post_id)
+        return PostRemovalSerializer(post, context=context).data if post else None
+    # Use secure UserPostSerializer for other notifications
+    return notification_posts([obj.post_id], context).get(obj.post_id)
+
 
 class NotificationSerializer(serializers.ModelSerializer):
-    sender = UserSerializer(read_only=True)
+    sender = serializers.SerializerMethodField()
     # Use PostRemovalSerializer for post_removed notifications, UserPostSerializer for others
     post = serializers.SerializerMethodField()
     comment = serializers.SerializerMethodField()
+    is_read = serializers.SerializerMethodField()
 
     class Meta:
         model = Notification
         fields = ['id', 'sender', 'notification_type', 'post', 'comment', 'is_read', 'created_at']
         read_only_fields = ['sender', 'notification_type', 'post', 'created_at']
+        list_serializer_class = BatchingListSerializer
+
+    def prime_loaders(self, notifications, loaders):
+        for notification in notifications:
+            if Notification.post.is_cached(notification) and notification.post is not None:
+                post_loader(loaders).prime(notification.post_id, notification.post)
+        post_ids = {n.post_id for n in notifications if n.notification_type == 'post_removed'}
+        posts = [post for post in post_loader(loaders).load_many(post_ids - {None}) if post is not None]
+        prime_notification_payloads(posts, [n.sender_id for n in notifications], loaders)
+        notification_posts([n.post_id for n in notifications if n.notification_type != 'post_removed'], self.context)
+
+    def get_is_read(self, obj):
+        return obj.is_read or obj.id <= read_through_id(self.context)
+
+    def get_sender(self, obj):
+        sender = get_loaders(self.context).for_model(User).load(obj.sender_id)
+        if sender is None:
+            return None
+        return UserSerializer(sender, context=self.context).data
 
     def get_post(self, obj):
         """Use appropriate serializer based on notification type"""
-        if obj.post:
-            if obj.notification_type == 'post_removed':
-                # Use PostRemovalSerializer to show full content for removed posts
-                return PostRemovalSerializer(obj.post, context=self.context).data
-            else:
-                # Use secure UserPostSerializer for other notifications
-                return UserPostSerializer(obj.post, context=self.context).data
-        return None
+        return serialize_notification_post(obj, self.context)
 
     def get_comment(self, obj):
         """Handle both comments and donations"""
@@ -47,47 +108,64 @@ class NotificationSerializer(serializers.ModelSerializer):
         else:
             return None
 
-class GroupedNotificationSerializer(serializers.Serializer):
-    """Serializer for grouped notifications"""
-    notification_type = serializers.CharField()
-    post = serializers.SerializerMethodField(required=False, allow_null=True)
-    comment = serializers.SerializerMethodField(required=False)
-    users = serializers.ListField(child=UserSerializer())
-    latest_time = serializers.DateTimeField()
-    is_read = serializers.BooleanField()
-    notification_ids = serializers.ListField(child=serializers.IntegerField())
-    
+class GroupedNotificationSerializer(serializers.ModelSerializer):
+    """Serializer for notification groups (one entry of the notification list)"""
+    post = serializers.SerializerMethodField()
+    comment = serializers.SerializerMethodField()
+    users = serializers.SerializerMethodField()
+    users_count = serializers.IntegerField(source='sender_count', read_only=True)
+    is_read = serializers.SerializerMethodField()
+
+    class Meta:
+        model = NotificationGroup
+        fields = ['id', 'notification_type', 'post', 'comment', 'users', 'users_count',
+                  'total_count', 'latest_time', 'is_read']
+        list_serializer_class = BatchingListSerializer
+
+    def prime_loaders(self, groups, loaders):
+        post_ids = {group.post_id for group in groups if group.notification_type == 'post_removed'}
+        post_ids |= {group.comment_id for group in groups}
+        posts = [post for post in post_loader(loaders).load_many(post_ids - {None}) if post is not None]
+        sender_ids = [user_id for group in groups for user_id in group.recent_sender_ids]
+        prime_notification_payloads(posts, sender_ids, loaders)
+        notification_posts([group.post_id for group in groups if group.notification_type != 'post_removed'], self.context)
+        donation_ids = [
+            group.latest_notification.object_id for group in groups
+            if group.notification_type == 'donation' and group.latest_notification
+        ]
+        loaders.for_model(Donation).defer_many(donation_ids)
+
     def get_post(self, obj):
         """Use appropriate serializer based on notification type"""
-        if obj.get('post'):
-            if obj.get('notification_type') == 'post_removed':
-                # Use PostRemovalSerializer to show full content for removed posts
-                from posts.serializers import PostRemovalSerializer
-                return PostRemovalSerializer(obj['post'], context=self.context).data
-            else:
-                # Use secure UserPostSerializer for other notifications
-                return UserPostSerializer(obj['post'], context=self.context).data
-        return None
-    
+        return serialize_notification_post(obj, self.context)
+
+    def get_is_read(self, obj):
+        # Groups whose latest notification is under the watermark are read
+        return obj.is_read or (obj.latest_notification_id or 0) <= read_through_id(self.context)
+
+    def get_users(self, obj):
+        senders = get_loaders(self.context).for_model(User).load_many(obj.recent_sender_ids)
+        return [UserSerializer(sender, context=self.context).data for sender in senders if sender is not None]
+
     def get_comment(self, obj):
         """Handle both comments and donations"""
-        if obj.get('notification_type') == 'donation':
-            # For donations, use content_object from the first notification
-            first_notification = obj.get('notifications', [{}])[0]
-            if first_notification and hasattr(first_notification, 'content_object') and hasattr(first_notification.content_object, 'amount'):
-                return {
-                    'id': first_notification.content_object.id,
-                    'content': getattr(first_notification.content_object, 'message', ''),
-                    'amount': float(first_notification.content_object.amount)
-                }
-            else:
+        if obj.notification_type == 'donation':
+            # For donations, show the latest donation of the group
+            donation = None
+            if obj.latest_notification:
+                donation = get_loaders(self.context).for_model(Donation).load(obj.latest_notification.object_id)
+            if donation is None:
                 return None
-        elif obj.get('comment'):
+            return {
+                'id': donation.id,
+                'content': donation.message or '',
+                'amount': float(donation.amount)
+            }
+        comment = post_loader(get_loaders(self.context)).load(obj.comment_id)
+        if comment is not None:
             # For regular comments, return comment data
-            comment = obj['comment']
-            if hasattr(comment, 'id') and hasattr(comment, 'content'):
-                return {
-                    'id': comment.id,
-                    'content': comment.content
-                }
-        return None 
\ No newline at end of file
+            return {
+                'id': comment.id,
+                'content': comment.content
+            }
+        return None
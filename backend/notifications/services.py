@@ -1,10 +1,122 @@
 from channels.layers import get_channel_layer
 from asgiref.sync import async_to_sync
-from .models import Notification
+from django.core.cache import cache
+from django.db import IntegrityError, connection, transaction
+from django.db.models import F
+from django.utils import timezone
+from core.encoding import dumps
+from core.presence import is_online
+from .models import Notification, NotificationGroup, NotificationReadMarker
+from .snapshots import notification_post_payloads
 from django.contrib.auth import get_user_model
 
 User = get_user_model()
 
+UNREAD_COUNT_TIMEOUT = 60 * 60  # Recounted from the database at least hourly
+
+def _unread_count_key(user_id):
+    return f'notifications_unread:{user_id}'
+
+def _count_unread(user_id):
+    read_through = NotificationReadMarker.read_through_for(user_id)
+    return Notification.objects.filter(recipient_id=user_id, is_read=False, id__gt=read_through).count()
+
+def get_unread_count(user_id):
+    """Cached number of unread notifications of a user"""
+    count = cache.get(_unread_count_key(user_id))
+    if count is None:
+        count = _count_unread(user_id)
+        cache.add(_unread_count_key(user_id), count, UNREAD_COUNT_TIMEOUT)
+    return count
+
+def push_unread_count(user_id, count):
+    """Send the unread count to the user's notification sockets, if they have any"""
+    if not is_online(user_id):
+        return
+    try:
+        channel_layer = get_channel_layer()
+        async_to_sync(channel_layer.group_send)(f"notifications_{user_id}", {
+            'type': 'notification_message',
+            'text': dumps({'type': 'unread_count', 'count': count})
+        })
+    except Exception as e:
+        print(f"❌ Error sending unread count: {str(e)}")
+
+def change_unread_count(user_id, delta):
+    """Apply a change that is already saved to the cached count and push it"""
+    if not delta:
+        return
+    try:
+        count = max(cache.incr(_unread_count_key(user_id), delta), 0)
+    except ValueError:
+        # Not cached: the database already reflects the change
+        count = get_unread_count(user_id)
+    push_unread_count(user_id, count)
+
+def mark_notification_read(notification):
+    """Mark one notification read (a per-item override above the watermark)"""
+    read_through = NotificationReadMarker.read_through_for(notification.recipient_id)
+    if not notification.is_read:
+        notification.is_read = True
+        notification.save(update_fields=['is_read'])
+        if notification.id > read_through:
+            change_unread_count(notification.recipient_id, -1)
+    if notification.group:
+        notification.group.refresh_read_state(read_through)
+
+def mark_all_notifications_read(user):
+    """Move the user's read watermark past every existing notification"""
+    latest_id = Notification.objects.order_by('-id').values_list('id', flat=True).first() or 0
+    NotificationReadMarker.objects.update_or_create(
+        user=user, defaults={'read_through_id': latest_id, 'read_through_at': timezone.now()}
+    )
+    cache.set(_unread_count_key(user.id), 0, UNREAD_COUNT_TIMEOUT)
+    push_unread_count(user.id, 0)
+
+def _get_group_for_update(recipient, notification_type, post):
+    """
+    The group a new notification joins: the (recipient, type, post) group,
+    created on first use, or a fresh group for notifications without a post
+    """
+    if post is None:
+        return NotificationGroup.objects.create(recipient=recipient, notification_type=notification_type)
+    group, _ = NotificationGroup.objects.select_for_update().get_or_create(
+        recipient=recipient, notification_type=notification_type, post=post
+    )
+    return group
+
+def attach_groups(notifications):
+    """
+    Upsert the NotificationGroups of notifications saved without one, locking
+    each group once however many of the notifications join it
+    """
+    by_group = {}
+    for notification in notifications:
+        key = (notification.recipient_id, notification.notification_type, notification.post_id)
+        if notification.post_id is None:
+            key += (notification.id,)
+        by_group.setdefault(key, []).append(notification)
+    with transaction.atomic():
+        for members in by_group.values():
+            first = members[0]
+            group = _get_group_for_update(first.recipient, first.notification_type, first.post)
+            for notification in members:
+                # Joined one at a time so record() counts distinct senders right
+                notification.group = group
+                notification.save(update_fields=['group'])
+                group.record(notification)
+
+def create_grouped_notification(**fields):
+    """
+    Create a notification and upsert its NotificationGroup in one transaction
+    """
+    with transaction.atomic():
+        group = _get_group_for_update(fields['recipient'], fields['notification_type'], fields.get('post'))
+        notification = Notification.objects.create(group=group, **fields)
+        group.record(notification)
+    change_unread_count(notification.recipient_id, 1)
+    return notification
+
 def create_notification(sender, recipient, notification_type, post=None, comment=None):
     """
     Create a notification and send it through WebSocket
@@ -14,7 +126,7 @@ def create_notification(sender, recipient, notification_type, post=None, comment
         return None
 
     try:
-        notification = Notification.objects.create(
+        notification = create_grouped_notification(
             sender=sender,
             recipient=recipient,
             notification_type=notification_type,
@@ -27,109 +139,99 @@ def create_notification(sender, recipient, notification_type, post=None, comment
         traceback.print_exc()
         raise
 
-    # Prepare notification data for WebSocket
+    send_notification(notification)
+    return notification
+
+def notification_payload(notification, post_payloads=None):
+    """
+    WebSocket payload of a saved notification. The post part comes from the
+    cached post summaries (see notifications.snapshots); ``post_payloads``
+    are the ones of a whole batch, from notification_post_payloads.
+    """
+    notification_type = notification.notification_type
+    sender = notification.sender
+    # Report confirmations are system notifications (the reporter is the sender)
+    if notification_type == 'report_received':
+        sender = None
     notification_data = {
         'type': 'notification',  # This is what the frontend expects
         'id': notification.id,
         'notification_type': notification_type,  # The specific type like 'like', 'comment', etc.
         'sender': {
-            'id': sender.id if sender else None,
-            'username': sender.username if sender else 'System',
-            'avatar': sender.profile_picture.url if sender and sender.profile_picture else None,
+            'id': sender.id,
+            'username': sender.username,
+            'avatar': sender.profile_picture.url if sender.profile_picture else None,
         } if sender else None,  # Set to None for system notifications
-        'post_id': post.id if post else None,
-        'comment_id': comment.id if comment else None,
+        'post_id': notification.post_id,
+        'comment_id': notification.comment_id,
         'created_at': notification.created_at.isoformat(),
         'action_count': notification.action_count,  # Add action count for deduplication info
     }
-    
-    # Add comment data if comment exists (for comments and donations)
-    if comment:
-        if notification_type == 'donation':
-            # For donations, include the donation amount
-            notification_data['comment'] = {
-                'id': comment.id,
-                'content': comment.message if hasattr(comment, 'message') else '',
-                'amount': float(comment.amount) if hasattr(comment, 'amount') else 0
-            }
-        else:
-            # For regular comments
-            notification_data['comment'] = {
-                'id': comment.id,
-                'content': comment.content
-            }
-    
-    # Add full post data if post exists
-    if post:
-        # For post removal notifications, include full post content for the author
-        if notification_type == 'post_removed':
-            notification_data['post'] = {
-                'id': post.id,
-                'content': post.content,
-                'author': {
-                    'id': post.author.id,
-                    'username': post.author.username,
-                    'handle': post.author.handle,
-                    'profile_picture': post.author.profile_picture.url if post.author.profile_picture else None,
-                },
-                'post_type': post.post_type,
-                'created_at': post.created_at.isoformat(),
-                'image': post.image.url if post.image else None,
-                'images': [
-                    {
-                        'id': img.id,
-                        'image': img.image.url,
-                        'filename': img.image.name.split('/')[-1]
-                    } for img in post.images.all()
-                ],
-                'is_human_drawing': post.is_human_drawing,
-                'is_removed': post.is_removed,
-                'is_deleted': post.is_deleted,
-            }
-        else:
-            # For other notifications, use standard post data
-            notification_data['post'] = {
-                'id': post.id,
-                'content': post.content,
-                'author': {
-                    'id': post.author.id,
-                    'username': post.author.username,
-                    'handle': post.author.handle,
-                    'profile_picture': post.author.profile_picture.url if post.author.profile_picture else None,
-                },
-                'post_type': post.post_type,
-                'created_at': post.created_at.isoformat(),
-                'image': post.image.url if post.image else None,
-                'images': [
-                    {
-                        'id': img.id,
-                        'image': img.image.url,
-                        'filename': img.image.name.split('/')[-1]
-                    } for img in post.images.all()
-                ],
-                'is_human_drawing': post.is_human_drawing,
-            }
-    
-    # Send notification through WebSocket
+
+    if notification_type == 'donation' and notification.object_id:
+        # For donations, include the donation amount
+        donation = notification.content_object
+        notification_data['comment'] = {
+            'id': donation.id,
+            'content': donation.message or '',
+            'amount': float(donation.amount)
+        }
+    elif notification.comment_id:
+        notification_data['comment'] = {
+            'id': notification.comment.id,
+            'content': notification.comment.content
+        }
+
+    if notification.post_id:
+        if post_payloads is None:
+            post_payloads = notification_post_payloads([notification])
+        notification_data['post'] = post_payloads.get((notification.post_id, notification_type == 'post_removed'))
+    return notification_data
+
+REPLAY_LIMIT = 100
+
+def replay_notifications(user_id, since_id, limit=REPLAY_LIMIT):
+    """
+    Payloads of the user's notifications created after ``since_id``, oldest
+    first. Returns (payloads, truncated); when truncated the client should
+    refetch the list instead.
+    """
+    notifications = list(
+        Notification.objects.filter(recipient_id=user_id, id__gt=since_id)
+        .select_related('sender', 'comment')
+        .prefetch_related('content_object')
+        .order_by('id')[:limit + 1]
+    )
+    truncated = len(notifications) > limit
+    notifications = notifications[:limit]
+    post_payloads = notification_post_payloads(notifications)
+    return [notification_payload(notification, post_payloads) for notification in notifications], truncated
+
+def send_notification(notification):
+    """
+    Send a saved notification through WebSocket (skipped while the recipient
+    has no sockets: they fetch or replay it when they connect)
+    """
+    if not is_online(notification.recipient_id):
+        return
     try:
         channel_layer = get_channel_layer()
-        
-        group_name = f"notifications_{recipient.id}"
+
+        group_name = f"notifications_{notification.recipient_id}"
         websocket_data = {
             'type': 'notification_message',
-            'message': notification_data
+            # Encoded once for all of the recipient's sockets
+            'text': dumps(notification_payload(notification))
         }
-        
+
         async_to_sync(channel_layer.group_send)(group_name, websocket_data)
-        
+
     except Exception as e:
         print(f"❌ Error sending WebSocket notification: {str(e)}")
         import traceback
         traceback.print_exc()
         # Don't raise here - notification was saved to DB, just WebSocket failed
 
-    return notification
-
 def create_like_notification(sender, post):
     if sender != post.author:
         create_deduplicated_notification(sender, post.author, 'like', post=post)
@@ -152,71 +254,14 @@ def create_donation_notification(sender, post, donation):
     """
     try:
         # Create notification with donation as content_object
-        notification = Notification.objects.create(
+        notification = create_grouped_notification(
             sender=sender,
             recipient=post.author,
             notification_type='donation',
             post=post,
             content_object=donation  # Use content_object for donation
         )
-
-        
-        # Prepare notification data for WebSocket
-        notification_data = {
-            'type': 'notification',
-            'id': notification.id,
-            'notification_type': 'donation',
-            'sender': {
-                'id': sender.id,
-                'username': sender.username,
-                'avatar': sender.profile_picture.url if sender.profile_picture else None,
-            },
-            'post_id': post.id,
-            'created_at': notification.created_at.isoformat(),
-            'comment': {
-                'id': donation.id,
-                'content': donation.message if donation.message else '',
-                'amount': float(donation.amount)
-            }
-        }
-        
-        # Add full post data
-        notification_data['post'] = {
-            'id': post.id,
-            'content': post.content,
-            'author': {
-                'id': post.author.id,
-                'username': post.author.username,
-                'handle': post.author.handle,
-                'profile_picture': post.author.profile_picture.url if post.author.profile_picture else None,
-            },
-            'post_type': post.post_type,
-            'created_at': post.created_at.isoformat(),
-            'image': post.image.url if post.image else None,
-            'images': [
-                {
-                    'id': img.id,
-                    'image': img.image.url,
-                    'filename': img.image.name.split('/')[-1]
-                } for img in post.images.all()
-            ],
-            'is_human_drawing': post.is_human_drawing,
-        }
-        
-        # Send notification through WebSocket
-        try:
-            channel_layer = get_channel_layer()
-            group_name = f"notifications_{post.author.id}"
-            websocket_data = {
-                'type': 'notification_message',
-                'message': notification_data
-            }
-            async_to_sync(channel_layer.group_send)(group_name, websocket_data)
-        except Exception as e:
-            print(f"❌ Error sending WebSocket notification: {str(e)}")
-            import traceback
-            traceback.print_exc()
-        
+        send_notification(notification)
         return notification
     except Exception as e:
         print(f"❌ Error in create_donation_notification: {str(e)}")
@@ -230,61 +275,13 @@ def create_report_received_notification(reporter, post):
     """
     try:
         # Create notification with the reporter as sender and recipient
-        notification = Notification.objects.create(
+        notification = create_grouped_notification(
             sender=reporter,
             recipient=reporter,  # Fixed: Send to reporter (User A), not post author (User B)
             notification_type='report_received',
             post=post
         )
-
-        
-        # Prepare notification data for WebSocket
-        notification_data = {
-            'type': 'notification',
-            'id': notification.id,
-            'notification_type': 'report_received',
-            # No sender info - this is a system notification
-            'post_id': post.id,
-            'created_at': notification.created_at.isoformat(),
-        }
-        
-        # Add full post data
-        notification_data['post'] = {
-            'id': post.id,
-            'content': post.content,
-            'author': {
-                'id': post.author.id,
-                'username': post.author.username,
-                'handle': post.author.handle,
-                'profile_picture': post.author.profile_picture.url if post.author.profile_picture else None,
-            },
-            'post_type': post.post_type,
-            'created_at': post.created_at.isoformat(),
-            'image': post.image.url if post.image else None,
-            'images': [
-                {
-                    'id': img.id,
-                    'image': img.image.url,
-                    'filename': img.image.name.split('/')[-1]
-                } for img in post.images.all()
-            ],
-            'is_human_drawing': post.is_human_drawing,
-        }
-        
-        # Send notification through WebSocket to the REPORTER (User A)
-        try:
-            channel_layer = get_channel_layer()
-            group_name = f"notifications_{reporter.id}"  # Fixed: Send to reporter's notification group
-            websocket_data = {
-                'type': 'notification_message',
-                'message': notification_data
-            }
-            async_to_sync(channel_layer.group_send)(group_name, websocket_data)
-        except Exception as e:
-            print(f"❌ Error sending WebSocket notification: {str(e)}")
-            import traceback
-            traceback.print_exc()
-        
+        send_notification(notification)
         return notification
     except Exception as e:
         print(f"❌ Error in create_report_received_notification: {str(e)}")
@@ -296,50 +293,117 @@ def create_report_received_notification(reporter, post):
 # NEW: Notification Deduplication Service (24-hour window)
 # ============================================================================
 
-def find_recent_notification(sender, recipient, notification_type, hours=24):
+DEDUPLICATED_TYPES = ('follow', 'like', 'repost')
+DEDUP_WINDOW_SECONDS = 24 * 60 * 60
+
+def dedup_bucket(when=None):
+    """Index of the 24-hour window a repeated action is counted in"""
+    return int((when or timezone.now()).timestamp()) // DEDUP_WINDOW_SECONDS
+
+def _supports_upsert():
+    # INSERT ... ON CONFLICT on an expression index with RETURNING
+    if connection.vendor == 'postgresql':
+        return True
+    if connection.vendor == 'sqlite':
+        import sqlite3
+        return sqlite3.sqlite_version_info >= (3, 35, 0)
+    return False
+
+def _upsert_deduplicated(sender, recipient, notification_type, post, now, count=1):
     """
-    Find a recent notification within the specified hours window
+    Insert the notification of this window or add ``count`` to the existing
+    one in a single statement. Returns (id, inserted).
+    """
+    table = connection.ops.quote_name(Notification._meta.db_table)
+    timestamp = connection.ops.adapt_datetimefield_value(now)
+    sql = f"""
+        INSERT INTO {table} (
+            recipient_id, sender_id, notification_type, post_id, is_read,
+            created_at, action_timestamp, action_count, dedup_bucket
+        )
+        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
+        ON CONFLICT (recipient_id, sender_id, notification_type, COALESCE(post_id, 0), dedup_bucket)
+            WHERE dedup_bucket IS NOT NULL
+        DO UPDATE SET
+            action_count = {table}.action_count + excluded.action_count,
+            action_timestamp = excluded.action_timestamp
+        RETURNING id, action_count
     """
-    from django.utils import timezone
-    from datetime import timedelta
-    
-    cutoff_time = timezone.now() - timedelta(hours=hours)
-    
+    params = [
+        recipient.id, sender.id, notification_type, post.id if post else None, False,
+        timestamp, timestamp, count, dedup_bucket(now),
+    ]
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        notification_id, action_count = cursor.fetchone()
+    # An existing row already counted at least one action
+    return notification_id, action_count == count
+
+def _bump_deduplicated(sender, recipient, notification_type, post, now, count=1):
+    """Fallback for databases without the upsert: count the action on the existing row"""
     return Notification.objects.filter(
-        sender=sender,
         recipient=recipient,
+        sender=sender,
         notification_type=notification_type,
-        action_timestamp__gte=cutoff_time
-    ).first()
+        post=post,
+        dedup_bucket=dedup_bucket(now)
+    ).update(action_count=F('action_count') + count, action_timestamp=now)
 
-def update_existing_notification(notification):
+def save_deduplicated_notification(sender, recipient, notification_type, post=None, now=None, count=1):
     """
-    Update an existing notification's timestamp and count
+    Record ``count`` repeated actions in the notification of the current
+    24-hour window. Returns the notification if this created it (grouped, but
+    neither counted as unread nor sent), or None if it only bumped action_count.
     """
-    from django.utils import timezone
-    
-    notification.action_timestamp = timezone.now()
-    notification.action_count += 1
-    notification.save(update_fields=['action_timestamp', 'action_count'])
-    
+    now = now or timezone.now()
+    if _supports_upsert():
+        # A new row is never left without its group
+        with transaction.atomic():
+            notification_id, inserted = _upsert_deduplicated(sender, recipient, notification_type, post, now, count)
+            if not inserted:
+                return None
+            notification = Notification.objects.get(id=notification_id)
+            notification.sender, notification.recipient, notification.post = sender, recipient, post
+            attach_groups([notification])
+        return notification
 
+    if _bump_deduplicated(sender, recipient, notification_type, post, now, count):
+        return None
+    try:
+        with transaction.atomic():
+            notification = Notification.objects.create(
+                sender=sender,
+                recipient=recipient,
+                notification_type=notification_type,
+                post=post,
+                action_timestamp=now,
+                action_count=count,
+                dedup_bucket=dedup_bucket(now)
+            )
+            attach_groups([notification])
+    except IntegrityError:
+        # Another request inserted the row of this window first
+        _bump_deduplicated(sender, recipient, notification_type, post, now, count)
+        return None
     return notification
 
 def create_deduplicated_notification(sender, recipient, notification_type, post=None, comment=None):
     """
-    Create a notification with 24-hour deduplication for follow, like, and repost
-    """
-    # Only apply deduplication to specific notification types
-    if notification_type in ['follow', 'like', 'repost']:
-        # Check for recent notification
-        recent_notification = find_recent_notification(sender, recipient, notification_type, hours=24)
-        
-        if recent_notification:
-            # Update existing notification instead of creating new one
-            return update_existing_notification(recent_notification)
-    
-    # For other notification types or if no recent notification exists, create new one
-    return create_notification(sender, recipient, notification_type, post, comment)
+    Create a notification with 24-hour deduplication for follow, like, and repost.
+    Repeated actions within the same window only bump action_count (and
+    return None).
+    """
+    if notification_type not in DEDUPLICATED_TYPES:
+        return create_notification(sender, recipient, notification_type, post, comment)
+    if sender == recipient:
+        return None
+
+    notification = save_deduplicated_notification(sender, recipient, notification_type, post)
+    if notification is None:
+        return None
+    change_unread_count(recipient.id, 1)
+    send_notification(notification)
+    return notification
 
 def create_post_removed_notification(post):
     """
@@ -0,0 +1,115 @@
+"""
+Post summaries embedded in notification WebSocket payloads.
+
+Every notification about a post carries the same summary of it, so the
+summary is cached once per post under the post body version of
+posts.hydration, which is replaced when the post is edited, deleted, removed
+or verified and when its images change. The author part is the cached author
+card (users.caching), so the payload of a notification about a post whose
+summary is cached costs a few cache lookups and no queries.
+"""
+from django.core.cache import cache
+
+from posts.hydration import get_post_body_versions
+from posts.models import Post
+from users.caching import get_author_cards, render_author_card
+from .models import Notification
+
+POST_SUMMARY_TIMEOUT = 60 * 60  # 1 hour
+
+
+def _summary_key(post_id, version):
+    return f'notification_post_summary:{post_id}:{version}'
+
+
+def build_post_summary(post):
+    """Viewer-independent summary of a post, with the author left as an id"""
+    return {
+        'id': post.id,
+        'content': post.content,
+        'author_id': post.author_id,
+        'post_type': post.post_type,
+        'created_at': post.created_at.isoformat(),
+        'image': post.image.url if post.image else None,
+        'images': [
+            {
+                'id': img.id,
+                'image': img.image.url,
+                'filename': img.image.name.split('/')[-1]
+            } for img in post.images.all()
+        ],
+        'is_human_drawing': post.is_human_drawing,
+        'is_removed': post.is_removed,
+        'is_deleted': post.is_deleted,
+    }
+
+
+def get_post_summaries(post_ids, posts=None):
+    """
+    Return {post_id: summary} for the given ids. Summaries that are not
+    cached are built from ``posts`` ({id: Post}, e.g. instances the caller
+    already holds) or with one query for the rest.
+    """
+    post_ids = set(post_ids)
+    if not post_ids:
+        return {}
+    versions = get_post_body_versions(post_ids)
+    keys = {_summary_key(post_id, versions.get(post_id)): post_id for post_id in post_ids}
+    summaries = {keys[key]: summary for key, summary in cache.get_many(keys).items()}
+
+    missing = [post_id for post_id in post_ids if post_id not in summaries]
+    if missing:
+        posts = dict(posts or {})
+        unloaded = [post_id for post_id in missing if post_id not in posts]
+        if unloaded:
+            for post in Post.all_objects.filter(id__in=unloaded).prefetch_related('images'):
+                posts[post.id] = post
+        fresh = {post_id: build_post_summary(posts[post_id]) for post_id in missing if post_id in posts}
+        cache.set_many(
+            {_summary_key(post_id, versions.get(post_id)): summary for post_id, summary in fresh.items()},
+            POST_SUMMARY_TIMEOUT
+        )
+        summaries.update(fresh)
+    return summaries
+
+
+def render_post_summary(summary, card, removal=False):
+    """Post part of a notification payload; removal notices also carry the moderation state"""
+    data = {
+        'id': summary['id'],
+        'content': summary['content'],
+        'author': render_author_card(card),
+        'post_type': summary['post_type'],
+        'created_at': summary['created_at'],
+        'image': summary['image'],
+        'images': summary['images'],
+        'is_human_drawing': summary['is_human_drawing'],
+    }
+    if removal:
+        data['is_removed'] = summary['is_removed']
+        data['is_deleted'] = summary['is_deleted']
+    return data
+
+
+def notification_post_payloads(notifications):
+    """
+    Return {(post_id, is_removal): payload} for the posts of the given
+    notifications, for notification_payload
+    """
+    notifications = [notification for notification in notifications if notification.post_id]
+    posts = {
+        notification.post_id: notification.post for notification in notifications
+        if Notification.post.is_cached(notification)
+    }
+    summaries = get_post_summaries({notification.post_id for notification in notifications}, posts)
+    cards = get_author_cards(summary['author_id'] for summary in summaries.values())
+    payloads = {}
+    for notification in notifications:
+        summary = summaries.get(notification.post_id)
+        if summary is None:
+            continue
+        removal = notification.notification_type == 'post_removed'
+        key = (notification.post_id, removal)
+        if key not in payloads:
+            payloads[key] = render_post_summary(summary, cards.get(summary['author_id']), removal)
+    return payloads
@@ -1,9 +1,33 @@
-from django.test import TestCase
+import threading
+from importlib import import_module
+from unittest import mock, skipIf
+from io import StringIO
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from channels.testing import WebsocketCommunicator
+from django.apps import apps as global_apps
+from django.core.management import call_command
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.core.cache import cache
+from rest_framework.test import APIClient
 from django.contrib.auth import get_user_model
 from django.utils import timezone
 from datetime import timedelta
+from core.encoding import loads
+from core.presence import get_presence
 from posts.models import Post
-from .models import Notification
+from posts.serializers import UserPostSerializer
+from .models import Notification, NotificationGroup, NotificationReadMarker, PendingNotification
+from . import queue, services
+from .queue import deliver_pending_notifications, enqueue_notification
+from .services import (
+    create_follow_notification, create_like_notification, create_notification,
+    create_repost_notification, get_unread_count, notification_payload, save_deduplicated_notification,
+)
+from .consumers import NotificationConsumer
+from .serializers import NotificationSerializer
 
 User = get_user_model()
 
@@ -419,3 +443,646 @@ class NotificationModelTest(TestCase):
         
         # Test notification type in string
         self.assertIn('like', str(notification2))
+
+
+class GroupedNotificationQueryCountTest(TestCase):
+    """Test that the grouped notification list does not issue queries per group"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.recipient = User.objects.create_user(
+            username='recipient',
+            email='recipient@example.com',
+            password='testpass123',
+            handle='recipient'
+        )
+        self.client.force_authenticate(user=self.recipient)
+        self.created = 0
+
+    def _add_groups(self, count):
+        for _ in range(count):
+            self.created += 1
+            sender = User.objects.create_user(
+                username=f'sender{self.created}',
+                email=f'sender{self.created}@example.com',
+                password='testpass123',
+                handle=f'sender{self.created}'
+            )
+            post = Post.objects.create(author=self.recipient, content=f'Post {self.created}')
+            create_notification(sender, self.recipient, 'like', post=post)
+            create_notification(sender, self.recipient, 'follow')
+
+    def _list_notifications(self):
+        cache.clear()  # Compare cold renders so cached bodies and cards do not skew counts
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/notifications/?page=1&page_size=20')
+        self.assertEqual(response.status_code, 200)
+        return response.json(), len(queries)
+
+    def test_grouped_list_query_count_is_constant(self):
+        """Test that more groups cost the same number of queries"""
+        self._add_groups(2)
+        small, small_queries = self._list_notifications()
+        self._add_groups(4)
+        large, large_queries = self._list_notifications()
+
+        self.assertEqual(small['count'], 4)
+        self.assertEqual(large['count'], 12)
+        self.assertEqual(small_queries, large_queries)
+
+
+class NotificationGroupTest(TestCase):
+    """Test the write-time notification groups behind the notification list"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.recipient = User.objects.create_user(
+            username='recipient',
+            email='recipient@example.com',
+            password='testpass123',
+            handle='recipient'
+        )
+        self.senders = [
+            User.objects.create_user(
+                username=f'sender{i}',
+                email=f'sender{i}@example.com',
+                password='testpass123',
+                handle=f'sender{i}'
+            )
+            for i in range(3)
+        ]
+        self.post = Post.objects.create(author=self.recipient, content='Grouped post')
+        self.client.force_authenticate(user=self.recipient)
+
+    def test_post_notifications_share_a_group(self):
+        """Test that notifications about one post are folded into one group"""
+        for sender in [*self.senders, self.senders[0]]:
+            create_notification(sender, self.recipient, 'comment', post=self.post, comment=self.post)
+        create_notification(self.senders[1], self.recipient, 'follow')
+        create_notification(self.senders[2], self.recipient, 'follow')
+
+        group = NotificationGroup.objects.get(notification_type='comment')
+        self.assertEqual(group.total_count, 4)
+        self.assertEqual(group.sender_count, 3)
+        self.assertEqual(group.recent_sender_ids, [self.senders[0].id, self.senders[2].id, self.senders[1].id])
+        self.assertFalse(group.is_read)
+        self.assertEqual(NotificationGroup.objects.filter(notification_type='follow').count(), 2)
+
+    def test_list_returns_groups_newest_first(self):
+        """Test the list payload and the page-number and cursor pagination"""
+        create_notification(self.senders[0], self.recipient, 'comment', post=self.post, comment=self.post)
+        create_notification(self.senders[1], self.recipient, 'follow')
+        create_notification(self.senders[2], self.recipient, 'comment', post=self.post, comment=self.post)
+
+        results = self.client.get('/api/notifications/?page=1&page_size=20').json()['results']
+        self.assertEqual([group['notification_type'] for group in results], ['comment', 'follow'])
+        self.assertEqual([user['id'] for user in results[0]['users']], [self.senders[2].id, self.senders[0].id])
+        self.assertEqual(results[0]['users_count'], 2)
+        self.assertEqual(results[0]['post']['id'], self.post.id)
+
+        first = self.client.get('/api/notifications/?pagination=cursor&page_size=1').json()
+        self.assertEqual(first['results'][0]['id'], results[0]['id'])
+        second = self.client.get(first['next']).json()
+        self.assertEqual(second['results'][0]['id'], results[1]['id'])
+        self.assertIsNone(second['next'])
+
+    def test_mark_group_as_read(self):
+        """Test that marking a group read covers all of its notifications"""
+        for sender in self.senders:
+            create_notification(sender, self.recipient, 'comment', post=self.post, comment=self.post)
+        group = NotificationGroup.objects.get()
+
+        response = self.client.post('/api/notifications/mark_group_as_read/', {'group_ids': [group.id]}, format='json')
+        self.assertEqual(response.status_code, 204)
+
+        group.refresh_from_db()
+        self.assertTrue(group.is_read)
+        self.assertFalse(Notification.objects.filter(group=group, is_read=False).exists())
+
+        create_notification(self.senders[0], self.recipient, 'comment', post=self.post, comment=self.post)
+        group.refresh_from_db()
+        self.assertFalse(group.is_read)
+
+
+class NotificationReadWatermarkTest(TestCase):
+    """Test the read watermark and the cached, pushed unread count"""
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.recipient = User.objects.create_user(
+            username='recipient',
+            email='recipient@example.com',
+            password='testpass123',
+            handle='recipient'
+        )
+        self.sender = User.objects.create_user(
+            username='sender',
+            email='sender@example.com',
+            password='testpass123',
+            handle='sender'
+        )
+        self.posts = [Post.objects.create(author=self.recipient, content=f'Post {i}') for i in range(3)]
+        self.client.force_authenticate(user=self.recipient)
+
+    def _notify(self, post):
+        return create_notification(self.sender, self.recipient, 'comment', post=post, comment=post)
+
+    def _unread_count(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/notifications/unread_count/')
+        return response.json()['count'], len(queries)
+
+    def test_mark_all_as_read_moves_watermark_only(self):
+        """Test that mark all as read does not touch the notification rows"""
+        for post in self.posts:
+            self._notify(post)
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post('/api/notifications/mark_all_as_read/')
+        self.assertEqual(response.status_code, 204)
+        self.assertFalse(any('UPDATE "notifications_notification' in q['sql'] for q in queries.captured_queries))
+
+        self.assertEqual(self._unread_count(), (0, 0))
+        results = self.client.get('/api/notifications/').json()['results']
+        self.assertTrue(all(group['is_read'] for group in results))
+
+        self._notify(self.posts[0])
+        self.assertEqual(self._unread_count(), (1, 0))
+        results = self.client.get('/api/notifications/').json()['results']
+        self.assertEqual([group['is_read'] for group in results], [False, True, True])
+
+    def test_unread_count_is_cached_and_counts_overrides(self):
+        """Test that the count is served from cache and follows per-item reads"""
+        notifications = [self._notify(post) for post in self.posts]
+        self.assertEqual(self._unread_count(), (3, 0))
+
+        self.client.post(f'/api/notifications/{notifications[0].id}/mark_as_read/')
+        self.client.post(f'/api/notifications/{notifications[0].id}/mark_as_read/')
+        self.assertEqual(self._unread_count(), (2, 0))
+
+        cache.clear()
+        count, queries = self._unread_count()
+        self.assertEqual(count, 2)
+        self.assertGreater(queries, 0)
+
+    def test_mark_as_read_returns_group_state_and_count(self):
+        """Test that marking one notification read tells the client its group's state and the new count"""
+        first = self._notify(self.posts[0])
+        self._notify(self.posts[1])
+
+        response = self.client.post(f'/api/notifications/{first.id}/mark_as_read/')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {'group_id': first.group_id, 'group_is_read': True, 'unread_count': 1})
+
+    def test_unread_count_is_pushed(self):
+        """Test that count changes are sent to the notifications group"""
+        from asgiref.sync import async_to_sync
+        from channels.layers import get_channel_layer
+
+        layer = get_channel_layer()
+        channel = async_to_sync(layer.new_channel)()
+        async_to_sync(layer.group_add)(f'notifications_{self.recipient.id}', channel)
+        get_presence().connect(self.recipient.id, channel)
+
+        def pushed_counts():
+            counts = []
+            while channel in layer.channels:  # Dropped by the layer once drained
+                message = loads(async_to_sync(layer.receive)(channel)['text'])
+                if message.get('type') == 'unread_count':
+                    counts.append(message['count'])
+            return counts
+
+        self._notify(self.posts[0])
+        self._notify(self.posts[1])
+        self.client.post('/api/notifications/mark_all_as_read/')
+        self.assertEqual(pushed_counts(), [1, 2, 0])
+
+
+class DeduplicatedNotificationTest(TestCase):
+    """Test the single-statement upsert behind like, follow and repost notifications"""
+
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user(
+            username='author', email='author@example.com', password='testpass123', handle='author'
+        )
+        self.fan = User.objects.create_user(
+            username='fan', email='fan@example.com', password='testpass123', handle='fan'
+        )
+        self.post = Post.objects.create(author=self.author, content='Popular post')
+
+    def test_repeated_likes_bump_one_row(self):
+        """Test that repeated likes in a window count on one notification"""
+        create_like_notification(self.fan, self.post)
+        with CaptureQueriesContext(connection) as queries:
+            create_like_notification(self.fan, self.post)
+        create_like_notification(self.fan, self.post)
+
+        notification = Notification.objects.get(notification_type='like')
+        self.assertEqual(notification.action_count, 3)
+        self.assertEqual(notification.group.total_count, 1)
+        # One upsert, inside the savepoint its atomic block opens in this test's transaction
+        statements = [query['sql'] for query in queries if not query['sql'].startswith(('SAVEPOINT', 'RELEASE SAVEPOINT'))]
+        self.assertEqual(len(statements), 1)
+        self.assertEqual(get_unread_count(self.author.id), 1)
+
+    def test_follow_and_like_are_separate(self):
+        """Test that post-less follows deduplicate among themselves"""
+        create_follow_notification(self.fan, self.author)
+        create_follow_notification(self.fan, self.author)
+        create_like_notification(self.fan, self.post)
+
+        self.assertEqual(Notification.objects.get(notification_type='follow').action_count, 2)
+        self.assertEqual(Notification.objects.get(notification_type='like').action_count, 1)
+
+    def test_fallback_without_upsert(self):
+        """Test the update-then-insert path used by databases without the upsert"""
+        with mock.patch('notifications.services._supports_upsert', return_value=False):
+            create_repost_notification(self.fan, self.post)
+            create_repost_notification(self.fan, self.post)
+
+        notification = Notification.objects.get(notification_type='repost')
+        self.assertEqual(notification.action_count, 2)
+        self.assertIsNotNone(notification.group)
+
+    def test_new_window_creates_new_notification(self):
+        """Test that a like in the next 24-hour window is a new notification"""
+        create_like_notification(self.fan, self.post)
+        tomorrow = timezone.now() + timedelta(days=1)
+        with mock.patch('notifications.services.timezone.now', return_value=tomorrow):
+            create_like_notification(self.fan, self.post)
+
+        self.assertEqual(Notification.objects.filter(notification_type='like').count(), 2)
+
+    def test_interleaved_upserts_count_on_one_row(self):
+        """Test that two upserts of one window meet in the same row (the ON CONFLICT path on SQLite)"""
+        first, second = timezone.now(), timezone.now() + timedelta(seconds=1)
+        save_deduplicated_notification(self.fan, self.author, 'like', self.post, first)
+        save_deduplicated_notification(self.fan, self.author, 'like', self.post, second)
+
+        notification = Notification.objects.get(notification_type='like')
+        self.assertEqual(notification.action_count, 2)
+        self.assertEqual(notification.action_timestamp, second)
+
+    def test_upserted_row_is_rolled_back_without_its_group(self):
+        """Test that a failure grouping a new upserted notification leaves no ungrouped row"""
+        with mock.patch('notifications.services.attach_groups', side_effect=RuntimeError('grouping failed')):
+            with self.assertRaises(RuntimeError):
+                save_deduplicated_notification(self.fan, self.author, 'like', self.post)
+
+        self.assertFalse(Notification.objects.exists())
+
+    def test_insert_race_falls_back_to_a_bump(self):
+        """Test the fallback path when another request inserts between its probe and insert"""
+        bump = services._bump_deduplicated
+        raced = []
+
+        def probe_then_lose_the_race(*args, **kwargs):
+            updated = bump(*args, **kwargs)
+            if not raced:
+                # A concurrent request inserts the row of this window now
+                raced.append(True)
+                save_deduplicated_notification(self.fan, self.author, 'like', self.post)
+            return updated
+
+        with mock.patch('notifications.services._supports_upsert', return_value=False), \
+                mock.patch('notifications.services._bump_deduplicated', side_effect=probe_then_lose_the_race):
+            self.assertIsNone(save_deduplicated_notification(self.fan, self.author, 'like', self.post))
+
+        notification = Notification.objects.get(notification_type='like')
+        self.assertEqual(notification.action_count, 2)
+
+    def test_backfilled_rows_are_bumped_by_new_actions(self):
+        """Test that migration 0016 keys old rows so new likes in their window do not duplicate them"""
+        backfill = import_module('notifications.migrations.0016_backfill_dedup_bucket').backfill_dedup_buckets
+        # Midday of the current window, so the rows cannot straddle two windows
+        now = timezone.now()
+        now += timedelta(seconds=services.DEDUP_WINDOW_SECONDS // 2 - now.timestamp() % services.DEDUP_WINDOW_SECONDS)
+        old = [
+            Notification.objects.create(
+                sender=self.fan, recipient=self.author, notification_type='like', post=self.post,
+                action_timestamp=timestamp
+            )
+            for timestamp in (now - timedelta(days=3), now - timedelta(seconds=2), now - timedelta(seconds=1))
+        ]
+
+        backfill(global_apps, None)
+        with mock.patch('notifications.services.timezone.now', return_value=now):
+            create_like_notification(self.fan, self.post)
+
+        self.assertEqual(Notification.objects.count(), 3)
+        buckets = [Notification.objects.get(id=n.id).dedup_bucket for n in old]
+        self.assertEqual(buckets[0], services.dedup_bucket(old[0].action_timestamp))
+        self.assertIsNone(buckets[1])
+        self.assertEqual(Notification.objects.get(id=old[2].id).action_count, 2)
+
+
+@skipIf(connection.vendor == 'sqlite', 'SQLite test databases lock whole tables across threads')
+class DeduplicatedNotificationConcurrencyTest(TransactionTestCase):
+    """Test that concurrent likes of one post never lose a count or duplicate a row"""
+
+    def test_concurrent_likes(self):
+        author = User.objects.create_user(
+            username='author', email='author@example.com', password='testpass123', handle='author'
+        )
+        fan = User.objects.create_user(
+            username='fan', email='fan@example.com', password='testpass123', handle='fan'
+        )
+        post = Post.objects.create(author=author, content='Popular post')
+        workers, likes_per_worker = 8, 5
+        errors = []
+
+        def like():
+            try:
+                for _ in range(likes_per_worker):
+                    create_like_notification(fan, post)
+            except Exception as e:
+                errors.append(e)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=like) for _ in range(workers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        notification = Notification.objects.get(notification_type='like')
+        self.assertEqual(notification.action_count, workers * likes_per_worker)
+        self.assertEqual(NotificationGroup.objects.get(post=post).total_count, 1)
+
+
+class NotificationQueueTest(TestCase):
+    """Test the deferred notification pipeline behind the API views"""
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.author = User.objects.create_user(
+            username='author', email='author@example.com', password='testpass123', handle='author'
+        )
+        self.fans = [
+            User.objects.create_user(
+                username=f'fan{i}', email=f'fan{i}@example.com', password='testpass123', handle=f'fan{i}'
+            )
+            for i in range(3)
+        ]
+        self.post = Post.objects.create(author=self.author, content='Queued post')
+
+    def _like(self, user):
+        self.client.force_authenticate(user=user)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(f'/api/posts/{self.author.handle}/{self.post.id}/like/')
+        self.assertEqual(response.status_code, 200)
+
+    @override_settings(NOTIFICATION_QUEUE_WORKER=True)
+    def test_like_is_queued_and_delivered_in_a_batch(self):
+        """Test that the request only queues and the worker creates, groups and counts"""
+        for fan in self.fans:
+            self._like(fan)
+        self.client.force_authenticate(user=self.fans[0])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(f'/api/users/handle/{self.author.handle}/follow/')
+
+        self.assertEqual(PendingNotification.objects.count(), 4)
+        self.assertFalse(Notification.objects.exists())
+
+        layer = get_channel_layer()
+        channel = async_to_sync(layer.new_channel)()
+        async_to_sync(layer.group_add)(f'notifications_{self.author.id}', channel)
+        get_presence().connect(self.author.id, channel)
+        call_command('deliver_notifications', '--once', stdout=StringIO())
+
+        self.assertFalse(PendingNotification.objects.exists())
+        self.assertEqual(Notification.objects.filter(notification_type='like').count(), 3)
+        self.assertEqual(NotificationGroup.objects.get(notification_type='like').sender_count, 3)
+        self.assertEqual(get_unread_count(self.author.id), 4)
+        frames = []
+        while channel in layer.channels:
+            frames.append(loads(async_to_sync(layer.receive)(channel)['text']))
+        self.assertEqual(sorted(frame['type'] for frame in frames), ['notification'] * 4 + ['unread_count'])
+
+    @override_settings(NOTIFICATION_QUEUE_WORKER=True)
+    def test_repeated_actions_in_a_batch_share_one_upsert(self):
+        """Test that queued repeats of one action fold into one notification"""
+        with self.captureOnCommitCallbacks(execute=True):
+            for _ in range(3):
+                enqueue_notification(self.fans[0], self.author, 'repost', post=self.post)
+            enqueue_notification(self.author, self.author, 'like', post=self.post)
+
+        deliver_pending_notifications()
+
+        notification = Notification.objects.get()
+        self.assertEqual(notification.action_count, 3)
+        self.assertEqual(notification.group.total_count, 1)
+
+    @override_settings(NOTIFICATION_QUEUE_WORKER=True)
+    def test_failing_row_does_not_hold_up_the_queue(self):
+        """Test that one bad row is retried alone, then set aside, while its neighbours are delivered"""
+        with self.captureOnCommitCallbacks(execute=True):
+            for fan in self.fans:
+                enqueue_notification(fan, self.author, 'like', post=self.post)
+            enqueue_notification(self.fans[0], self.author, 'follow')
+        bad = PendingNotification.objects.get(sender=self.fans[1])
+        save = queue.save_deduplicated_notification
+
+        def failing_save(sender, *args, **kwargs):
+            if sender == self.fans[1]:
+                raise ValueError('Broken row')
+            return save(sender, *args, **kwargs)
+
+        with mock.patch('notifications.queue.save_deduplicated_notification', side_effect=failing_save):
+            self.assertEqual(deliver_pending_notifications(), 4)
+            self.assertEqual(Notification.objects.count(), 3)
+            self.assertEqual(list(PendingNotification.objects.values_list('id', flat=True)), [bad.id])
+            for _ in range(queue.MAX_DELIVERY_ATTEMPTS - 1):
+                deliver_pending_notifications()
+            self.assertEqual(deliver_pending_notifications(), 0)
+
+        bad.refresh_from_db()
+        self.assertEqual(bad.attempts, queue.MAX_DELIVERY_ATTEMPTS)
+        self.assertEqual(bad.last_error, 'Broken row')
+        self.assertIsNotNone(bad.failed_at)
+        self.assertEqual(get_unread_count(self.author.id), 3)
+
+    def test_delivered_inline_without_worker(self):
+        """Test that the queue is drained in process when no worker runs"""
+        self._like(self.fans[0])
+
+        self.assertFalse(PendingNotification.objects.exists())
+        self.assertEqual(Notification.objects.get().sender, self.fans[0])
+
+
+class NotificationPostSnapshotTest(TestCase):
+    """Test the cached post summaries behind notification payloads"""
+
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user(
+            username='author', email='author@example.com', password='testpass123', handle='author'
+        )
+        self.fans = [
+            User.objects.create_user(
+                username=f'fan{i}', email=f'fan{i}@example.com', password='testpass123', handle=f'fan{i}'
+            )
+            for i in range(2)
+        ]
+        self.post = Post.objects.create(author=self.author, content='Viral post')
+
+    def _payload(self, notification):
+        notification = Notification.objects.select_related('sender').get(id=notification.id)
+        return notification_payload(notification)
+
+    def test_payload_is_a_cache_hit_after_the_first(self):
+        """Test that later notifications about a post reuse its summary"""
+        first = create_notification(self.fans[0], self.author, 'like', post=self.post)
+        second = create_notification(self.fans[1], self.author, 'like', post=self.post)
+        expected = self._payload(first)['post']
+
+        notification = Notification.objects.select_related('sender').get(id=second.id)
+        with self.assertNumQueries(0):
+            payload = notification_payload(notification)
+        self.assertEqual(payload['post'], expected)
+        self.assertEqual(payload['post']['author']['handle'], 'author')
+        self.assertNotIn('is_removed', payload['post'])
+
+    def test_summary_follows_edits_and_removal(self):
+        """Test that editing or removing the post retires its summary"""
+        notification = create_notification(self.fans[0], self.author, 'like', post=self.post)
+        self._payload(notification)
+
+        self.post.content = 'Edited post'
+        self.post.save()
+        self.assertEqual(self._payload(notification)['post']['content'], 'Edited post')
+
+        self.post.is_removed = True
+        self.post.save()
+        removal = create_notification(None, self.author, 'post_removed', post=self.post)
+        self.assertTrue(self._payload(removal)['post']['is_removed'])
+
+    def test_serializer_renders_the_shared_post_body(self):
+        """Test that the notification serializer matches UserPostSerializer"""
+        notification = create_notification(self.fans[0], self.author, 'like', post=self.post)
+
+        data = NotificationSerializer(notification, context={}).data
+        self.assertEqual(data['post'], UserPostSerializer(self.post, context={}).data)
+
+
+class NotificationRetentionTest(TestCase):
+    """Test the compact_notifications retention command"""
+
+    def setUp(self):
+        cache.clear()
+        self.recipient = User.objects.create_user(
+            username='recipient', email='recipient@example.com', password='testpass123', handle='recipient'
+        )
+        self.senders = [
+            User.objects.create_user(
+                username=f'sender{i}', email=f'sender{i}@example.com', password='testpass123', handle=f'sender{i}'
+            )
+            for i in range(4)
+        ]
+        self.post = Post.objects.create(author=self.recipient, content='Old post')
+
+    def _comment(self, sender, days_ago, is_read=False):
+        notification = create_notification(sender, self.recipient, 'comment', post=self.post, comment=self.post)
+        Notification.objects.filter(id=notification.id).update(
+            created_at=timezone.now() - timedelta(days=days_ago), is_read=is_read
+        )
+        return notification
+
+    def test_deletes_only_old_read_notifications(self):
+        """Test that old read notifications go in batches and the group keeps its counts"""
+        self._comment(self.senders[0], 100, is_read=True)
+        under_watermark = self._comment(self.senders[1], 100)
+        NotificationReadMarker.objects.create(user=self.recipient, read_through_id=under_watermark.id)
+        old_unread = self._comment(self.senders[2], 100)
+        recent_read = self._comment(self.senders[3], 5, is_read=True)
+
+        out = StringIO()
+        call_command('compact_notifications', '--days', '90', '--batch-size', '1', stdout=out)
+
+        remaining = set(Notification.objects.values_list('id', flat=True))
+        self.assertEqual(remaining, {old_unread.id, recent_read.id})
+        group = NotificationGroup.objects.get()
+        self.assertEqual(group.total_count, 4)
+        self.assertEqual(group.compacted_count, 2)
+        self.assertIn('in 3 batches', out.getvalue())
+
+    def test_dry_run_deletes_nothing(self):
+        """Test that --dry-run only reports the count"""
+        self._comment(self.senders[0], 100, is_read=True)
+
+        out = StringIO()
+        call_command('compact_notifications', '--dry-run', stdout=out)
+
+        self.assertEqual(Notification.objects.count(), 1)
+        self.assertIn('1 read notifications', out.getvalue())
+
+
+class NotificationConsumerCatchUpTest(TestCase):
+    """Test the reconnect replay and the coalesced frames of the notification socket"""
+
+    def setUp(self):
+        cache.clear()
+        self.recipient = User.objects.create_user(
+            username='recipient', email='recipient@example.com', password='testpass123', handle='recipient'
+        )
+        self.sender = User.objects.create_user(
+            username='sender', email='sender@example.com', password='testpass123', handle='sender'
+        )
+        self.post = Post.objects.create(author=self.recipient, content='Busy post')
+
+    def _communicator(self, path='/ws/notifications/'):
+        communicator = WebsocketCommunicator(NotificationConsumer.as_asgi(), path)
+        communicator.scope['user'] = self.recipient
+        return communicator
+
+    def test_replays_missed_notifications_in_one_frame(self):
+        """Test that ?since= replays newer notifications with the unread count"""
+        first = create_notification(self.sender, self.recipient, 'comment', post=self.post, comment=self.post)
+        second = create_notification(self.sender, self.recipient, 'follow')
+        third = create_notification(self.sender, self.recipient, 'comment', post=self.post, comment=self.post)
+
+        async def run():
+            communicator = self._communicator(f'/ws/notifications/?since={first.id}')
+            connected, _ = await communicator.connect()
+            self.assertTrue(connected)
+            frame = await communicator.receive_json_from()
+            await communicator.disconnect()
+            return frame
+
+        frame = async_to_sync(run)()
+        self.assertEqual(frame['type'], 'notification_batch')
+        self.assertTrue(frame['replay'])
+        self.assertEqual([n['id'] for n in frame['notifications']], [second.id, third.id])
+        self.assertEqual(frame['notifications'][1]['post']['id'], self.post.id)
+        self.assertEqual(frame['unread_count'], 3)
+        self.assertNotIn('truncated', frame)
+
+    def test_burst_is_coalesced_into_a_bounded_batch(self):
+        """Test that a burst becomes one batch frame and a single event stays a plain frame"""
+        group = f'notifications_{self.recipient.id}'
+
+        async def run():
+            layer = get_channel_layer()
+            communicator = self._communicator()
+            await communicator.connect()
+            await layer.group_send(group, {'type': 'notification_message', 'message': {'type': 'notification', 'id': 1}})
+            single = await communicator.receive_json_from()
+            for message in [{'type': 'notification', 'id': i} for i in (2, 3, 4)] + [{'type': 'unread_count', 'count': 4}]:
+                await layer.group_send(group, {'type': 'notification_message', 'message': message})
+            batch = await communicator.receive_json_from()
+            await communicator.disconnect()
+            return single, batch
+
+        with mock.patch.object(NotificationConsumer, 'send_queue_limit', 3):
+            single, batch = async_to_sync(run)()
+        self.assertEqual(single, {'type': 'notification', 'id': 1})
+        self.assertEqual(batch['type'], 'notification_batch')
+        self.assertEqual([n['id'] for n in batch['notifications']], [3, 4])
+        self.assertEqual(batch['unread_count'], 4)
+        self.assertTrue(batch['truncated'])
@@ -3,10 +3,11 @@ from rest_framework import viewsets, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
-from rest_framework.pagination import PageNumberPagination
+from rest_framework.pagination import PageNumberPagination, CursorPagination
 from django.db.models import Q, Max
-from .models import Notification
+from .models import Notification, NotificationGroup, NotificationReadMarker
 from .serializers import NotificationSerializer, GroupedNotificationSerializer
+from .services import change_unread_count, get_unread_count, mark_all_notifications_read, mark_notification_read
 
 # Custom pagination for notifications
 class NotificationPagination(PageNumberPagination):
@@ -14,6 +15,12 @@ class NotificationPagination(PageNumberPagination):
     page_size_query_param = 'page_size'
     max_page_size = 100
 
+class NotificationGroupCursorPagination(CursorPagination):
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    ordering = ('-latest_time', '-id')
+
 # Create your views here.
 
 class NotificationViewSet(viewsets.ReadOnlyModelViewSet):
@@ -25,99 +32,58 @@ class NotificationViewSet(viewsets.ReadOnlyModelViewSet):
         return Notification.objects.filter(recipient=self.request.user)
 
     def list(self, request, *args, **kwargs):
-        """Override list to return grouped notifications"""
-        queryset = self.get_queryset()
-        
-        # Group notifications by type, post, and comment
-        grouped_data = self._get_grouped_notifications(queryset)
-        
-        # Serialize grouped data
-        serializer = GroupedNotificationSerializer(grouped_data, many=True)
-        
-        # Apply pagination
-        page = self.paginate_queryset(serializer.data)
-        if page is not None:
-            return self.get_paginated_response(page)
-        
-        return Response(serializer.data)
+        """List notification groups, newest activity first"""
+        groups = NotificationGroup.objects.filter(
+            recipient=request.user
+        ).select_related('latest_notification').order_by('-latest_time', '-id')
 
-    def _get_grouped_notifications(self, queryset):
-        """Helper method to group notifications"""
-        grouped = {}
-        
-        for notification in queryset.select_related('sender', 'post', 'comment').prefetch_related('post__images'):
-            # Create key for grouping
-            if notification.post:
-                key = f"{notification.notification_type}_{notification.post.id}"
-            elif notification.comment:
-                key = f"{notification.notification_type}_{notification.comment.id}"
-            else:
-                # For notifications without post/comment (like follow), keep as individual
-                key = f"{notification.notification_type}_{notification.id}"
-            
-            if key not in grouped:
-                grouped[key] = {
-                    'notification_type': notification.notification_type,
-                    'users': [],
-                    'latest_time': notification.created_at,
-                    'is_read': notification.is_read,
-                    'notification_ids': [],
-                    'notifications': []
-                }
-                # Only add post and comment if they exist
-                if notification.post:
-                    grouped[key]['post'] = notification.post
-                if notification.comment:
-                    grouped[key]['comment'] = notification.comment
-            
-            # Add user to the group
-            if notification.sender:
-                # For report_received notifications, don't include sender (system notification)
-                if notification.notification_type == 'report_received':
-                    continue
-                    
-                # Check if user is already in the group to avoid duplicates
-                user_exists = any(user.id == notification.sender.id for user in grouped[key]['users'])
-                if not user_exists:
-                    grouped[key]['users'].append(notification.sender)
-            
-            # Update latest time and read status
-            if notification.created_at > grouped[key]['latest_time']:
-                grouped[key]['latest_time'] = notification.created_at
-            
-            if not notification.is_read:
-                grouped[key]['is_read'] = False
-            
-            grouped[key]['notification_ids'].append(notification.id)
-            grouped[key]['notifications'].append(notification)
-        
-        # Convert to list and sort by latest time
-        result = list(grouped.values())
-        result.sort(key=lambda x: x['latest_time'], reverse=True)
-        
-        return result
+        # Keyset pagination when the client follows cursors, page numbers otherwise
+        if 'cursor' in request.query_params or request.query_params.get('pagination') == 'cursor':
+            paginator = NotificationGroupCursorPagination()
+        else:
+            paginator = self.paginator
+        page = paginator.paginate_queryset(groups, request, view=self)
+        context = {'read_through_id': NotificationReadMarker.read_through_for(request.user)}
+        serializer = GroupedNotificationSerializer(page, many=True, context=context)
+        return paginator.get_paginated_response(serializer.data)
 
     @action(detail=False, methods=['post'])
     def mark_all_as_read(self, request):
-        self.get_queryset().update(is_read=True)
+        mark_all_notifications_read(request.user)
         return Response(status=status.HTTP_204_NO_CONTENT)
 
     @action(detail=True, methods=['post'])
     def mark_as_read(self, request, pk=None):
+        """Mark one notification read; returns its group's read state and the new unread count"""
         notification = self.get_object()
-        notification.is_read = True
-        notification.save()
-        return Response(status=status.HTTP_204_NO_CONTENT)
+        mark_notification_read(notification)
+        return Response({
+            'group_id': notification.group_id,
+            'group_is_read': notification.group.is_read if notification.group else True,
+            'unread_count': get_unread_count(request.user.id),
+        })
 
     @action(detail=False, methods=['post'])
     def mark_group_as_read(self, request):
-        """Mark all notifications in a group as read"""
+        """Mark all notifications in the given groups as read"""
+        group_ids = request.data.get('group_ids', [])
         notification_ids = request.data.get('notification_ids', [])
         if notification_ids:
-            self.get_queryset().filter(id__in=notification_ids).update(is_read=True)
+            # Older clients send the ids of the notifications in the group
+            group_ids = [*group_ids, *self.get_queryset().filter(
+                id__in=notification_ids, group__isnull=False
+            ).values_list('group_id', flat=True)]
+        if group_ids:
+            groups = NotificationGroup.objects.filter(recipient=request.user, id__in=group_ids)
+            # Notifications under the watermark are already read
+            read_through = NotificationReadMarker.read_through_for(request.user)
+            marked = self.get_queryset().filter(
+                group__in=groups, is_read=False, id__gt=read_through
+            ).update(is_read=True)
+            groups.update(is_read=True)
+            change_unread_count(request.user.id, -marked)
         return Response(status=status.HTTP_204_NO_CONTENT)
 
     @action(detail=False, methods=['get'])
     def unread_count(self, request):
-        count = self.get_queryset().filter(is_read=False).count()
-        return Response({'count': count})
\ No newline at end of file
+        return Response({'count': get_unread_count(request.user.id)})
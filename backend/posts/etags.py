@@ -0,0 +1,60 @@
+"""
+ETags for the post detail endpoints (see core.etags).
+
+A serialized post depends on its own row, its images, the posts it
+references, the posts of its conversation chain, the author cards, the
+counters and the viewer's likes/reposts/bookmarks. Rows are read with a
+narrow values() query per level of references; everything else is covered by
+version stamps:
+
+- post body versions (posts.hydration), bumped when a post or its images change
+- counter versions (below), bumped when likes, reposts, bookmarks or replies change
+- author card versions (users.caching), bumped when a profile changes
+"""
+from core.etags import make_etag
+from core.versions import bump_versions, get_versions
+from users.caching import get_author_card_versions
+from .hydration import get_post_body_versions
+from .models import Post
+
+ETAG_FIELDS = (
+    'id', 'author_id', 'author__handle', 'updated_at', 'referenced_post_id',
+    'conversation_chain', 'is_deleted', 'is_removed',
+)
+
+
+def _counters_key(post_id):
+    return f'post_counters_version:{post_id}'
+
+
+def bump_post_counters(post_ids):
+    """Retire the ETags of posts whose counters or viewer flags changed"""
+    bump_versions(_counters_key(post_id) for post_id in post_ids if post_id)
+
+
+def get_post_state(post_id):
+    """The ETag fields of a post (soft-deleted ones included), or None"""
+    return Post.all_objects.filter(id=post_id).values(*ETAG_FIELDS).first()
+
+
+def post_etag(state, serializer_class, viewer):
+    """ETag of the post ``state`` (from get_post_state) as serialized for ``viewer``"""
+    rows = {state['id']: state}
+    pending = {state['referenced_post_id']} - {None}
+    while pending:
+        for row in Post.all_objects.filter(id__in=pending).values(*ETAG_FIELDS):
+            rows[row['id']] = row
+        pending = {row['referenced_post_id'] for row in rows.values()} - set(rows) - {None}
+
+    chain_ids = {post_id for row in rows.values() for post_id in row['conversation_chain'] or []}
+    counters = get_versions(_counters_key(post_id) for post_id in rows)
+    bodies = get_post_body_versions(set(rows) | chain_ids)
+    cards = get_author_card_versions({row['author_id'] for row in rows.values()})
+    return make_etag(
+        serializer_class.__name__,
+        viewer,
+        sorted(tuple(row[field] for field in ETAG_FIELDS) for row in rows.values()),
+        sorted(counters.items()),
+        sorted(bodies.items()),
+        sorted(cards.items()),
+    )
@@ -0,0 +1,81 @@
+"""
+Second phase of the timeline endpoints: turn a page of post ids into
+serialized posts.
+
+The viewer-independent part of a serialized post (content, images, flags of
+the post itself) is cached per post under a version stamp that is replaced
+whenever the post or its images change (see the receivers in posts.models).
+Author, counters, viewer flags, referenced posts and chain validity are
+overlaid per request through the loader registry.
+"""
+from django.core.cache import cache
+
+from core.loaders import get_loaders
+from core.versions import bump_versions, get_versions
+from .models import Post
+
+POST_BODY_TIMEOUT = 60 * 60  # 1 hour
+
+# Post fields the overlay needs, stored next to the cached body
+STUB_FIELDS = ('author_id', 'referenced_post_id', 'post_type', 'conversation_chain', 'is_deleted', 'is_removed')
+
+
+def _version_key(post_id):
+    return f'post_body_version:{post_id}'
+
+
+def _body_key(serializer_class, post_id, version):
+    return f'post_body:{serializer_class.__name__}:{post_id}:{version}'
+
+
+def invalidate_post_body(post_id):
+    """Give the post a new version so every cached body of it is skipped"""
+    bump_versions([_version_key(post_id)])
+
+
+def get_post_body_versions(post_ids):
+    keys = {_version_key(post_id): post_id for post_id in post_ids}
+    return {keys[key]: version for key, version in get_versions(keys).items()}
+
+
+def get_post_bodies(post_ids, serializer_class):
+    """
+    Return {post_id: body} for the given ids, serializing and caching the
+    bodies that are not cached yet with one query for the missing posts.
+    """
+    versions = get_post_body_versions(post_ids)
+    keys = {_body_key(serializer_class, post_id, versions.get(post_id)): post_id for post_id in post_ids}
+    bodies = {keys[key]: body for key, body in cache.get_many(keys).items()}
+
+    missing = [post_id for post_id in post_ids if post_id not in bodies]
+    if missing:
+        # Rendered without a request so image URLs stay relative in the cache
+        serializer = serializer_class(context={})
+        posts = list(Post.all_objects.filter(id__in=missing))
+        serializer.prime_body_loaders(posts, get_loaders(serializer.context))
+        fresh = {post.id: serializer.body_representation(post) for post in posts}
+        cache.set_many(
+            {_body_key(serializer_class, post_id, versions.get(post_id)): body for post_id, body in fresh.items()},
+            POST_BODY_TIMEOUT
+        )
+        bodies.update(fresh)
+    return bodies
+
+
+def stub_from_body(body):
+    """Unsaved Post carrying just what the overlay fields read"""
+    return Post(id=body['id'], **body['_post'])
+
+
+def hydrate_posts(post_ids, serializer_class, context):
+    """
+    Serialize the posts with the given ids, in that order, the same way
+    ``serializer_class(posts, many=True, context=context).data`` would.
+    Ids of posts that no longer exist are skipped.
+    """
+    bodies = get_post_bodies(post_ids, serializer_class)
+    stubs = [stub_from_body(bodies[post_id]) for post_id in post_ids if post_id in bodies]
+
+    serializer = serializer_class(context=context)
+    serializer.prime_loaders(stubs, get_loaders(context))
+    return [serializer.hydrated_representation(bodies[stub.id], stub) for stub in stubs]
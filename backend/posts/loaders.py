@@ -0,0 +1,130 @@
+"""
+Batch loaders for post data used by the post serializers (see core.loaders).
+"""
+from django.db.models import Count
+
+from core.loaders import register_loader
+from users.loaders import User, prime_users
+from .models import Post, PostImage
+
+Like = Post.likes.through
+Repost = Post.reposters.through
+Bookmark = Post.bookmarks.through
+
+
+def _count_by(queryset, field, keys):
+    rows = queryset.filter(**{f'{field}__in': keys}).order_by().values(field).annotate(n=Count('pk'))
+    return {row[field]: row['n'] for row in rows}
+
+
+def _viewer_set(through, registry, keys):
+    if registry.viewer is None:
+        return {}
+    post_ids = through.objects.filter(
+        user_id=registry.viewer.pk, post_id__in=keys
+    ).values_list('post_id', flat=True)
+    return {post_id: True for post_id in post_ids}
+
+
+@register_loader('posts.likes_count', default=0)
+def likes_count(keys, registry):
+    return _count_by(Like.objects, 'post_id', keys)
+
+
+@register_loader('posts.reposts_count', default=0)
+def reposts_count(keys, registry):
+    # Same rows as post.reposts.count(): live posts referencing this one
+    return _count_by(Post.objects, 'referenced_post_id', keys)
+
+
+@register_loader('posts.replies_count', default=0)
+def replies_count(keys, registry):
+    return _count_by(Post.objects, 'parent_post_id', keys)
+
+
+@register_loader('posts.liked_by_viewer', default=False)
+def liked_by_viewer(keys, registry):
+    return _viewer_set(Like, registry, keys)
+
+
+@register_loader('posts.reposted_by_viewer', default=False)
+def reposted_by_viewer(keys, registry):
+    return _viewer_set(Repost, registry, keys)
+
+
+@register_loader('posts.bookmarked_by_viewer', default=False)
+def bookmarked_by_viewer(keys, registry):
+    return _viewer_set(Bookmark, registry, keys)
+
+
+def post_loader(loaders):
+    """Posts by id, including soft-deleted ones (like the FK descriptors)"""
+    return loaders.for_model(Post, manager='all_objects')
+
+
+def images_loader(loaders):
+    return loaders.for_model(PostImage, 'post_id', many=True)
+
+
+def counter_target_id(post):
+    """Reposts show the counters and viewer flags of the original post"""
+    if post.post_type == 'repost' and post.referenced_post_id:
+        return post.referenced_post_id
+    return post.id
+
+
+def _prime_from_instance(post, loaders):
+    """Reuse relations the queryset already loaded (select/prefetch_related)"""
+    post_loader(loaders).prime(post.id, post)
+    if Post.author.is_cached(post):
+        loaders.for_model(User).prime(post.author_id, post.author)
+    if Post.referenced_post.is_cached(post) and post.referenced_post is not None:
+        post_loader(loaders).prime(post.referenced_post_id, post.referenced_post)
+    prefetched = getattr(post, '_prefetched_objects_cache', {})
+    if 'images' in prefetched:
+        images_loader(loaders).prime(post.id, list(prefetched['images']))
+
+
+def prime_posts(posts, loaders, full_authors=False):
+    """
+    Queue every lookup needed to render a page of posts, including the posts
+    they reference, so each kind is fetched with one query.
+    """
+    everything = [post for post in posts if post is not None]
+    # Unsaved stubs rebuilt from cached bodies (posts.hydration) already carry
+    # their images and must not stand in for full rows
+    for post in everything:
+        if not post._state.adding:
+            _prime_from_instance(post, loaders)
+
+    # Quotes of quotes: one query per level of nesting, not per post
+    seen = {post.id for post in everything if not post._state.adding}
+    frontier = everything
+    while frontier:
+        referenced_ids = {
+            post.referenced_post_id for post in frontier
+            if post.post_type in ('repost', 'quote') and post.referenced_post_id
+        } - seen
+        seen |= referenced_ids
+        frontier = [post for post in post_loader(loaders).load_many(referenced_ids) if post is not None]
+        everything.extend(frontier)
+
+    chain_ids = set()
+    for post in everything:
+        if post.conversation_chain and post.post_type in ('reply', 'repost', 'quote'):
+            chain_ids.update(pk for pk in post.conversation_chain if pk != post.id)
+    post_loader(loaders).defer_many(chain_ids)
+
+    author_ids = [post.author_id for post in everything]
+    if full_authors:
+        prime_users(author_ids, loaders)
+    else:
+        loaders.named('users.author_card').defer_many(author_ids)
+    images_loader(loaders).defer_many(post.id for post in everything if not post._state.adding)
+
+    targets = {counter_target_id(post) for post in everything} | {post.id for post in everything}
+    for name in ('likes_count', 'reposts_count', 'replies_count'):
+        loaders.named(f'posts.{name}').defer_many(targets)
+    if loaders.viewer is not None:
+        for name in ('liked_by_viewer', 'reposted_by_viewer', 'bookmarked_by_viewer'):
+            loaders.named(f'posts.{name}').defer_many(targets)
@@ -0,0 +1,108 @@
+import json
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+
+from core.encoding import dumps, orjson
+from core.renderers import ORJSONRenderer
+
+
+def _author(i):
+    return {
+        'id': i,
+        'username': f'Demo User {i}',
+        'handle': f'demo_user_{i}',
+        'profile_picture': f'http://localhost:8000/media/profile_pictures/user_{i}.jpg',
+    }
+
+
+def build_feed_page(size=100):
+    """A page of posts shaped like PostSerializer output"""
+    now = timezone.now()
+    posts = []
+    for i in range(size):
+        created_at = (now - timedelta(minutes=i)).isoformat().replace('+00:00', 'Z')
+        posts.append({
+            'id': i + 1,
+            'author': _author(i % 20 + 1),
+            'content': f'Post number {i} about #art and #drawing — with some unicode ✨ and a link https://example.com/{i}',
+            'post_type': 'post' if i % 5 else 'repost',
+            'created_at': created_at,
+            'updated_at': created_at,
+            'likes_count': i * 3,
+            'reposts_count': i,
+            'replies_count': i % 7,
+            'is_liked': i % 2 == 0,
+            'is_reposted': i % 3 == 0,
+            'is_bookmarked': False,
+            'is_human_drawing': i % 4 == 0,
+            'is_verified': False,
+            'handle': f'demo_user_{i % 20 + 1}',
+            'images': [
+                {'id': i * 10 + n, 'image': f'http://localhost:8000/media/post_images/{i}_{n}.jpg', 'order': n}
+                for n in range(i % 3)
+            ],
+            'referenced_post': None,
+            'conversation_chain': [i - 1, i] if i else [],
+            'is_conversation_chain_valid': True,
+            'conversation_chain_reason': None,
+        })
+    return {'count': size * 10, 'next': 'http://localhost:8000/api/posts/feed/?page=2', 'previous': None, 'results': posts}
+
+
+def build_chat_history(size=1000):
+    """Messages shaped like MessageSerializer output"""
+    now = timezone.now()
+    return [
+        {
+            'id': i + 1,
+            'conversation': 1,
+            'sender': _author(i % 2 + 1),
+            'content': f'Message {i}: hey, did you see the new drawing? 🎨',
+            'image': None,
+            'created_at': (now - timedelta(seconds=i)).isoformat().replace('+00:00', 'Z'),
+            'is_read': i > 10,
+        }
+        for i in range(size)
+    ]
+
+
+class Command(BaseCommand):
+    help = 'Compare the stdlib and orjson JSON encoders on a feed page and a chat history'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=200, help='Encodes per payload')
+
+    def _time(self, func, payload, iterations):
+        start = time.perf_counter()
+        for _ in range(iterations):
+            func(payload)
+        return (time.perf_counter() - start) / iterations * 1000
+
+    def handle(self, *args, **options):
+        iterations = options['iterations']
+        if orjson is None:
+            self.stdout.write(self.style.WARNING('orjson is not installed; timing the stdlib fallback'))
+
+        stdlib_renderer = JSONRenderer()
+        fast_renderer = ORJSONRenderer()
+        payloads = [
+            ('feed page (100 posts)', build_feed_page(), stdlib_renderer.render, fast_renderer.render),
+            ('chat history (1000 messages)', build_chat_history(), json.dumps, dumps),
+        ]
+
+        for name, payload, baseline, candidate in payloads:
+            if json.loads(baseline(payload)) != json.loads(candidate(payload)):
+                self.stdout.write(self.style.ERROR(f'{name}: outputs differ'))
+                continue
+            baseline_ms = self._time(baseline, payload, iterations)
+            candidate_ms = self._time(candidate, payload, iterations)
+            self.stdout.write(
+                f'{name}: stdlib {baseline_ms:.3f} ms, fast {candidate_ms:.3f} ms '
+                f'({baseline_ms / candidate_ms:.1f}x)'
+            )
+
+        self.stdout.write(self.style.SUCCESS('Benchmark complete'))
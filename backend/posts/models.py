@@ -1,4 +1,6 @@
 from django.db import models
+from django.db.models.signals import post_save, post_delete, m2m_changed
+from django.dispatch import receiver
 from django.conf import settings
 from django.contrib.auth import get_user_model
 import os
@@ -616,4 +618,38 @@ class Donation(models.Model):
         # Ensure only verified human art posts can receive donations
         if not self.post.is_human_drawing or not self.post.is_verified:
             raise ValueError("Donations can only be made to verified human art posts")
-        super().save(*args, **kwargs)
\ No newline at end of file
+        super().save(*args, **kwargs)
+
+
+@receiver([post_save, post_delete], sender=Post)
+def invalidate_cached_post(sender, instance, **kwargs):
+    """
+    Edits, deletes, removals and verifications all save the post, so the
+    cached serialized body (posts.hydration) is versioned out here
+    """
+    from .hydration import invalidate_post_body
+    from .etags import bump_post_counters
+    invalidate_post_body(instance.id)
+    # Reposts, quotes and replies are counted on the posts they point at
+    bump_post_counters([instance.referenced_post_id, instance.parent_post_id])
+
+
+@receiver([post_save, post_delete], sender=PostImage)
+def invalidate_cached_post_images(sender, instance, **kwargs):
+    from .hydration import invalidate_post_body
+    invalidate_post_body(instance.post_id)
+
+
+@receiver(m2m_changed, sender=Post.likes.through)
+@receiver(m2m_changed, sender=Post.reposters.through)
+@receiver(m2m_changed, sender=Post.bookmarks.through)
+def bump_post_interaction_counters(sender, instance, action, reverse, pk_set, **kwargs):
+    """Likes, reposts and bookmarks change counters and viewer flags (posts.etags)"""
+    from .etags import bump_post_counters
+    if not reverse:
+        if action in ('post_add', 'post_remove', 'post_clear'):
+            bump_post_counters([instance.pk])
+    elif action in ('post_add', 'post_remove'):
+        bump_post_counters(pk_set)
+    elif action == 'pre_clear':
+        bump_post_counters(sender.objects.filter(user_id=instance.pk).values_list('post_id', flat=True))
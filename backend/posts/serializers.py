@@ -1,6 +1,11 @@
 from rest_framework import serializers
 from django.contrib.auth import get_user_model
+from core.loaders import BatchingListSerializer, get_loaders
+from users.caching import render_author_card
+from users.serializers import AuthorCardField
 from .models import Post, EvidenceFile, PostImage, Hashtag, ContentReport, PostAppeal, AppealEvidenceFile, Draft, DraftImage, ScheduledPost, ScheduledPostImage, Donation
+from .loaders import counter_target_id, images_loader, post_loader, prime_posts
+from .hydration import STUB_FIELDS
 
 User = get_user_model()
 
@@ -25,10 +30,10 @@ class PublicUserSerializer(serializers.ModelSerializer):
                  'website', 'verified_artist', 'followers_count', 'following_count']
     
     def get_followers_count(self, obj):
-        return obj.followers.count()
+        return get_loaders(self.context).named('users.followers_count').load(obj.id)
     
     def get_following_count(self, obj):
-        return obj.following.count()
+        return get_loaders(self.context).named('users.following_count').load(obj.id)
     
     def get_website(self, obj):
         # Only include website if it's not empty
@@ -54,100 +59,127 @@ class PostImageSerializer(serializers.ModelSerializer):
             return request.build_absolute_uri(obj.image.url) if request else obj.image.url
         return None
 
-class PostSerializer(serializers.ModelSerializer):
+class BatchedPostFieldsMixin:
     """
-    ⚠️ INTERNAL USE ONLY - Contains sensitive fields (evidence_files, scheduled_time, etc.)
-    This serializer exposes internal moderation and system data that should NOT be sent to users.
-    
-    For user-facing endpoints, use:
-    - UserPostSerializer (authenticated users)  
-    - PublicPostSerializer (unauthenticated users)
+    Post fields resolved through the request's loader registry (posts.loaders),
+    so rendering a page of posts costs a fixed number of queries.
     """
-    author = UserSerializer(read_only=True)
-    likes_count = serializers.SerializerMethodField()
-    reposts_count = serializers.SerializerMethodField()
-    replies_count = serializers.SerializerMethodField()
-    is_liked = serializers.SerializerMethodField()
-    is_reposted = serializers.SerializerMethodField()
-    is_bookmarked = serializers.SerializerMethodField()
-    referenced_post = serializers.SerializerMethodField()
-    evidence_files = EvidenceFileSerializer(many=True, read_only=True)
-    images = PostImageSerializer(many=True, read_only=True)
-    is_conversation_chain_valid = serializers.SerializerMethodField()
-    conversation_chain_invalid_reason = serializers.SerializerMethodField()
+    # None renders the compact cached author card (users.caching)
+    author_serializer_class = None
+    # Renders referenced posts that are neither deleted nor removed; assigned
+    # after the concrete serializers, since some of them render their own kind
+    referenced_post_serializer_class = None
+    # Fields that depend on the viewer or on other rows; every other field is
+    # part of the cacheable post body (see posts.hydration)
+    overlay_fields = (
+        'author', 'likes_count', 'reposts_count', 'replies_count',
+        'is_liked', 'is_reposted', 'is_bookmarked', 'referenced_post',
+        'is_conversation_chain_valid', 'conversation_chain_invalid_reason',
+    )
+
+    def prime_loaders(self, posts, loaders):
+        prime_posts(posts, loaders, full_authors=self.author_serializer_class is not None)
+
+    def prime_body_loaders(self, posts, loaders):
+        images_loader(loaders).defer_many(post.id for post in posts)
+
+    def body_representation(self, instance):
+        """Viewer-independent fields of the post, plus what the overlay reads"""
+        ret = {}
+        for field in self._readable_fields:
+            if field.field_name in self.overlay_fields:
+                continue
+            attribute = field.get_attribute(instance)
+            ret[field.field_name] = None if attribute is None else field.to_representation(attribute)
+        ret['_post'] = {name: getattr(instance, name) for name in STUB_FIELDS}
+        return ret
+
+    def hydrated_representation(self, body, stub):
+        """Cached body with the per-request fields filled in, in field order"""
+        if stub.is_deleted or stub.is_removed:
+            return {
+                'id': stub.id,
+                'is_deleted': stub.is_deleted,
+                'is_removed': stub.is_removed
+            }
+        request = self.context.get('request')
+        ret = {}
+        for field_name in self.fields:
+            if field_name in self.overlay_fields:
+                ret[field_name] = getattr(self, f'get_{field_name}')(stub)
+            elif field_name == 'images' and request is not None:
+                ret[field_name] = [
+                    {
+                        **image,
+                        'image': image['image'] and request.build_absolute_uri(image['image']),
+                        'image_url': image['image_url'] and request.build_absolute_uri(image['image_url']),
+                    }
+                    for image in body[field_name]
+                ]
+            else:
+                ret[field_name] = body[field_name]
+        return ret
+
+    def get_author(self, obj):
+        loaders = get_loaders(self.context)
+        if self.author_serializer_class is None:
+            card = loaders.named('users.author_card').load(obj.author_id)
+            return render_author_card(card, self.context.get('request'))
+        author = loaders.for_model(User).load(obj.author_id)
+        if author is None:
+            return None
+        return self.author_serializer_class(author, context=self.context).data
 
-    class Meta:
-        model = Post
-        fields = ['id', 'content', 'author', 'created_at', 'updated_at', 
-                 'likes_count', 'reposts_count', 'replies_count',
-                 'is_liked', 'is_reposted', 'is_bookmarked',
-                 'post_type', 'referenced_post', 'evidence_files', 'images',
-                 'conversation_chain', 'is_human_drawing', 'is_verified',
-                 'image', 'parent_post_author_handle', 'parent_post_author_username',
-                 'scheduled_time', 'is_conversation_chain_valid', 
-                 'conversation_chain_invalid_reason']
+    def get_images(self, obj):
+        images = images_loader(get_loaders(self.context)).load(obj.id)
+        return PostImageSerializer(images, many=True, context=self.context).data
 
+    # For reposts, counters and viewer flags are those of the original post
     def get_likes_count(self, obj):
-        # For reposts, use the original post's likes count
-        if obj.post_type == 'repost' and obj.referenced_post:
-            return obj.referenced_post.likes.count()
-        return obj.likes.count()
+        return get_loaders(self.context).named('posts.likes_count').load(counter_target_id(obj))
 
     def get_reposts_count(self, obj):
-        # For reposts, use the original post's reposts count
-        if obj.post_type == 'repost' and obj.referenced_post:
-            return obj.referenced_post.reposts.count()
-        return obj.reposts.count()
+        return get_loaders(self.context).named('posts.reposts_count').load(counter_target_id(obj))
 
     def get_replies_count(self, obj):
-        # For reposts, use the original post's replies count
-        if obj.post_type == 'repost' and obj.referenced_post:
-            return obj.referenced_post.replies.count()
-        return obj.replies.count()
+        return get_loaders(self.context).named('posts.replies_count').load(counter_target_id(obj))
 
-    def get_is_liked(self, obj):
-        request = self.context.get('request')
-        if not request or not request.user.is_authenticated:
+    def _viewer_flag(self, name, obj):
+        loaders = get_loaders(self.context)
+        if loaders.viewer is None:
             return False
-        # For reposts, check if the original post is liked
-        if obj.post_type == 'repost' and obj.referenced_post:
-            return obj.referenced_post.likes.filter(id=request.user.id).exists()
-        return obj.likes.filter(id=request.user.id).exists()
+        return loaders.named(name).load(counter_target_id(obj))
+
+    def get_is_liked(self, obj):
+        return self._viewer_flag('posts.liked_by_viewer', obj)
 
     def get_is_reposted(self, obj):
-        request = self.context.get('request')
-        if not request or not request.user.is_authenticated:
-            return False
-            
-        # For reposts, check if user has reposted the referenced post
-        if obj.post_type == 'repost' and obj.referenced_post:
-            return obj.referenced_post.reposters.filter(id=request.user.id).exists()
-            
-        # For original posts, check if user has reposted this post
-        return obj.reposters.filter(id=request.user.id).exists()
+        return self._viewer_flag('posts.reposted_by_viewer', obj)
 
     def get_is_bookmarked(self, obj):
-        request = self.context.get('request')
-        if not request or not request.user.is_authenticated:
-            return False
-        # For reposts, check if the original post is bookmarked
-        if obj.post_type == 'repost' and obj.referenced_post:
-            return obj.referenced_post.bookmarks.filter(id=request.user.id).exists()
-        return obj.bookmarks.filter(id=request.user.id).exists()
+        return self._viewer_flag('posts.bookmarked_by_viewer', obj)
 
     def get_referenced_post(self, obj):
-        if (obj.post_type == 'repost' or obj.post_type == 'quote') and obj.referenced_post:
-            # Check if referenced post is deleted or removed
-            if obj.referenced_post.is_deleted or obj.referenced_post.is_removed:
-                # Only return essential fields for deleted/removed posts
-                return {
-                    'id': obj.referenced_post.id,
-                    'is_deleted': obj.referenced_post.is_deleted,
-                    'is_removed': obj.referenced_post.is_removed
-                }
-            # Return the original post data using the same serializer to include all fields
-            return UserPostSerializer(obj.referenced_post, context=self.context).data
-        return None
+        if obj.post_type not in ('repost', 'quote') or not obj.referenced_post_id:
+            return None
+        referenced = post_loader(get_loaders(self.context)).load(obj.referenced_post_id)
+        if referenced is None:
+            return None
+        # Check if referenced post is deleted or removed
+        if referenced.is_deleted or referenced.is_removed:
+            # Only return essential fields for deleted/removed posts
+            return {
+                'id': referenced.id,
+                'is_deleted': referenced.is_deleted,
+                'is_removed': referenced.is_removed
+            }
+        return self.referenced_post_serializer_class(referenced, context=self.context).data
+
+    def _chain_posts(self, obj):
+        """Posts of the conversation chain other than obj, in chain order"""
+        chain_ids = [post_id for post_id in obj.conversation_chain if post_id != obj.id]
+        # Use all_objects to include deleted posts
+        return zip(chain_ids, post_loader(get_loaders(self.context)).load_many(chain_ids))
 
     def get_is_conversation_chain_valid(self, obj):
         """
@@ -157,14 +189,7 @@ class PostSerializer(serializers.ModelSerializer):
             return True  # No conversation chain or not a reply/repost/quote
         
         try:
-            from .models import Post
-            # Check each post in the conversation chain
-            for post_id in obj.conversation_chain:
-                if post_id == obj.id:  # Skip self
-                    continue
-                    
-                # Use all_objects to include deleted posts
-                chain_post = Post.all_objects.filter(id=post_id).first()
+            for _, chain_post in self._chain_posts(obj):
                 if chain_post and (chain_post.is_deleted or chain_post.is_removed):
                     return False
             return True
@@ -183,13 +208,8 @@ class PostSerializer(serializers.ModelSerializer):
             return None
             
         try:
-            from .models import Post
             # Find the first invalid post in the chain
-            for post_id in obj.conversation_chain:
-                if post_id == obj.id:  # Skip self
-                    continue
-                    
-                chain_post = Post.all_objects.filter(id=post_id).first()
+            for post_id, chain_post in self._chain_posts(obj):
                 if chain_post:
                     if chain_post.is_deleted:
                         return f"Post {post_id} has been deleted"
@@ -211,21 +231,57 @@ class PostSerializer(serializers.ModelSerializer):
         # Return full representation for normal posts
         return super().to_representation(instance)
 
+class PostSerializer(BatchedPostFieldsMixin, serializers.ModelSerializer):
+    """
+    ⚠️ INTERNAL USE ONLY - Contains sensitive fields (evidence_files, scheduled_time, etc.)
+    This serializer exposes internal moderation and system data that should NOT be sent to users.
+    
+    For user-facing endpoints, use:
+    - UserPostSerializer (authenticated users)  
+    - PublicPostSerializer (unauthenticated users)
+    """
+    author = serializers.SerializerMethodField()
+    likes_count = serializers.SerializerMethodField()
+    reposts_count = serializers.SerializerMethodField()
+    replies_count = serializers.SerializerMethodField()
+    is_liked = serializers.SerializerMethodField()
+    is_reposted = serializers.SerializerMethodField()
+    is_bookmarked = serializers.SerializerMethodField()
+    referenced_post = serializers.SerializerMethodField()
+    evidence_files = EvidenceFileSerializer(many=True, read_only=True)
+    images = serializers.SerializerMethodField()
+    is_conversation_chain_valid = serializers.SerializerMethodField()
+    conversation_chain_invalid_reason = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Post
+        fields = ['id', 'content', 'author', 'created_at', 'updated_at', 
+                 'likes_count', 'reposts_count', 'replies_count',
+                 'is_liked', 'is_reposted', 'is_bookmarked',
+                 'post_type', 'referenced_post', 'evidence_files', 'images',
+                 'conversation_chain', 'is_human_drawing', 'is_verified',
+                 'image', 'parent_post_author_handle', 'parent_post_author_username',
+                 'scheduled_time', 'is_conversation_chain_valid', 
+                 'conversation_chain_invalid_reason']
+        list_serializer_class = BatchingListSerializer
+
     def create(self, validated_data):
         validated_data['author'] = self.context['request'].user
         return super().create(validated_data)
 
-class PublicPostSerializer(serializers.ModelSerializer):
+class PublicPostSerializer(BatchedPostFieldsMixin, serializers.ModelSerializer):
     """
     Minimal, secure serializer for public posts (no authentication required)
     Only includes essential data needed for public landing page
     """
-    author = PublicUserSerializer(read_only=True)
+    author_serializer_class = PublicUserSerializer
+
+    author = serializers.SerializerMethodField()
     likes_count = serializers.SerializerMethodField()
     reposts_count = serializers.SerializerMethodField()
     replies_count = serializers.SerializerMethodField()
     referenced_post = serializers.SerializerMethodField()
-    images = PostImageSerializer(many=True, read_only=True)
+    images = serializers.SerializerMethodField()
     is_conversation_chain_valid = serializers.SerializerMethodField()
     conversation_chain_invalid_reason = serializers.SerializerMethodField()
 
@@ -239,100 +295,7 @@ class PublicPostSerializer(serializers.ModelSerializer):
                  'conversation_chain', 'is_human_drawing', 'is_verified',
                  'is_removed', 'is_deleted', 'is_conversation_chain_valid',
                  'conversation_chain_invalid_reason']
-
-    def get_likes_count(self, obj):
-        # For reposts, use the original post's likes count
-        if obj.post_type == 'repost' and obj.referenced_post:
-            return obj.referenced_post.likes.count()
-        return obj.likes.count()
-
-    def get_reposts_count(self, obj):
-        # For reposts, use the original post's reposts count
-        if obj.post_type == 'repost' and obj.referenced_post:
-            return obj.referenced_post.reposts.count()
-        return obj.reposts.count()
-
-    def get_replies_count(self, obj):
-        # For reposts, use the original post's replies count
-        if obj.post_type == 'repost' and obj.referenced_post:
-            return obj.referenced_post.replies.count()
-        return obj.replies.count()
-    
-    def get_referenced_post(self, obj):
-        if (obj.post_type == 'repost' or obj.post_type == 'quote') and obj.referenced_post:
-            # Check if referenced post is deleted or removed
-            if obj.referenced_post.is_deleted or obj.referenced_post.is_removed:
-                # Only return essential fields for deleted/removed posts
-                return {
-                    'id': obj.referenced_post.id,
-                    'is_deleted': obj.referenced_post.is_deleted,
-                    'is_removed': obj.referenced_post.is_removed
-                }
-            # Use PublicPostSerializer for normal referenced posts
-            return PublicPostSerializer(obj.referenced_post, context=self.context).data
-        return None
-
-    def get_is_conversation_chain_valid(self, obj):
-        """
-        Check if the conversation chain is valid (no deleted/removed posts in chain)
-        """
-        if not obj.conversation_chain or obj.post_type not in ['reply', 'repost', 'quote']:
-            return True  # No conversation chain or not a reply/repost/quote
-        
-        try:
-            from .models import Post
-            # Check each post in the conversation chain
-            for post_id in obj.conversation_chain:
-                if post_id == obj.id:  # Skip self
-                    continue
-                    
-                # Use all_objects to include deleted posts
-                chain_post = Post.all_objects.filter(id=post_id).first()
-                if chain_post and (chain_post.is_deleted or chain_post.is_removed):
-                    return False
-            return True
-        except Exception:
-            # If there's any error checking the chain, assume it's valid
-            return True
-
-    def get_conversation_chain_invalid_reason(self, obj):
-        """
-        Provide reason why conversation chain is invalid
-        """
-        if self.get_is_conversation_chain_valid(obj):
-            return None
-            
-        if not obj.conversation_chain:
-            return None
-            
-        try:
-            from .models import Post
-            # Find the first invalid post in the chain
-            for post_id in obj.conversation_chain:
-                if post_id == obj.id:  # Skip self
-                    continue
-                    
-                chain_post = Post.all_objects.filter(id=post_id).first()
-                if chain_post:
-                    if chain_post.is_deleted:
-                        return f"Post {post_id} has been deleted"
-                    elif chain_post.is_removed:
-                        return f"Post {post_id} has been removed"
-            return "Conversation chain contains deleted or removed posts"
-        except Exception:
-            return "Unable to verify conversation chain"
-
-    def to_representation(self, instance):
-        """Override to hide content for deleted/removed posts"""
-        if instance.is_deleted or instance.is_removed:
-            # Only return essential fields for deleted/removed posts
-            return {
-                'id': instance.id,
-                'is_deleted': instance.is_deleted,
-                'is_removed': instance.is_removed
-            }
-        # Return full representation for normal posts
-        return super().to_representation(instance)
+        list_serializer_class = BatchingListSerializer
 
 class HashtagSerializer(serializers.ModelSerializer):
     post_count = serializers.SerializerMethodField()
@@ -347,7 +310,7 @@ class HashtagSerializer(serializers.ModelSerializer):
 
 
 class ContentReportSerializer(serializers.ModelSerializer):
-    reporter = UserSerializer(read_only=True)
+    reporter = AuthorCardField(source='reporter_id')
     reported_post = serializers.SerializerMethodField()
     report_type_display = serializers.CharField(source='get_report_type_display', read_only=True)
     status_display = serializers.CharField(source='get_status_display', read_only=True)
@@ -392,7 +355,7 @@ class PostAppealSerializer(serializers.ModelSerializer):
     """
     Serializer for post appeals
     """
-    author = UserSerializer(read_only=True)
+    author = AuthorCardField(source='author_id')
     post = serializers.SerializerMethodField()
     evidence_files_rel = AppealEvidenceFileSerializer(many=True, read_only=True)
     status_display = serializers.CharField(source='get_status_display', read_only=True)
@@ -437,7 +400,7 @@ class DraftImageSerializer(serializers.ModelSerializer):
 
 
 class DraftSerializer(serializers.ModelSerializer):
-    author = UserSerializer(read_only=True)
+    author = AuthorCardField(source='author_id')
     images = DraftImageSerializer(many=True, read_only=True)
     quote_post = serializers.SerializerMethodField()
 
@@ -475,7 +438,7 @@ class ScheduledPostImageSerializer(serializers.ModelSerializer):
 
 
 class ScheduledPostSerializer(serializers.ModelSerializer):
-    author = UserSerializer(read_only=True)
+    author = AuthorCardField(source='author_id')
     images = ScheduledPostImageSerializer(many=True, read_only=True)
     quote_post = serializers.SerializerMethodField()
     status_display = serializers.CharField(source='get_status_display', read_only=True)
@@ -499,12 +462,12 @@ class ScheduledPostSerializer(serializers.ModelSerializer):
         validated_data['author'] = self.context['request'].user
         return super().create(validated_data) 
 
-class UserPostSerializer(serializers.ModelSerializer):
+class UserPostSerializer(BatchedPostFieldsMixin, serializers.ModelSerializer):
     """
     Secure serializer for authenticated users - excludes internal fields
     Includes user interaction fields (is_liked, is_reposted, etc.)
     """
-    author = UserSerializer(read_only=True)
+    author = serializers.SerializerMethodField()
     likes_count = serializers.SerializerMethodField()
     reposts_count = serializers.SerializerMethodField()
     replies_count = serializers.SerializerMethodField()
@@ -512,7 +475,7 @@ class UserPostSerializer(serializers.ModelSerializer):
     is_reposted = serializers.SerializerMethodField()
     is_bookmarked = serializers.SerializerMethodField()
     referenced_post = serializers.SerializerMethodField()
-    images = PostImageSerializer(many=True, read_only=True)
+    images = serializers.SerializerMethodField()
     is_conversation_chain_valid = serializers.SerializerMethodField()
     conversation_chain_invalid_reason = serializers.SerializerMethodField()
 
@@ -528,130 +491,13 @@ class UserPostSerializer(serializers.ModelSerializer):
                  'parent_post_author_handle', 'parent_post_author_username',
                  'scheduled_time', 'is_removed', 'is_deleted', 'is_conversation_chain_valid', 
                  'conversation_chain_invalid_reason']
+        list_serializer_class = BatchingListSerializer
 
-    def get_likes_count(self, obj):
-        # For reposts, use the original post's likes count
-        if obj.post_type == 'repost' and obj.referenced_post:
-            return obj.referenced_post.likes.count()
-        return obj.likes.count()
-
-    def get_reposts_count(self, obj):
-        # For reposts, use the original post's reposts count
-        if obj.post_type == 'repost' and obj.referenced_post:
-            return obj.referenced_post.reposts.count()
-        return obj.reposts.count()
-
-    def get_replies_count(self, obj):
-        # For reposts, use the original post's replies count
-        if obj.post_type == 'repost' and obj.referenced_post:
-            return obj.referenced_post.replies.count()
-        return obj.replies.count()
 
-    def get_is_liked(self, obj):
-        request = self.context.get('request')
-        if not request or not request.user.is_authenticated:
-            return False
-        # For reposts, check if the original post is liked
-        if obj.post_type == 'repost' and obj.referenced_post:
-            return obj.referenced_post.likes.filter(id=request.user.id).exists()
-        return obj.likes.filter(id=request.user.id).exists()
-
-    def get_is_reposted(self, obj):
-        request = self.context.get('request')
-        if not request or not request.user.is_authenticated:
-            return False
-            
-        # For reposts, check if user has reposted the referenced post
-        if obj.post_type == 'repost' and obj.referenced_post:
-            return obj.referenced_post.reposters.filter(id=request.user.id).exists()
-            
-        # For original posts, check if user has reposted this post
-        return obj.reposters.filter(id=request.user.id).exists()
-
-    def get_is_bookmarked(self, obj):
-        request = self.context.get('request')
-        if not request or not request.user.is_authenticated:
-            return False
-        # For reposts, check if the original post is bookmarked
-        if obj.post_type == 'repost' and obj.referenced_post:
-            return obj.referenced_post.bookmarks.filter(id=request.user.id).exists()
-        return obj.bookmarks.filter(id=request.user.id).exists()
-
-    def get_referenced_post(self, obj):
-        if (obj.post_type == 'repost' or obj.post_type == 'quote') and obj.referenced_post:
-            # Check if referenced post is deleted or removed
-            if obj.referenced_post.is_deleted or obj.referenced_post.is_removed:
-                # Only return essential fields for deleted/removed posts
-                return {
-                    'id': obj.referenced_post.id,
-                    'is_deleted': obj.referenced_post.is_deleted,
-                    'is_removed': obj.referenced_post.is_removed
-                }
-            # Use UserPostSerializer for normal referenced posts
-            return UserPostSerializer(obj.referenced_post, context=self.context).data
-        return None
-
-    def get_is_conversation_chain_valid(self, obj):
-        """
-        Check if the conversation chain is valid (no deleted/removed posts in chain)
-        """
-        if not obj.conversation_chain or obj.post_type not in ['reply', 'repost', 'quote']:
-            return True  # No conversation chain or not a reply/repost/quote
-        
-        try:
-            from .models import Post
-            # Check each post in the conversation chain
-            for post_id in obj.conversation_chain:
-                if post_id == obj.id:  # Skip self
-                    continue
-                    
-                # Use all_objects to include deleted posts
-                chain_post = Post.all_objects.filter(id=post_id).first()
-                if chain_post and (chain_post.is_deleted or chain_post.is_removed):
-                    return False
-            return True
-        except Exception:
-            # If there's any error checking the chain, assume it's valid
-            return True
-
-    def get_conversation_chain_invalid_reason(self, obj):
-        """
-        Provide reason why conversation chain is invalid
-        """
-        if self.get_is_conversation_chain_valid(obj):
-            return None
-            
-        if not obj.conversation_chain:
-            return None
-            
-        try:
-            from .models import Post
-            # Find the first invalid post in the chain
-            for post_id in obj.conversation_chain:
-                if post_id == obj.id:  # Skip self
-                    continue
-                    
-                chain_post = Post.all_objects.filter(id=post_id).first()
-                if chain_post:
-                    if chain_post.is_deleted:
-                        return f"Post {post_id} has been deleted"
-                    elif chain_post.is_removed:
-                        return f"Post {post_id} has been removed"
-            return "Conversation chain contains deleted or removed posts"
-        except Exception:
-            return "Unable to verify conversation chain"
-
-    def to_representation(self, instance):
-        """Override to hide content for deleted/removed posts"""
-        if instance.is_deleted or instance.is_removed:
-            # Only return essential fields for deleted/removed posts
-            return {
-                'id': instance.id,
-                'is_deleted': instance.is_deleted,
-                'is_removed': instance.is_removed
-            }
-        # Return full representation for normal posts
-        return super().to_representation(instance) 
+# Referenced posts are rendered with the user-facing serializers
+PostSerializer.referenced_post_serializer_class = UserPostSerializer
+PublicPostSerializer.referenced_post_serializer_class = PublicPostSerializer
+UserPostSerializer.referenced_post_serializer_class = UserPostSerializer
 
 
 class PostRemovalSerializer(serializers.ModelSerializer):
@@ -659,7 +505,7 @@ class PostRemovalSerializer(serializers.ModelSerializer):
     Special serializer for post removal notifications and dialogs
     Shows full post content to the author so they can see what was removed
     """
-    author = UserSerializer(read_only=True)
+    author = AuthorCardField(source='author_id')
     likes_count = serializers.SerializerMethodField()
     reposts_count = serializers.SerializerMethodField()
     replies_count = serializers.SerializerMethodField()
@@ -673,13 +519,13 @@ class PostRemovalSerializer(serializers.ModelSerializer):
                  'is_removed', 'is_deleted']
 
     def get_likes_count(self, obj):
-        return obj.likes.count()
+        return get_loaders(self.context).named('posts.likes_count').load(obj.id)
 
     def get_reposts_count(self, obj):
-        return obj.reposts.count()
+        return get_loaders(self.context).named('posts.reposts_count').load(obj.id)
 
     def get_replies_count(self, obj):
-        return obj.replies.count()
+        return get_loaders(self.context).named('posts.replies_count').load(obj.id)
 
     def to_representation(self, instance):
         """
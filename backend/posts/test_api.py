@@ -1,4 +1,8 @@
 from django.test import TestCase
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.core.cache import cache
+from rest_framework.test import APIRequestFactory
 from django.contrib.auth import get_user_model
 from django.urls import reverse
 from rest_framework.test import APIClient
@@ -7,6 +11,7 @@ from django.utils import timezone
 from datetime import timedelta
 import json
 from .models import Post, Hashtag, ContentReport, PostAppeal, Draft, ScheduledPost
+from .serializers import UserPostSerializer
 
 User = get_user_model()
 
@@ -399,6 +404,226 @@ class PostFeedAPITest(PostAPITestCase):
                 self.assertGreater(len(response_data), 0)
 
 
+class PostFeedQueryCountAPITest(PostAPITestCase):
+    """Test that rendering a feed page does not issue queries per post"""
+
+    def _add_posts(self, count):
+        for i in range(count):
+            original = Post.objects.create(author=self.user2, content=f'Original {i}')
+            original.likes.add(self.user1, self.user3)
+            original.bookmarks.add(self.user1)
+            Post.objects.create(author=self.user3, content=f'Quote {i}', post_type='quote', referenced_post=original)
+            Post.objects.create(author=self.user3, post_type='repost', referenced_post=original)
+
+    def _get_feed(self):
+        cache.clear()  # Compare cold renders so cached bodies and cards do not skew counts
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/posts/feed/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.json()['results'], len(queries)
+
+    def test_feed_query_count_does_not_grow_with_page(self):
+        """Test that a bigger page costs the same number of queries"""
+        self._add_posts(2)
+        small_page, small_queries = self._get_feed()
+        self._add_posts(3)
+        large_page, large_queries = self._get_feed()
+
+        self.assertGreater(len(large_page), len(small_page))
+        self.assertEqual(small_queries, large_queries)
+
+    def test_feed_batched_fields_match_data(self):
+        """Test that batched counters and viewer flags are still per post"""
+        self._add_posts(1)
+        results, _ = self._get_feed()
+        repost = next(post for post in results if post['post_type'] == 'repost')
+
+        self.assertEqual(repost['likes_count'], 2)
+        self.assertTrue(repost['is_liked'])
+        self.assertTrue(repost['is_bookmarked'])
+        self.assertEqual(repost['author']['id'], self.user3.id)
+        self.assertEqual(repost['referenced_post']['author']['id'], self.user2.id)
+
+
+class PostFeedHydrationAPITest(PostAPITestCase):
+    """Test the cached post bodies behind the timeline endpoints"""
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.quote = Post.objects.create(
+            author=self.user2, content='Quoting', post_type='quote', referenced_post=self.post1
+        )
+        self.post1.likes.add(self.user2)
+
+    def _feed(self):
+        response = self.client.get('/api/posts/feed/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return {post['id']: post for post in response.json()['results']}
+
+    def test_hydrated_feed_matches_serializer(self):
+        """Test that a cached page renders exactly like the serializer"""
+        self._feed()  # Warm the body cache
+        feed = self._feed()
+
+        request = APIRequestFactory().get('/api/posts/feed/')
+        request.user = self.user1
+        posts = Post.objects.filter(id__in=feed.keys())
+        expected = UserPostSerializer(posts, many=True, context={'request': request}).data
+        for post in json.loads(json.dumps(expected, default=str)):
+            self.assertEqual(json.loads(json.dumps(feed[post['id']], default=str)), post)
+
+    def test_edit_invalidates_cached_body(self):
+        """Test that saving a post replaces its cached body"""
+        self.assertEqual(self._feed()[self.post1.id]['content'], 'This is my first post #art')
+
+        self.post1.content = 'Edited content'
+        self.post1.save()
+
+        self.assertEqual(self._feed()[self.post1.id]['content'], 'Edited content')
+
+    def test_viewer_fields_are_not_cached(self):
+        """Test that counters and viewer flags stay live on cached bodies"""
+        self.assertFalse(self._feed()[self.post2.id]['is_liked'])
+
+        self.post2.likes.add(self.user1)
+        feed = self._feed()
+
+        self.assertTrue(feed[self.post2.id]['is_liked'])
+        self.assertEqual(feed[self.post2.id]['likes_count'], 1)
+        self.assertEqual(feed[self.quote.id]['referenced_post']['likes_count'], 1)
+
+    def test_posts_with_broken_chains_are_dropped_from_pages(self):
+        """Test that a post whose chain reaches a deleted post is left out of paged and unpaged lists"""
+        deleted = Post.objects.create(author=self.user2, content='Gone', is_deleted=True)
+        broken = Post.objects.create(
+            author=self.user2, content='Quoting the quote', post_type='quote', referenced_post=self.quote
+        )
+        broken.conversation_chain = [deleted.id, self.quote.id, broken.id]
+        broken.save()
+        broken.bookmarks.add(self.user1)
+        self.post2.bookmarks.add(self.user1)
+
+        self.assertNotIn(broken.id, self._feed())
+        self.assertIn(self.quote.id, self._feed())
+        response = self.client.get('/api/posts/bookmarked/')
+        self.assertEqual([post['id'] for post in response.json()], [self.post2.id])
+
+
+class PostConditionalGetAPITest(PostAPITestCase):
+    """Test ETags and If-None-Match on the post detail and trending endpoints"""
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.quote = Post.objects.create(
+            author=self.user2, content='Quoting', post_type='quote', referenced_post=self.post1
+        )
+        self.url = f'/api/posts/{self.user2.handle}/{self.quote.id}/'
+
+    def _revalidate(self, url, etag):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        return response, len(queries)
+
+    def test_unchanged_post_returns_304_without_serializing(self):
+        """Test that a revalidation only reads the post rows"""
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        etag = response['ETag']
+
+        response, queries = self._revalidate(self.url, etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response['ETag'], etag)
+        self.assertEqual(queries, 2)  # The quote row, then the quoted post row
+        self.assertEqual(response.content, b'')
+
+        plain_url = f'/api/posts/by-id/{self.post2.id}/'
+        etag = self.client.get(plain_url)['ETag']
+        response, queries = self._revalidate(plain_url, etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(queries, 1)
+
+    def test_etag_changes_with_counters_viewer_and_edits(self):
+        """Test that likes, other viewers and edits of the quoted post change the ETag"""
+        etag = self.client.get(self.url)['ETag']
+
+        self.post1.likes.add(self.user3)
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['referenced_post']['likes_count'], 1)
+        etag = response['ETag']
+
+        self.client.force_authenticate(user=self.user3)
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.data['referenced_post']['is_liked'])
+
+        self.client.force_authenticate(user=self.user1)
+        etag = self.client.get(self.url)['ETag']
+        self.post1.content = 'Edited content'
+        self.post1.save()
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['referenced_post']['content'], 'Edited content')
+
+    def test_deleted_post_is_not_revalidated(self):
+        """Test that a deleted post returns 404 even with a known ETag"""
+        etag = self.client.get(self.url)['ETag']
+        self.quote.is_deleted = True
+        self.quote.save()
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_trending_hashtags_returns_304_from_cache(self):
+        """Test that cached trending results are revalidated without queries"""
+        url = '/api/posts/trending_hashtags/'
+        etag = self.client.get(url)['ETag']
+
+        response, queries = self._revalidate(url, etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(queries, 0)
+
+        self.client.post('/api/posts/clear_trending_cache/')
+        cache.set('trending_hashtags:new_algorithm', [{'name': 'art', 'post_count': 1}], 300)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+
+class FastJSONRendererTest(PostAPITestCase):
+    """Test that the orjson renderer produces the same bytes as DRF's JSONRenderer"""
+
+    def test_matches_stdlib_renderer(self):
+        """Test datetimes, decimals, UUIDs and unicode are encoded identically"""
+        from decimal import Decimal
+        from uuid import uuid4
+        from rest_framework.renderers import JSONRenderer
+        from core.renderers import ORJSONRenderer
+
+        payload = {
+            'created_at': timezone.now(),
+            'day': timezone.now().date(),
+            'price': Decimal('12.50'),
+            'uuid': uuid4(),
+            'content': 'Unicode ✨ and a line\u2028separator',
+            'nested': [{'id': 1, 'flag': True, 'missing': None}],
+            1: 'integer key',
+        }
+        self.assertEqual(ORJSONRenderer().render(payload), JSONRenderer().render(payload))
+        self.assertEqual(ORJSONRenderer().render(None), b'')
+
+    def test_feed_response_uses_fast_renderer(self):
+        """Test that API responses are rendered by the orjson renderer"""
+        from core.renderers import ORJSONRenderer
+
+        response = self.client.get('/api/posts/feed/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIsInstance(response.accepted_renderer, ORJSONRenderer)
+        self.assertEqual(response['Content-Type'], 'application/json')
+        self.assertIn('results', json.loads(response.content))
+
+
 class PostModerationAPITest(PostAPITestCase):
     """Test content moderation functionality via API"""
     
@@ -425,6 +650,21 @@ class PostModerationAPITest(PostAPITestCase):
         ).first()
         self.assertIsNotNone(report)
 
+    def test_third_report_removes_post_and_queues_one_notification(self):
+        """Test that the post_removed notification goes through the queue once"""
+        from notifications.models import Notification, PendingNotification
+        url = f'/api/moderation/posts/{self.user2.handle}/{self.post2.id}/report/'
+
+        for report_type in ('spam', 'harassment', 'other', 'copyright'):
+            with self.captureOnCommitCallbacks(execute=True):
+                self.client.post(url, {'report_type': report_type}, format='json')
+
+        self.post2.refresh_from_db()
+        self.assertTrue(self.post2.is_removed)
+        removals = Notification.objects.filter(recipient=self.user2, notification_type='post_removed')
+        self.assertEqual(list(removals.values_list('post_id', flat=True)), [self.post2.id])
+        self.assertFalse(PendingNotification.objects.exists())
+
     def test_report_own_post_fails(self):
         """Test that users cannot report their own posts"""
         url = f'/api/moderation/posts/{self.user1.handle}/{self.post1.id}/report/'
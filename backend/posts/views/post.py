@@ -6,6 +6,9 @@ from rest_framework.permissions import IsAuthenticated, IsAdminUser, AllowAny
 from rest_framework.pagination import PageNumberPagination
 from ..models import Post, EvidenceFile, PostImage, User, Hashtag, ContentReport
 from ..serializers import HashtagSerializer
+from ..hydration import hydrate_posts
+from ..etags import get_post_state, post_etag
+from core.etags import make_etag, not_modified, viewer_key, with_etag
 from django.db import transaction
 from django.utils import timezone
 import mimetypes
@@ -13,7 +16,7 @@ from django.db.models import Q, Count, Sum, Max, Case, When, Value, DateTimeFiel
 from datetime import timedelta
 from django.core.cache import cache
 from django.http import Http404
-from notifications.services import create_like_notification, create_comment_notification, create_repost_notification
+from notifications.queue import enqueue_notification
 
 # Create your views here.
 
@@ -39,9 +42,7 @@ class PostViewSet(viewsets.ModelViewSet):
         # Only show published posts (not scheduled for future)
         queryset = Post.objects.filter(
             Q(scheduled_time__isnull=True) | Q(scheduled_time__lte=timezone.now())
-        ).select_related('author', 'referenced_post').prefetch_related(
-            'likes', 'bookmarks', 'reposts', 'replies'
-        )
+        ).select_related('author', 'referenced_post')
 
         # Filter out posts with 3+ reports (hidden from main timeline)
         posts_to_hide_from_timeline = ContentReport.get_posts_to_hide_from_timeline()
@@ -79,11 +80,8 @@ class PostViewSet(viewsets.ModelViewSet):
             Q(post_type='reply', parent_post__is_deleted=True)
         )
 
-        # Filter out posts with invalid conversation chains (replies/reposts/quotes with deleted/removed posts in chain)
-        # This is a more comprehensive approach that checks the entire conversation chain
-        posts_with_invalid_chains = self._get_posts_with_invalid_conversation_chains()
-        if posts_with_invalid_chains:
-            queryset = queryset.exclude(id__in=posts_with_invalid_chains)
+        # Posts with invalid conversation chains are dropped from each page of
+        # ids (_valid_chain_post_ids), not from the whole table
 
         # Filter by following if the user has following_only_preference enabled
         if self.request.user.following_only_preference:
@@ -105,40 +103,50 @@ class PostViewSet(viewsets.ModelViewSet):
         ).order_by('-effective_published_at')
         return final_queryset
 
-    def _get_posts_with_invalid_conversation_chains(self):
+    def _valid_chain_post_ids(self, post_ids):
         """
-        Helper method to identify posts with invalid conversation chains.
-        Returns a list of post IDs that should be excluded.
+        Drop the posts whose conversation chain includes a deleted or removed
+        post. Only the given posts and the posts of their chains are read, so
+        the cost follows the page size rather than the table.
         """
-        invalid_post_ids = []
-        
-        # Get all posts with conversation chains (replies, reposts, quotes)
-        posts_with_chains = Post.objects.filter(
-            Q(post_type__in=['reply', 'repost', 'quote']) & 
-            ~Q(conversation_chain__isnull=True) & 
-            ~Q(conversation_chain=[])
-        ).values('id', 'conversation_chain', 'post_type')
-        
-        for post_data in posts_with_chains:
-            post_id = post_data['id']
-            conversation_chain = post_data['conversation_chain']
-            
-            # Check each post in the conversation chain
-            for chain_post_id in conversation_chain:
-                if chain_post_id == post_id:  # Skip self
-                    continue
-                    
-                # Check if the chain post is deleted or removed
-                try:
-                    chain_post = Post.all_objects.filter(id=chain_post_id).first()
-                    if chain_post and (chain_post.is_deleted or chain_post.is_removed):
-                        invalid_post_ids.append(post_id)
-                        break  # No need to check other posts in this chain
-                except Exception:
-                    # If there's any error, assume the chain is valid
-                    continue
-        
-        return invalid_post_ids
+        chains = dict(
+            Post.all_objects.filter(id__in=post_ids, post_type__in=['reply', 'repost', 'quote'])
+            .exclude(conversation_chain__isnull=True).exclude(conversation_chain=[])
+            .values_list('id', 'conversation_chain')
+        )
+        chain_post_ids = {pk for post_id, chain in chains.items() for pk in chain if pk != post_id}
+        if not chain_post_ids:
+            return list(post_ids)
+        dead_post_ids = set(
+            Post.all_objects.filter(Q(is_deleted=True) | Q(is_removed=True), id__in=chain_post_ids)
+            .values_list('id', flat=True)
+        )
+        return [
+            post_id for post_id in post_ids
+            if not any(pk != post_id and pk in dead_post_ids for pk in chains.get(post_id, ()))
+        ]
+
+    def _post_ids(self, queryset):
+        return queryset.prefetch_related(None).values_list('id', flat=True)
+
+    def _paginate_post_ids(self, queryset, serializer_class):
+        """
+        Two-phase timeline page: paginate over post ids only, then hydrate the
+        page from the cached post bodies (see posts.hydration). Posts with
+        invalid conversation chains are dropped from the page, which may then
+        come back short. Returns None when pagination is not applied.
+        """
+        page = self.paginate_queryset(self._post_ids(queryset))
+        if page is None:
+            return None
+        post_ids = self._valid_chain_post_ids(list(page))
+        data = hydrate_posts(post_ids, serializer_class, {'request': self.request})
+        return self.get_paginated_response(data)
+
+    def _hydrate_post_ids(self, queryset, serializer_class):
+        """Unpaginated variant of _paginate_post_ids: the serialized data of every post"""
+        post_ids = self._valid_chain_post_ids(list(self._post_ids(queryset)))
+        return hydrate_posts(post_ids, serializer_class, {'request': self.request})
     
     def get_serializer_context(self):
         context = super().get_serializer_context()
@@ -183,8 +191,7 @@ class PostViewSet(viewsets.ModelViewSet):
             queryset = self.get_queryset()
             # Use secure UserPostSerializer instead of default PostSerializer
             from ..serializers import UserPostSerializer
-            serializer = UserPostSerializer(queryset, many=True, context={'request': request})
-            return Response(serializer.data)
+            return Response(self._hydrate_post_ids(queryset, UserPostSerializer))
         except Exception as e:
             print(f"❌ Error in list method: {str(e)}")
             return Response(
@@ -307,7 +314,7 @@ class PostViewSet(viewsets.ModelViewSet):
             reply.save()
             
             # Create notification for the comment
-            create_comment_notification(request.user, parent_post, reply)
+            enqueue_notification(request.user, parent_post.author, 'comment', post=parent_post, comment=reply)
             
             return Response(serializer.data, status=status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
@@ -346,7 +353,7 @@ class PostViewSet(viewsets.ModelViewSet):
             else:
                 target_post.likes.add(user)
                 # Create notification for the like
-                create_like_notification(user, target_post)
+                enqueue_notification(user, target_post.author, 'like', post=target_post)
                 return Response({'liked': True})
         except Exception as e:
             print(f"❌ Error in like action: {str(e)}")
@@ -385,7 +392,7 @@ class PostViewSet(viewsets.ModelViewSet):
                 created_at=timezone.now()   # Use current time for created_at
             )
             # Create notification for the repost
-            create_repost_notification(request.user, original_post)
+            enqueue_notification(request.user, original_post.author, 'repost', post=original_post)
             return Response({'status': 'reposted'})
 
     @action(detail=True, methods=['POST'])
@@ -461,13 +468,7 @@ class PostViewSet(viewsets.ModelViewSet):
             Q(is_removed=True) | Q(is_deleted=True)
         )
 
-        # Filter out posts with invalid conversation chains
-        posts_with_invalid_chains = self._get_posts_with_invalid_conversation_chains()
-        if posts_with_invalid_chains:
-            bookmarked_posts = bookmarked_posts.exclude(id__in=posts_with_invalid_chains)
-        
-        serializer = self.get_serializer(bookmarked_posts, many=True)
-        return Response(serializer.data)
+        return Response(self._hydrate_post_ids(bookmarked_posts, self.get_serializer_class()))
 
     @action(detail=True, methods=['POST'], permission_classes=[IsAdminUser])
     def verify_drawing(self, request, handle=None, pk=None):
@@ -519,28 +520,15 @@ class PostViewSet(viewsets.ModelViewSet):
                 'referenced_post',
                 'parent_post'
             ).prefetch_related(
-                'likes',
-                'bookmarks',
-                'reposts',
-                'replies',
                 'images'
             ).order_by('-created_at')
 
-            # Filter out replies with invalid conversation chains
-            posts_with_invalid_chains = self._get_posts_with_invalid_conversation_chains()
-            if posts_with_invalid_chains:
-                replies = replies.exclude(id__in=posts_with_invalid_chains)
-            
-            # Paginate the replies
+            # Paginate the reply ids, then drop replies with invalid conversation chains
             paginator = self.pagination_class()
-            paginated_replies = paginator.paginate_queryset(replies, request)
-            
-            # Set context for serializing replies
-            context = self.get_serializer_context()
-            context['many'] = True  # This ensures we get proper reply data
-            
+            reply_ids = self._valid_chain_post_ids(list(paginator.paginate_queryset(self._post_ids(replies), request)))
+
             # Serialize paginated replies with full data
-            replies_data = self.get_serializer(paginated_replies, many=True, context=context).data
+            replies_data = hydrate_posts(reply_ids, self.get_serializer_class(), {'request': request})
             
             # Get pagination response data
             pagination_data = paginator.get_paginated_response(replies_data).data
@@ -568,25 +556,34 @@ class PostViewSet(viewsets.ModelViewSet):
         try:
             # Check if post exists by ID first (including deleted posts)
             try:
-                post = Post.all_objects.get(id=pk)
+                state = get_post_state(pk)
+                if state is None:
+                    raise Post.DoesNotExist
 
                 # Check if the post is deleted or removed
-                if post.is_deleted or post.is_removed:
+                if state['is_deleted'] or state['is_removed']:
                     return Response(
                         {'error': 'This post has been deleted or removed'},
                         status=status.HTTP_404_NOT_FOUND
                     )
 
                 # Verify the handle matches (for security)
-                if post.author.handle != handle:
+                if state['author__handle'] != handle:
                     return Response(
                         {'error': 'Post not found'},
                         status=status.HTTP_404_NOT_FOUND
                     )
 
+                # Revalidations are answered before the post is serialized
+                etag = post_etag(state, self.get_serializer_class(), viewer_key(request))
+                response = not_modified(request, etag)
+                if response is not None:
+                    return response
+
                 try:
+                    post = Post.all_objects.get(id=pk)
                     serializer = self.get_serializer(post)
-                    return Response(serializer.data)
+                    return with_etag(Response(serializer.data), etag)
                 except Exception as serializer_error:
                     return Response(
                         {'error': f'Serializer error: {str(serializer_error)}'},
@@ -611,27 +608,34 @@ class PostViewSet(viewsets.ModelViewSet):
         Retrieve a post by ID only (for conversation chains)
         """
         try:
+            state = get_post_state(pk)
+            if state is None:
+                raise Post.DoesNotExist
+
+            # Check if the post is deleted or removed
+            if state['is_deleted'] or state['is_removed']:
+                return Response(
+                    {'error': 'This post has been deleted or removed'},
+                    status=status.HTTP_404_NOT_FOUND
+                )
+
+            # Revalidations are answered before the post is serialized
+            etag = post_etag(state, self.get_serializer_class(), viewer_key(request))
+            response = not_modified(request, etag)
+            if response is not None:
+                return response
+
             post = Post.all_objects.select_related(
                 'author',
                 'referenced_post',
                 'referenced_post__author',
                 'parent_post'
             ).prefetch_related(
-                'images',
-                'likes',
-                'bookmarks',
-                'reposts'
+                'images'
             ).get(id=pk)
             
-            # Check if the post is deleted or removed
-            if post.is_deleted or post.is_removed:
-                return Response(
-                    {'error': 'This post has been deleted or removed'},
-                    status=status.HTTP_404_NOT_FOUND
-                )
-            
             serializer = self.get_serializer(post)
-            return Response(serializer.data)
+            return with_etag(Response(serializer.data), etag)
         except Post.DoesNotExist:
             raise Http404("Post not found")
         except Exception as e:
@@ -694,29 +698,21 @@ class PostViewSet(viewsets.ModelViewSet):
             Q(is_removed=True) | Q(is_deleted=True)
         )
 
-        # Filter out posts with invalid conversation chains
-        posts_with_invalid_chains = self._get_posts_with_invalid_conversation_chains()
-        if posts_with_invalid_chains:
-            posts = posts.exclude(id__in=posts_with_invalid_chains)
-        
         return posts
 
     @action(detail=False, methods=['GET'], url_path='user/(?P<handle>[^/.]+)/posts')
     def user_posts(self, request, handle=None):
         posts = self.get_user_posts(handle)
         
-        # Apply pagination
-        page = self.paginate_queryset(posts)
-        if page is not None:
-            # Use secure UserPostSerializer instead of PostSerializer to exclude evidence_files
-            from ..serializers import UserPostSerializer
-            serializer = UserPostSerializer(page, many=True, context={'request': request})
-            return self.get_paginated_response(serializer.data)
-
         # Use secure UserPostSerializer instead of PostSerializer to exclude evidence_files
         from ..serializers import UserPostSerializer
-        serializer = UserPostSerializer(posts, many=True, context={'request': request})
-        return Response(serializer.data)
+
+        # Apply pagination
+        response = self._paginate_post_ids(posts, UserPostSerializer)
+        if response is not None:
+            return response
+
+        return Response(self._hydrate_post_ids(posts, UserPostSerializer))
 
     @action(detail=False, methods=['GET'])
     def feed(self, request):
@@ -744,21 +740,18 @@ class PostViewSet(viewsets.ModelViewSet):
                     Q(is_human_drawing=True)     # All human drawings (both verified and unverified)
                 ).exclude(post_type='reply')  # Exclude replies
 
-            page = self.paginate_queryset(queryset)
-            if page is not None:
-                # Use secure UserPostSerializer instead of default PostSerializer
-                from ..serializers import UserPostSerializer
-                serializer = UserPostSerializer(page, many=True, context={'request': request})
-                return self.get_paginated_response(serializer.data)
-
             # Use secure UserPostSerializer instead of default PostSerializer
             from ..serializers import UserPostSerializer
-            serializer = UserPostSerializer(queryset, many=True, context={'request': request})
+            response = self._paginate_post_ids(queryset, UserPostSerializer)
+            if response is not None:
+                return response
+
+            data = self._hydrate_post_ids(queryset, UserPostSerializer)
             return Response({
-                'count': len(serializer.data),
+                'count': len(data),
                 'next': None,
                 'previous': None,
-                'results': serializer.data
+                'results': data
             })
         except Exception as e:
             print(f"❌ Error in feed: {str(e)}")
@@ -786,21 +779,18 @@ class PostViewSet(viewsets.ModelViewSet):
                     Q(is_human_drawing=True, is_verified=True)  # Verified human drawings
                 )
 
-            page = self.paginate_queryset(queryset)
-            if page is not None:
-                # Use secure UserPostSerializer instead of default PostSerializer
-                from ..serializers import UserPostSerializer
-                serializer = UserPostSerializer(page, many=True, context={'request': request})
-                return self.get_paginated_response(serializer.data)
-
             # Use secure UserPostSerializer instead of default PostSerializer
             from ..serializers import UserPostSerializer
-            serializer = UserPostSerializer(queryset, many=True, context={'request': request})
+            response = self._paginate_post_ids(queryset, UserPostSerializer)
+            if response is not None:
+                return response
+
+            data = self._hydrate_post_ids(queryset, UserPostSerializer)
             return Response({
-                'count': len(serializer.data),
+                'count': len(data),
                 'next': None,
                 'previous': None,
-                'results': serializer.data
+                'results': data
             })
         except Exception as e:
             print(f"❌ Error in explore: {str(e)}")
@@ -830,11 +820,6 @@ class PostViewSet(viewsets.ModelViewSet):
             Q(author__handle__icontains=query)      # Handle contains the term
         ).select_related(
             'author'
-        ).prefetch_related(
-            'likes',
-            'bookmarks',
-            'reposts',
-            'hashtags'
         ).distinct().order_by('-created_at')
         
         # Filter out posts that the current user has reported (hide from their view)
@@ -872,21 +857,13 @@ class PostViewSet(viewsets.ModelViewSet):
             Q(is_removed=True) | Q(is_deleted=True)
         )
 
-        # Filter out posts with invalid conversation chains
-        posts_with_invalid_chains = self._get_posts_with_invalid_conversation_chains()
-        if posts_with_invalid_chains:
-            posts = posts.exclude(id__in=posts_with_invalid_chains)
-        
         # Apply pagination
-        paginator = self.pagination_class()
-        page = paginator.paginate_queryset(posts, request)
-        if page is not None:
-            serializer = self.get_serializer(page, many=True)
-            return paginator.get_paginated_response(serializer.data)
-        
+        response = self._paginate_post_ids(posts, self.get_serializer_class())
+        if response is not None:
+            return response
+
         # Fallback for when pagination is not applied
-        serializer = self.get_serializer(posts, many=True)
-        return Response(serializer.data)
+        return Response(self._hydrate_post_ids(posts, self.get_serializer_class()))
 
     @action(detail=True, methods=['GET'])
     def get_reply(self, request, handle=None, post_id=None, reply_id=None):
@@ -931,14 +908,17 @@ class PostViewSet(viewsets.ModelViewSet):
         
         # Try to get from cache first
         results = cache.get(cache_key)
-        if results is not None:
-            return Response({'results': results})
-            
-        # If not in cache, calculate
-        results = self._calculate_trending()
-        cache.set(cache_key, results, 300)  # Cache for 5 minutes
-        
-        return Response({'results': results})
+        if results is None:
+            # If not in cache, calculate
+            results = self._calculate_trending()
+            cache.set(cache_key, results, 300)  # Cache for 5 minutes
+
+        # The same for every viewer, so the ETag is just the cached results
+        etag = make_etag('trending', results)
+        response = not_modified(request, etag)
+        if response is not None:
+            return response
+        return with_etag(Response({'results': results}), etag)
 
     @action(detail=False, methods=['POST'])
     def calculate_trending(self, request):
@@ -1119,10 +1099,7 @@ class PostViewSet(viewsets.ModelViewSet):
                     'referenced_post__author',
                     'parent_post'
                 ).prefetch_related(
-                    'images',
-                    'likes',
-                    'bookmarks',
-                    'reposts'
+                    'images'
                 )
                 
                 # For conversation chain posts, we don't need to check the handle
@@ -1152,14 +1129,7 @@ class PostViewSet(viewsets.ModelViewSet):
             'parent_post',
             'parent_post__author'
         ).prefetch_related(
-            'images',
-            'likes',
-            'bookmarks',
-            'reposts',
-            'parent_post__images',
-            'parent_post__likes',
-            'parent_post__bookmarks',
-            'parent_post__reposts'
+            'images'
         ).order_by('-created_at')
         
         # Filter out posts that the current user has reported (hide from their view)
@@ -1197,23 +1167,15 @@ class PostViewSet(viewsets.ModelViewSet):
             Q(is_removed=True) | Q(is_deleted=True)
         )
 
-        # Filter out posts with invalid conversation chains
-        posts_with_invalid_chains = self._get_posts_with_invalid_conversation_chains()
-        if posts_with_invalid_chains:
-            replies = replies.exclude(id__in=posts_with_invalid_chains)
-        
-        # Apply pagination
-        page = self.paginate_queryset(replies)
-        if page is not None:
-            # Use secure UserPostSerializer instead of PostSerializer to exclude evidence_files
-            from ..serializers import UserPostSerializer
-            serializer = UserPostSerializer(page, many=True, context={'request': request})
-            return self.get_paginated_response(serializer.data)
-
         # Use secure UserPostSerializer instead of PostSerializer to exclude evidence_files
         from ..serializers import UserPostSerializer
-        serializer = UserPostSerializer(replies, many=True, context={'request': request})
-        return Response(serializer.data)
+
+        # Apply pagination
+        response = self._paginate_post_ids(replies, UserPostSerializer)
+        if response is not None:
+            return response
+
+        return Response(self._hydrate_post_ids(replies, UserPostSerializer))
 
     @action(detail=False, methods=['GET'], url_path='user/(?P<handle>[^/.]+)/media')
     def user_media(self, request, handle=None):
@@ -1258,15 +1220,9 @@ class PostViewSet(viewsets.ModelViewSet):
             Q(is_removed=True) | Q(is_deleted=True)
         )
 
-        # Filter out posts with invalid conversation chains
-        posts_with_invalid_chains = self._get_posts_with_invalid_conversation_chains()
-        if posts_with_invalid_chains:
-            media_posts = media_posts.exclude(id__in=posts_with_invalid_chains)
-        
         # Use secure UserPostSerializer instead of PostSerializer to exclude evidence_files
         from ..serializers import UserPostSerializer
-        serializer = UserPostSerializer(media_posts, many=True, context={'request': request})
-        return Response(serializer.data)
+        return Response(self._hydrate_post_ids(media_posts, UserPostSerializer))
 
     @action(detail=False, methods=['GET'], url_path='user/(?P<handle>[^/.]+)/human-art')
     def user_human_art(self, request, handle=None):
@@ -1317,15 +1273,9 @@ class PostViewSet(viewsets.ModelViewSet):
             Q(is_removed=True) | Q(is_deleted=True)
         )
 
-        # Filter out posts with invalid conversation chains
-        posts_with_invalid_chains = self._get_posts_with_invalid_conversation_chains()
-        if posts_with_invalid_chains:
-            human_art_posts = human_art_posts.exclude(id__in=posts_with_invalid_chains)
-        
         # Use secure UserPostSerializer instead of PostSerializer to exclude evidence_files
         from ..serializers import UserPostSerializer
-        serializer = UserPostSerializer(human_art_posts, many=True, context={'request': request})
-        return Response(serializer.data)
+        return Response(self._hydrate_post_ids(human_art_posts, UserPostSerializer))
 
     @action(detail=False, methods=['GET'], url_path='user/(?P<handle>[^/.]+)/likes')
     def user_likes(self, request, handle=None):
@@ -1369,15 +1319,9 @@ class PostViewSet(viewsets.ModelViewSet):
             Q(is_removed=True) | Q(is_deleted=True)
         )
 
-        # Filter out posts with invalid conversation chains
-        posts_with_invalid_chains = self._get_posts_with_invalid_conversation_chains()
-        if posts_with_invalid_chains:
-            liked_posts = liked_posts.exclude(id__in=posts_with_invalid_chains)
-        
         # Use secure UserPostSerializer instead of PostSerializer to exclude evidence_files
         from ..serializers import UserPostSerializer
-        serializer = UserPostSerializer(liked_posts, many=True, context={'request': request})
-        return Response(serializer.data)
+        return Response(self._hydrate_post_ids(liked_posts, UserPostSerializer))
 
     @action(detail=False, methods=['GET'], permission_classes=[AllowAny])
     def public(self, request):
@@ -1391,16 +1335,6 @@ class PostViewSet(viewsets.ModelViewSet):
             # Get all published posts (not scheduled for future), ordered by creation date
             queryset = Post.objects.filter(
                 Q(scheduled_time__isnull=True) | Q(scheduled_time__lte=timezone.now())
-            ).select_related(
-                'author',
-                'referenced_post',
-                'parent_post'
-            ).prefetch_related(
-                'likes',
-                'bookmarks',
-                'reposts',
-                'replies',
-                'images'
             ).exclude(
                 post_type='reply'  # Exclude replies from public view
             )
@@ -1433,11 +1367,6 @@ class PostViewSet(viewsets.ModelViewSet):
                 Q(is_removed=True) | Q(is_deleted=True)
             )
 
-            # Filter out posts with invalid conversation chains
-            posts_with_invalid_chains = self._get_posts_with_invalid_conversation_chains()
-            if posts_with_invalid_chains:
-                queryset = queryset.exclude(id__in=posts_with_invalid_chains)
-
             # Filter based on tab
             if tab == 'human-drawing':
                 queryset = queryset.filter(
@@ -1450,18 +1379,14 @@ class PostViewSet(viewsets.ModelViewSet):
             
             queryset = queryset.order_by('-created_at')
 
-            page = self.paginate_queryset(queryset)
-            if page is not None:
-                # Use PublicPostSerializer to include bio in author data
-                from ..serializers import PublicPostSerializer
-                serializer = PublicPostSerializer(page, many=True, context={'request': request})
-                return self.get_paginated_response(serializer.data)
-
-            # Use PublicPostSerializer to include bio in author data  
+            # Use PublicPostSerializer to include bio in author data
             from ..serializers import PublicPostSerializer
-            serializer = PublicPostSerializer(queryset, many=True, context={'request': request})
+            response = self._paginate_post_ids(queryset, PublicPostSerializer)
+            if response is not None:
+                return response
+
             return Response({
-                'results': serializer.data
+                'results': self._hydrate_post_ids(queryset, PublicPostSerializer)
             })
         except Exception as e:
             return Response(
@@ -1550,8 +1475,7 @@ class PostViewSet(viewsets.ModelViewSet):
                 donation = serializer.save()
                 
                 # Send notification to the artist
-                from notifications.services import create_donation_notification
-                create_donation_notification(request.user, post, donation)
+                enqueue_notification(request.user, post.author, 'donation', post=post, content_object=donation)
                 
                 return Response(serializer.data, status=status.HTTP_201_CREATED)
             
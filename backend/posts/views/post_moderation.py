@@ -6,7 +6,7 @@ from rest_framework.response import Response
 from rest_framework.pagination import PageNumberPagination
 from ..models import Post, ContentReport, PostAppeal, AppealEvidenceFile
 from ..serializers import PostAppealSerializer
-from notifications.services import create_report_received_notification, create_post_removed_notification
+from notifications.queue import enqueue_notification
 
 class PostModerationViewSet(viewsets.ViewSet):
     permission_classes = [IsAuthenticated]
@@ -79,7 +79,7 @@ class PostModerationViewSet(viewsets.ViewSet):
                 description=description
             )
             # Send notification to the reporter (User A) confirming their report was submitted
-            create_report_received_notification(request.user, post)
+            enqueue_notification(request.user, request.user, 'report_received', post=post)
             
             # Get updated report count
             report_count = ContentReport.get_report_count_for_post(post)
@@ -90,17 +90,15 @@ class PostModerationViewSet(viewsets.ViewSet):
                 post.is_removed = True
                 post.save()
                 try:
-                    # Only send notification if author hasn't been notified yet
-                    from notifications.models import Notification
-                    existing_notification = Notification.objects.filter(
-                        recipient=post.author,
-                        post=post,
-                        notification_type='post_removed'
-                    ).first()
+                    # Only send notification if author hasn't been notified (or queued) yet
+                    from notifications.models import Notification, PendingNotification
+                    already_notified = any(
+                        model.objects.filter(recipient=post.author, post=post, notification_type='post_removed').exists()
+                        for model in (Notification, PendingNotification)
+                    )
                     
-                    if not existing_notification:
-                        create_post_removed_notification(post)
-
+                    if not already_notified:
+                        enqueue_notification(None, post.author, 'post_removed', post=post)
                         
                 except Exception as e:
                     print(f"❌ Error sending post removal notification: {str(e)}")
@@ -0,0 +1,117 @@
+"""
+Cached user resolution for JWT authentication (HTTP and WebSocket).
+
+A valid access token only names a user id, and resolving it to a User used to
+cost a primary-key query on every request and socket connect. Users are now
+resolved through two tiers:
+
+- an in-process entry per user id, trusted for ``LOCAL_USER_TTL`` seconds
+  without any lookup
+- the shared cache, under a per-user version that is bumped whenever the user
+  is saved or deleted (password changes, deactivation, profile updates; see
+  the receivers in users.models), so stale rows are never served once the
+  short local TTL has passed
+
+Cached users are loaded without the password hash; the few code paths that
+read it (check_password) load it on access.
+"""
+import copy
+import threading
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+from core.versions import bump_versions, get_versions
+
+User = get_user_model()
+
+LOCAL_USER_TTL = 5  # seconds another process may serve a user after it changed
+AUTH_USER_TIMEOUT = 60 * 10
+
+_local_users = {}
+_local_lock = threading.Lock()
+
+
+def _version_key(user_id):
+    return f'auth_user_version:{user_id}'
+
+
+def _user_key(user_id, version):
+    return f'auth_user:{user_id}:{version}'
+
+
+def invalidate_cached_user(user_id):
+    """Stop serving the cached user (call after the user row changes)"""
+    bump_versions([_version_key(user_id)])
+    with _local_lock:
+        _local_users.pop(user_id, None)
+
+
+def clear_local_users():
+    with _local_lock:
+        _local_users.clear()
+
+
+def get_local_user(user_id):
+    """
+    The user from the in-process tier while its entry is fresh, or None:
+    no cache or database access, so async code can call it directly
+    """
+    with _local_lock:
+        entry = _local_users.get(user_id)
+    if entry is not None and entry[0] > time.monotonic():
+        return copy.copy(entry[2])
+    return None
+
+
+def get_cached_user(user_id):
+    """The user with this id, or None. Each call returns its own instance."""
+    now = time.monotonic()
+    with _local_lock:
+        entry = _local_users.get(user_id)
+    if entry is not None and entry[0] > now:
+        return copy.copy(entry[2])
+
+    key = _version_key(user_id)
+    version = get_versions([key])[key]
+    if entry is not None and entry[1] == version:
+        user = entry[2]
+    else:
+        user = cache.get(_user_key(user_id, version))
+        if user is None:
+            user = User.objects.defer('password').filter(id=user_id).first()
+            if user is None:
+                return None
+            cache.set(_user_key(user_id, version), user, AUTH_USER_TIMEOUT)
+    with _local_lock:
+        _local_users[user_id] = (now + LOCAL_USER_TTL, version, user)
+    return copy.copy(user)
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """JWTAuthentication resolving the token's user through get_cached_user"""
+
+    def get_user(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(_("Token contained no recognizable user identification"))
+
+        user = get_cached_user(user_id)
+        if user is None:
+            raise AuthenticationFailed(_("User not found"), code="user_not_found")
+
+        if api_settings.CHECK_USER_IS_ACTIVE and not user.is_active:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+
+        if api_settings.CHECK_REVOKE_TOKEN:
+            if validated_token.get(api_settings.REVOKE_TOKEN_CLAIM) != get_md5_hash_password(user.password):
+                raise AuthenticationFailed(_("The user's password has been changed."), code="password_changed")
+
+        return user
@@ -0,0 +1,126 @@
+"""
+Cached author cards: the compact public view of a user (id, username, handle,
+profile picture) shown next to posts and chat messages.
+
+Cards live in the shared cache under a per-user version that is bumped when
+the profile changes, with an in-process LRU in front of it. Rendering a page
+costs one multi-get of the versions; cards are only fetched from the shared
+cache (and then the database) when this process does not hold the current
+version yet.
+"""
+import threading
+from collections import OrderedDict
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+
+from core.versions import bump_versions, get_versions
+
+User = get_user_model()
+
+AUTHOR_CARD_TIMEOUT = 60 * 60 * 24  # 1 day
+LOCAL_CARD_LIMIT = 2048
+
+
+class _LocalCards:
+    """Small thread-safe LRU of (user_id, version) -> card"""
+
+    def __init__(self, limit):
+        self.limit = limit
+        self._cards = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            card = self._cards.get(key)
+            if card is not None:
+                self._cards.move_to_end(key)
+            return card
+
+    def set(self, key, card):
+        with self._lock:
+            self._cards[key] = card
+            self._cards.move_to_end(key)
+            while len(self._cards) > self.limit:
+                self._cards.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._cards.clear()
+
+
+_local_cards = _LocalCards(LOCAL_CARD_LIMIT)
+
+
+def _version_key(user_id):
+    return f'author_card_version:{user_id}'
+
+
+def _card_key(user_id, version):
+    return f'author_card:{user_id}:{version}'
+
+
+def bump_author_card(user_id):
+    """Retire every cached card of the user (call after a profile update)"""
+    bump_versions([_version_key(user_id)])
+
+
+def build_author_card(user):
+    """Card of a user row, with the profile picture URL left relative"""
+    profile_picture = None
+    if user.profile_picture and hasattr(user.profile_picture, 'url'):
+        profile_picture = user.profile_picture.url
+    return {
+        'id': user.id,
+        'username': user.username,
+        'handle': user.handle,
+        'profile_picture': profile_picture,
+    }
+
+
+def get_author_card_versions(user_ids):
+    keys = {_version_key(user_id): user_id for user_id in user_ids}
+    return {keys[key]: version for key, version in get_versions(keys).items()}
+
+
+def get_author_cards(user_ids):
+    """Return {user_id: card} for the given ids (unknown ids are left out)"""
+    user_ids = set(user_ids)
+    if not user_ids:
+        return {}
+    versions = get_author_card_versions(user_ids)
+
+    cards = {}
+    for user_id in user_ids:
+        card = _local_cards.get((user_id, versions.get(user_id)))
+        if card is not None:
+            cards[user_id] = card
+
+    missing = {
+        _card_key(user_id, versions.get(user_id)): user_id
+        for user_id in user_ids if user_id not in cards
+    }
+    if missing:
+        for key, card in cache.get_many(missing).items():
+            cards[missing[key]] = card
+            _local_cards.set((missing[key], versions.get(missing[key])), card)
+
+    unloaded = [user_id for user_id in user_ids if user_id not in cards]
+    if unloaded:
+        fresh = {}
+        for user in User.objects.filter(id__in=unloaded).only('id', 'username', 'handle', 'profile_picture'):
+            card = build_author_card(user)
+            cards[user.id] = card
+            fresh[_card_key(user.id, versions.get(user.id))] = card
+            _local_cards.set((user.id, versions.get(user.id)), card)
+        cache.set_many(fresh, AUTHOR_CARD_TIMEOUT)
+    return cards
+
+
+def render_author_card(card, request=None):
+    """Card as sent to clients, with an absolute profile picture URL"""
+    if card is None:
+        return None
+    if request is not None and card['profile_picture']:
+        return {**card, 'profile_picture': request.build_absolute_uri(card['profile_picture'])}
+    return dict(card)
@@ -0,0 +1,32 @@
+"""
+ETags for profile responses (see core.etags).
+
+A profile depends on the user row (``last_modified`` moves on every profile
+save), the follower/following counts and whether the viewer follows the
+user. Follows bump a per-user version on both sides (see the m2m_changed
+receiver in users.models).
+"""
+from django.contrib.auth import get_user_model
+
+from core.etags import make_etag
+from core.versions import bump_versions, get_versions
+
+User = get_user_model()
+
+
+def _follow_key(user_id):
+    return f'user_follow_version:{user_id}'
+
+
+def bump_follow_versions(user_ids):
+    bump_versions(_follow_key(user_id) for user_id in user_ids)
+
+
+def get_profile_state(handle):
+    """The ETag fields of the user with this handle, or None"""
+    return User.objects.filter(handle=handle).values('id', 'last_modified').first()
+
+
+def profile_etag(state, viewer):
+    follow_version = get_versions([_follow_key(state['id'])])[_follow_key(state['id'])]
+    return make_etag('profile', viewer, state['id'], state['last_modified'], follow_version)
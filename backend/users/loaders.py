@@ -0,0 +1,58 @@
+"""
+Batch loaders for user relationship data (see core.loaders).
+"""
+from django.contrib.auth import get_user_model
+from django.db.models import Count
+
+from core.loaders import register_loader
+from core.presence import online_user_ids
+from .caching import get_author_cards
+
+User = get_user_model()
+Follow = User.followers.through
+
+
+def _count_by(queryset, field, keys):
+    rows = queryset.filter(**{f'{field}__in': keys}).order_by().values(field).annotate(n=Count('pk'))
+    return {row[field]: row['n'] for row in rows}
+
+
+@register_loader('users.followers_count', default=0)
+def followers_count(keys, registry):
+    # user.followers.all() are the to_user rows of from_user=user
+    return _count_by(Follow.objects, 'from_user_id', keys)
+
+
+@register_loader('users.following_count', default=0)
+def following_count(keys, registry):
+    return _count_by(Follow.objects, 'to_user_id', keys)
+
+
+@register_loader('users.followed_by_viewer', default=False)
+def followed_by_viewer(keys, registry):
+    if registry.viewer is None:
+        return {}
+    followed = Follow.objects.filter(
+        from_user_id__in=keys, to_user_id=registry.viewer.pk
+    ).values_list('from_user_id', flat=True)
+    return {user_id: True for user_id in followed}
+
+
+@register_loader('users.author_card')
+def author_card(keys, registry):
+    return get_author_cards(keys)
+
+
+@register_loader('users.online', default=False)
+def online(keys, registry):
+    # One presence lookup for the whole page (core.presence)
+    return {user_id: True for user_id in online_user_ids(keys)}
+
+
+def prime_users(user_ids, loaders, counts=True):
+    """Queue the rows (and follower counts) of a page of users"""
+    user_ids = [user_id for user_id in user_ids if user_id is not None]
+    loaders.for_model(User).defer_many(user_ids)
+    if counts:
+        loaders.named('users.followers_count').defer_many(user_ids)
+        loaders.named('users.following_count').defer_many(user_ids)
@@ -0,0 +1,46 @@
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from rest_framework.test import APIRequestFactory
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.tokens import AccessToken
+
+from users.authentication import CachedJWTAuthentication, clear_local_users
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = 'Compare JWT authentication throughput with and without the cached user resolver'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=2000, help='Authentications per run')
+
+    def _rate(self, func, count):
+        start = time.perf_counter()
+        for _ in range(count):
+            func()
+        return count / (time.perf_counter() - start)
+
+    def handle(self, *args, **options):
+        count = options['requests']
+        # Run against a throwaway user and leave the database untouched
+        with transaction.atomic():
+            user = User.objects.create_user(
+                username='benchmark_auth', email='benchmark_auth@example.com',
+                password='benchmark-password', handle='benchmark_auth'
+            )
+            token = str(AccessToken.for_user(user))
+            request = APIRequestFactory().get('/api/users/me/', HTTP_AUTHORIZATION=f'Bearer {token}')
+            clear_local_users()
+
+            for name, authentication in (('uncached', JWTAuthentication()), ('cached', CachedJWTAuthentication())):
+                authenticated, _ = authentication.authenticate(request)
+                assert authenticated.id == user.id
+                rate = self._rate(lambda: authentication.authenticate(request), count)
+                self.stdout.write(f'HTTP {name}: {rate:,.0f} requests/s')
+
+            transaction.set_rollback(True)
+        self.stdout.write(self.style.SUCCESS('Benchmark complete'))
@@ -1,7 +1,7 @@
 from django.contrib.auth.models import AbstractUser
 from django.db import models
 from django.core.validators import RegexValidator
-from django.db.models.signals import pre_save
+from django.db.models.signals import pre_save, post_save, post_delete, m2m_changed
 from django.dispatch import receiver
 import os
 
@@ -106,3 +106,50 @@ def set_default_handle(sender, instance, **kwargs):
     """
     if not instance.handle:
         instance.handle = instance.username
+
+@receiver(post_save, sender=User)
+def bump_cached_author_card(sender, instance, **kwargs):
+    """
+    Profile updates (UserViewSet.me/update, admin edits) all save the user,
+    so cached author cards are versioned out here
+    """
+    update_fields = kwargs.get('update_fields')
+    if update_fields and set(update_fields) <= {'last_login'}:
+        return  # Logins do not change the card
+    from .caching import bump_author_card
+    bump_author_card(instance.id)
+
+
+@receiver([post_save, post_delete], sender=User)
+def invalidate_cached_profile(sender, instance, **kwargs):
+    """
+    The profile ETag follows last_modified, so the body cached by
+    UserViewSet.retrieve has to go with it or a fresh ETag serves a stale body
+    """
+    update_fields = kwargs.get('update_fields')
+    if update_fields and set(update_fields) <= {'last_login'}:
+        return  # Logins do not change the profile
+    from django.core.cache import cache
+    cache.delete(f'user_profile_{instance.id}')
+
+
+@receiver([post_save, post_delete], sender=User)
+def invalidate_cached_auth_user(sender, instance, **kwargs):
+    """
+    Password changes, deactivation and profile updates all save the user, so
+    the user cached for JWT authentication (users.authentication) is dropped
+    """
+    from .authentication import invalidate_cached_user
+    invalidate_cached_user(instance.id)
+
+
+@receiver(m2m_changed, sender=User.followers.through)
+def bump_profile_follow_versions(sender, instance, action, reverse, pk_set, **kwargs):
+    """Follows change counters and is_following on both profiles (users.etags)"""
+    from .etags import bump_follow_versions
+    if action in ('post_add', 'post_remove'):
+        bump_follow_versions({instance.pk, *pk_set})
+    elif action == 'pre_clear':
+        own_side, other_side = ('to_user_id', 'from_user_id') if reverse else ('from_user_id', 'to_user_id')
+        others = sender.objects.filter(**{own_side: instance.pk}).values_list(other_side, flat=True)
+        bump_follow_versions({instance.pk, *others})
@@ -3,6 +3,9 @@ from django.contrib.auth import get_user_model
 from django.contrib.auth.password_validation import validate_password
 from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
 from rest_framework.validators import UniqueValidator
+from core.loaders import BatchingListSerializer, get_loaders
+from .loaders import prime_users
+from .caching import render_author_card
 
 User = get_user_model()
 
@@ -75,8 +78,8 @@ class UserProfileSerializer(serializers.ModelSerializer):
         return False
 
 class UserSerializer(serializers.ModelSerializer):
-    followers_count = serializers.IntegerField(read_only=True)
-    following_count = serializers.IntegerField(read_only=True)
+    followers_count = serializers.SerializerMethodField()
+    following_count = serializers.SerializerMethodField()
     posts_count = serializers.IntegerField(read_only=True)
     is_following = serializers.SerializerMethodField()
 
@@ -93,13 +96,42 @@ class UserSerializer(serializers.ModelSerializer):
             'id', 'date_joined', 'followers_count', 'following_count',
             'posts_count', 'is_following', 'verified_artist'
         ]
+        list_serializer_class = BatchingListSerializer
+
+    def prime_loaders(self, users, loaders):
+        user_ids = [user.pk for user in users]
+        for user in users:
+            loaders.for_model(User).prime(user.pk, user)
+        prime_users(user_ids, loaders)
+        if loaders.viewer is not None:
+            loaders.named('users.followed_by_viewer').defer_many(user_ids)
+
+    def get_followers_count(self, obj):
+        return get_loaders(self.context).named('users.followers_count').load(obj.pk)
+
+    def get_following_count(self, obj):
+        return get_loaders(self.context).named('users.following_count').load(obj.pk)
 
     def get_is_following(self, obj):
         request = self.context.get('request')
         if request and request.user.is_authenticated:
-            return request.user in obj.followers.all()
+            return get_loaders(self.context).named('users.followed_by_viewer').load(obj.pk)
         return False
 
+class AuthorCardField(serializers.Field):
+    """
+    Read-only compact author card (see users.caching) for a user id source,
+    e.g. ``author = AuthorCardField(source='author_id')``
+    """
+
+    def __init__(self, **kwargs):
+        kwargs['read_only'] = True
+        super().__init__(**kwargs)
+
+    def to_representation(self, user_id):
+        card = get_loaders(self.context).named('users.author_card').load(user_id)
+        return render_author_card(card, self.context.get('request'))
+
 class ChangePasswordSerializer(serializers.Serializer):
     current_password = serializers.CharField(required=True)
     new_password = serializers.CharField(required=True)
@@ -1,9 +1,21 @@
+from unittest import mock
 from django.test import TestCase
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.core.cache import cache
+from asgiref.sync import async_to_sync
+from rest_framework.test import APIClient, APIRequestFactory
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.tokens import AccessToken
+from chat.middleware import get_user_from_jwt
 from django.contrib.auth import get_user_model
 from django.core.exceptions import ValidationError
 from django.db import IntegrityError
 from django.utils import timezone
 from datetime import timedelta
+from .authentication import CachedJWTAuthentication, clear_local_users, get_cached_user
+from .caching import get_author_cards
+from .views import UserViewSet
 
 User = get_user_model()
 
@@ -551,3 +563,177 @@ class UserModelTest(TestCase):
         
         # Test that handle was auto-generated
         self.assertEqual(superuser.handle, 'admin')
+
+
+class AuthorCardCacheTest(TestCase):
+    """Test cases for the cached author cards"""
+
+    def setUp(self):
+        cache.clear()
+        self.authors = [
+            User.objects.create_user(
+                username=f'author{i}',
+                email=f'author{i}@example.com',
+                password='testpass123',
+                handle=f'author{i}'
+            )
+            for i in range(20)
+        ]
+        self.author_ids = [author.id for author in self.authors]
+
+    def test_card_fields(self):
+        """Test that a card carries the compact public fields"""
+        card = get_author_cards([self.authors[0].id])[self.authors[0].id]
+        self.assertEqual(card, {
+            'id': self.authors[0].id,
+            'username': 'author0',
+            'handle': 'author0',
+            'profile_picture': None,
+        })
+
+    def test_warm_cards_cost_one_multi_get(self):
+        """Test that 20 warm cards cost no queries and a single multi-get"""
+        get_author_cards(self.author_ids)
+
+        with mock.patch('users.caching.cache.get_many', wraps=cache.get_many) as get_many:
+            with CaptureQueriesContext(connection) as queries:
+                cards = get_author_cards(self.author_ids)
+
+        self.assertEqual(len(cards), 20)
+        self.assertEqual(len(queries), 0)
+        self.assertEqual(get_many.call_count, 1)
+
+    def test_profile_update_bumps_card(self):
+        """Test that updating the profile through the API replaces the card"""
+        author = self.authors[0]
+        get_author_cards([author.id])
+
+        client = APIClient()
+        client.force_authenticate(user=author)
+        response = client.patch('/api/users/me/', {'username': 'renamed'}, format='json')
+        self.assertEqual(response.status_code, 200)
+
+        self.assertEqual(get_author_cards([author.id])[author.id]['username'], 'renamed')
+
+
+class ProfileConditionalGetTest(TestCase):
+    """Test ETags and If-None-Match on the profile endpoint"""
+
+    def setUp(self):
+        cache.clear()
+        self.viewer = User.objects.create_user(
+            username='viewer', email='viewer@example.com', password='testpass123', handle='viewer'
+        )
+        self.artist = User.objects.create_user(
+            username='artist', email='artist@example.com', password='testpass123', handle='artist'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.viewer)
+        self.url = f'/api/users/handle/{self.artist.handle}/'
+
+    def test_unchanged_profile_returns_304_with_one_query(self):
+        """Test that a revalidation only reads the user row"""
+        etag = self.client.get(self.url)['ETag']
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(len(queries), 1)
+
+    def test_follow_and_profile_update_change_etag(self):
+        """Test that follows and profile edits are never answered with 304"""
+        etag = self.client.get(self.url)['ETag']
+
+        self.client.post(f'/api/users/handle/{self.artist.handle}/follow/')
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        etag = response['ETag']
+
+        self.artist.bio = 'New bio'
+        self.artist.save()
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_profile_edit_serves_new_body_on_revalidation(self):
+        """Test that an edit is not answered from the cached profile body"""
+        etag = self.client.get(self.url)['ETag']
+
+        artist_client = APIClient()
+        artist_client.force_authenticate(user=self.artist)
+        artist_client.patch('/api/users/me/', {'bio': 'New bio'}, format='json')
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['bio'], 'New bio')
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_etag_is_per_viewer(self):
+        """Test that another viewer does not match the ETag"""
+        etag = self.client.get(self.url)['ETag']
+
+        self.client.force_authenticate(user=self.artist)
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+
+class CachedJWTAuthenticationTest(TestCase):
+    """Test the cached user resolver behind JWT authentication"""
+
+    def setUp(self):
+        cache.clear()
+        clear_local_users()
+        self.user = User.objects.create_user(
+            username='reader', email='reader@example.com', password='old-password-123', handle='reader'
+        )
+        self.token = str(AccessToken.for_user(self.user))
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.token}')
+        self.request = APIRequestFactory().get('/', HTTP_AUTHORIZATION=f'Bearer {self.token}')
+
+    def test_user_is_resolved_without_queries_once_cached(self):
+        """Test that repeated authentications skip the user query"""
+        authentication = CachedJWTAuthentication()
+        first, _ = authentication.authenticate(self.request)
+        with self.assertNumQueries(0):
+            second, _ = authentication.authenticate(self.request)
+        self.assertEqual(second, self.user)
+        self.assertIsNot(first, second)
+
+    def test_profile_update_and_deactivation_invalidate(self):
+        """Test that saving the user drops the cached copy"""
+        authentication = CachedJWTAuthentication()
+        authentication.authenticate(self.request)
+
+        self.user.bio = 'Updated bio'
+        self.user.save()
+        user, _ = authentication.authenticate(self.request)
+        self.assertEqual(user.bio, 'Updated bio')
+
+        self.user.is_active = False
+        self.user.save()
+        with self.assertRaises(AuthenticationFailed):
+            authentication.authenticate(self.request)
+
+    def test_change_password_through_cached_user(self):
+        """Test that the password check still sees the real hash"""
+        CachedJWTAuthentication().authenticate(self.request)
+        request = APIRequestFactory().post('/', {
+            'current_password': 'old-password-123',
+            'new_password': 'new-password-456',
+        }, format='json', HTTP_AUTHORIZATION=f'Bearer {self.token}')
+        response = UserViewSet.as_view({'post': 'change_password'})(request)
+        self.assertEqual(response.status_code, 200)
+
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.check_password('new-password-456'))
+        self.assertEqual(get_cached_user(self.user.id).bio, self.user.bio)
+
+    def test_websocket_resolver_uses_cache(self):
+        """Test that socket auth resolves users through the same cache"""
+        get_cached_user(self.user.id)
+        with self.assertNumQueries(0):
+            user = async_to_sync(get_user_from_jwt)(self.token)
+        self.assertEqual(user, self.user)
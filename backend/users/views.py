@@ -7,6 +7,7 @@ from rest_framework.pagination import PageNumberPagination
 from rest_framework_simplejwt.tokens import RefreshToken
 from django.contrib.auth import get_user_model
 from django.shortcuts import get_object_or_404
+from django.http import Http404
 from django.db.models import Q, Count, F
 from .serializers import (
     UserCreateSerializer, 
@@ -17,12 +18,14 @@ from .serializers import (
 )
 from posts.serializers import PostSerializer
 from posts.models import Post
-from notifications.services import create_follow_notification
+from notifications.queue import enqueue_notification
 from notifications.models import Notification
 from notifications.serializers import NotificationSerializer
 from django.utils import timezone
 from datetime import timedelta
 from django.core.cache import cache
+from core.etags import not_modified, viewer_key, with_etag
+from .etags import get_profile_state, profile_etag
 
 User = get_user_model()
 
@@ -57,7 +60,16 @@ class UserViewSet(viewsets.ModelViewSet):
         return User.objects.all().prefetch_related('followers', 'following')
 
     def retrieve(self, request, handle=None):
-        user = get_object_or_404(User, handle=handle)
+        # Answer revalidations from the row timestamp and follow version alone
+        state = get_profile_state(handle)
+        if state is None:
+            raise Http404('No User matches the given query.')
+        etag = profile_etag(state, viewer_key(request))
+        response = not_modified(request, etag)
+        if response is not None:
+            return response
+
+        user = get_object_or_404(User, id=state['id'])
         
         # Try cache first
         cache_key = f'user_profile_{user.id}'
@@ -65,7 +77,7 @@ class UserViewSet(viewsets.ModelViewSet):
         if cached_profile:
             # Update is_following status (user-specific)
             cached_profile['is_following'] = request.user in user.followers.all()
-            return Response(cached_profile)
+            return with_etag(Response(cached_profile), etag)
         
         # Fallback to database
         serializer = self.get_serializer(user)
@@ -74,7 +86,7 @@ class UserViewSet(viewsets.ModelViewSet):
         # Cache for 5 minutes
         cache.set(cache_key, profile_data, 300)
         
-        return Response(profile_data)
+        return with_etag(Response(profile_data), etag)
 
     def follow(self, request, handle=None):
         """
@@ -88,7 +100,7 @@ class UserViewSet(viewsets.ModelViewSet):
         else:
             user.followers.add(request.user)
             # Create notification for the follow
-            create_follow_notification(request.user, user)
+            enqueue_notification(request.user, user, 'follow')
         
         # Invalidate cache for both users
         cache.delete(f'user_profile_{user.id}')
@@ -125,10 +137,6 @@ class UserViewSet(viewsets.ModelViewSet):
                 'referenced_post',
                 'parent_post'
             ).prefetch_related(
-                'likes',
-                'bookmarks',
-                'reposts',
-                'replies',
                 'evidence_files'
             ).order_by('-created_at')
             
@@ -244,7 +244,7 @@ export class NotificationsComponent implements OnInit, OnDestroy, AfterViewInit
   markGroupAsRead(notification: GroupedNotification) {
     if (!notification.is_read) {
       // Mark the entire group as read
-      this.notificationService.markGroupAsRead(notification.notification_ids).subscribe({
+      this.notificationService.markGroupAsRead([notification.id]).subscribe({
         error: () => {
           // Handle error if needed
         }
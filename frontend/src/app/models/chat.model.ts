@@ -10,10 +10,17 @@ export interface Message {
   is_read: boolean;
 }
 
+export interface MessageSearchResult extends Message {
+  conversation_id: number;
+  // HTML with the message text escaped and the matches wrapped in <mark>
+  snippet: string;
+}
+
 export interface Conversation {
   id: number;
   participants: User[];
   other_participant: User;
+  other_participant_online?: boolean;
   last_message: Message | null;
   unread_count: number;
   created_at: string;
@@ -25,6 +32,7 @@ export interface ConversationDetail {
   id: number;
   participants: User[];
   other_participant: User;
+  other_participant_online?: boolean;
   messages: Message[];
   created_at: string;
   updated_at: string;
@@ -32,9 +40,10 @@ export interface ConversationDetail {
 }
 
 export interface ChatMessage {
-  type: 'chat_message' | 'typing_indicator';
+  type: 'chat_message' | 'typing_indicator' | 'read_receipt';
   message?: Message;
   user_id?: number;
   username?: string;
   is_typing?: boolean;
+  last_read_message_id?: number;
 } 
\ No newline at end of file
@@ -32,4 +32,4 @@ export interface AuthResponse {
 }
 
 export { User } from './user.model';
-export { Message, Conversation, ConversationDetail, ChatMessage } from './chat.model'; 
\ No newline at end of file
+export { Message, MessageSearchResult, Conversation, ConversationDetail, ChatMessage } from './chat.model';
\ No newline at end of file
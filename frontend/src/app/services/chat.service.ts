@@ -3,7 +3,7 @@ import { HttpClient } from '@angular/common/http';
 import { Observable, BehaviorSubject } from 'rxjs';
 import { tap } from 'rxjs/operators';
 import { environment } from '../../environments/environment';
-import { Conversation, ConversationDetail, Message, ChatMessage } from '../models';
+import { Conversation, ConversationDetail, Message, MessageSearchResult, ChatMessage } from '../models';
 import { webSocket, WebSocketSubject } from 'rxjs/webSocket';
 import { AuthService } from './auth.service';
 import { ChatNotificationService } from './chat-notification.service';
@@ -32,6 +32,7 @@ export class ChatService {
     conversations: Conversation[];
     timestamp: number;
   } | null = null;
+  private nextConversationsUrl: string | null = null;
   
   // Public observables
   public conversations$ = this.conversationsSubject.asObservable();
@@ -55,8 +56,11 @@ export class ChatService {
   }
 
   // Conversation API methods
-  getConversations(): Observable<Conversation[]> {
-    return this.http.get<Conversation[]>(`${this.apiUrl}/conversations/`);
+  // The inbox is cursor-paginated by last activity; pass a page's `next` URL to continue
+  getConversations(pageUrl?: string): Observable<{next: string | null, previous: string | null, results: Conversation[]}> {
+    return this.http.get<{next: string | null, previous: string | null, results: Conversation[]}>(
+      pageUrl || `${this.apiUrl}/conversations/`
+    );
   }
 
   getConversation(conversationId: number): Observable<ConversationDetail> {
@@ -79,8 +83,26 @@ export class ChatService {
     return this.http.post<Message>(`${this.apiUrl}/conversations/${conversationId}/send_message/`, formData);
   }
 
-  getMessages(conversationId: number): Observable<{results: Message[], count: number}> {
-    return this.http.get<{results: Message[], count: number}>(`${this.apiUrl}/conversations/${conversationId}/messages/`);
+  // Newest messages first; pass the oldest loaded message id to page back through history
+  getMessages(conversationId: number, beforeId?: number): Observable<{results: Message[], has_more: boolean}> {
+    const params: {[param: string]: string} = beforeId ? { before_id: beforeId.toString() } : {};
+    return this.http.get<{results: Message[], has_more: boolean}>(
+      `${this.apiUrl}/conversations/${conversationId}/messages/`, { params }
+    );
+  }
+
+  // Newest hits first; pass the last hit's id to fetch older ones
+  searchMessages(query: string, conversationId?: number, beforeId?: number): Observable<{results: MessageSearchResult[], has_more: boolean}> {
+    const params: {[param: string]: string} = { q: query };
+    if (conversationId) {
+      params['conversation_id'] = conversationId.toString();
+    }
+    if (beforeId) {
+      params['before_id'] = beforeId.toString();
+    }
+    return this.http.get<{results: MessageSearchResult[], has_more: boolean}>(
+      `${this.apiUrl}/messages/search/`, { params }
+    );
   }
 
   markConversationAsRead(conversationId: number): Observable<any> {
@@ -197,7 +219,10 @@ export class ChatService {
     }
 
     this.getConversations().subscribe({
-      next: (conversations) => {
+      next: (page) => {
+        const conversations = page.results;
+        this.nextConversationsUrl = page.next;
+
         // Cache the conversations
         this.cacheConversations(conversations);
         
@@ -212,6 +237,34 @@ export class ChatService {
     });
   }
 
+  // Append the next page of the inbox, if there is one
+  loadMoreConversations() {
+    if (!this.nextConversationsUrl) {
+      return;
+    }
+
+    this.getConversations(this.nextConversationsUrl).subscribe({
+      next: (page) => {
+        this.nextConversationsUrl = page.next;
+        const known = new Set(this.conversationsSubject.value.map(conv => conv.id));
+        const conversations = [
+          ...this.conversationsSubject.value,
+          ...page.results.filter(conv => !known.has(conv.id))
+        ];
+        this.cacheConversations(conversations);
+        this.conversationsSubject.next(conversations);
+        this.preloadConversationsData(page.results);
+      },
+      error: (error) => {
+        console.error('❌ Error loading more conversations:', error);
+      }
+    });
+  }
+
+  hasMoreConversations(): boolean {
+    return !!this.nextConversationsUrl;
+  }
+
   // X-style preloading: Load conversation details and recent messages for instant access
   private preloadConversationsData(conversations: Conversation[]) {
     conversations.forEach((conv, index) => {
@@ -295,6 +348,27 @@ export class ChatService {
     });
   }
 
+  // Prepend the page of messages before the oldest loaded one; emits whether more remain
+  loadOlderMessages(conversationId: number): Observable<boolean> {
+    // Messages are held oldest first; optimistic ones are only ever appended
+    const oldest = this.messagesSubject.value[0];
+    return new Observable<boolean>(observer => {
+      this.getMessages(conversationId, oldest?.id).subscribe({
+        next: (response) => {
+          if (this.currentConversationId === conversationId) {
+            this.messagesSubject.next([...response.results.reverse(), ...this.messagesSubject.value]);
+          }
+          observer.next(response.has_more);
+          observer.complete();
+        },
+        error: (error) => {
+          console.error('❌ ChatService: Error loading older messages:', error);
+          observer.error(error);
+        }
+      });
+    });
+  }
+
   addMessage(message: Message) {
     const currentMessages = this.messagesSubject.value;
     
@@ -413,6 +487,18 @@ export class ChatService {
           this.typingUsersSubject.next(updatedTyping);
         }
         break;
+
+      case 'read_receipt':
+        // Another participant read up to a message: our messages up to it are read
+        if (this.currentConversationId === conversationId && message.last_read_message_id &&
+            message.user_id !== this.getCurrentUserId()) {
+          const lastReadId = message.last_read_message_id;
+          const currentUserId = this.getCurrentUserId();
+          this.messagesSubject.next(this.messagesSubject.value.map(msg =>
+            msg.sender.id === currentUserId && msg.id <= lastReadId && !msg.is_read ? { ...msg, is_read: true } : msg
+          ));
+        }
+        break;
     }
   }
 
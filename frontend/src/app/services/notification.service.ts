@@ -44,6 +44,7 @@ export interface Notification {
 }
 
 export interface GroupedNotification {
+  id: number;
   notification_type: 'like' | 'comment' | 'follow' | 'repost' | 'donation' | 'report_received' | 'post_removed' | 'appeal_approved' | 'appeal_rejected' | 'art_verified';
   post?: {
     id: number;
@@ -75,9 +76,16 @@ export interface GroupedNotification {
     profile_picture: string | null;
     handle: string;
   }>;
+  users_count: number;
+  total_count: number;
   latest_time: string;
   is_read: boolean;
-  notification_ids: number[];
+}
+
+export interface MarkAsReadResult {
+  group_id: number | null;
+  group_is_read: boolean;
+  unread_count: number;
 }
 
 @Injectable({
@@ -86,6 +94,8 @@ export interface GroupedNotification {
 export class NotificationService {
   private apiUrl = `${environment.apiUrl}/api/notifications`;
   private socket$?: WebSocketSubject<any>;
+  // Newest notification received over the socket, replayed from on reconnect
+  private lastNotificationId = 0;
   private unreadCount = new BehaviorSubject<number>(0);
   unreadCount$ = this.unreadCount.asObservable();
 
@@ -116,6 +126,7 @@ export class NotificationService {
         this.loadUnreadCount();
       } else {
         this.disconnectWebSocket();
+        this.lastNotificationId = 0;
         // Clear cache when user logs out
         this.clearNotificationsCache();
       }
@@ -155,7 +166,11 @@ export class NotificationService {
     }
 
     // Use query parameter for token authentication like chat service
-    const wsUrl = environment.apiUrl.replace(/^http/, 'ws') + `/ws/notifications/?token=${token}`;
+    let wsUrl = environment.apiUrl.replace(/^http/, 'ws') + `/ws/notifications/?token=${token}`;
+    // After a reconnect the server replays what we missed in one batch frame
+    if (this.lastNotificationId) {
+      wsUrl += `&since=${this.lastNotificationId}`;
+    }
     
     try {
       this.socket$ = webSocket({
@@ -182,27 +197,21 @@ export class NotificationService {
     this.socket$.subscribe({
       next: (message) => {
 
-        // Handle incoming notifications
-        if (message.type === 'notification') {
-          this.unreadCount.next(this.unreadCount.value + 1);
-          
-          // Emit the notification event for other services to handle
-          const notification: Notification = {
-            id: message.id,
-            sender: message.sender,
-            notification_type: message.notification_type,
-            post: message.post,
-            comment: message.comment,
-            is_read: false,
-            created_at: message.created_at
-          };
-          
-          this.notificationEvents.next(notification);
-          
-          // Note: WebSocket notifications are individual, not grouped.
-          // The grouping logic is handled by the HTTP GET list endpoint.
-          // For real-time updates, we'll need to re-fetch the grouped notifications
-          // or implement client-side grouping. For now, we'll just emit the event.
+        // The server pushes the unread count whenever it changes
+        if (message.type === 'unread_count') {
+          this.unreadCount.next(message.count);
+        } else if (message.type === 'notification') {
+          this.handleNotificationFrame(message);
+        } else if (message.type === 'notification_batch') {
+          // Replays and bursts arrive as one frame
+          message.notifications.forEach((notification: any) => this.handleNotificationFrame(notification));
+          if (message.unread_count !== undefined) {
+            this.unreadCount.next(message.unread_count);
+          }
+          if (message.truncated) {
+            // Some notifications were left out; the list must be refetched
+            this.clearNotificationsCache();
+          }
         } else {
           // Unknown message type - ignore
         }
@@ -218,6 +227,28 @@ export class NotificationService {
     });
   }
 
+  private handleNotificationFrame(message: any) {
+    this.lastNotificationId = Math.max(this.lastNotificationId, message.id);
+
+    // Emit the notification event for other services to handle
+    const notification: Notification = {
+      id: message.id,
+      sender: message.sender,
+      notification_type: message.notification_type,
+      post: message.post,
+      comment: message.comment,
+      is_read: false,
+      created_at: message.created_at
+    };
+
+    this.notificationEvents.next(notification);
+
+    // Note: WebSocket notifications are individual, not grouped.
+    // The grouping logic is handled by the HTTP GET list endpoint.
+    // For real-time updates, we'll need to re-fetch the grouped notifications
+    // or implement client-side grouping. For now, we'll just emit the event.
+  }
+
   private disconnectWebSocket() {
     if (this.socket$) {
       this.socket$.complete();
@@ -272,33 +303,33 @@ export class NotificationService {
     );
   }
 
-  markAsRead(notificationId: number): Observable<void> {
-    return this.http.post<void>(`${this.apiUrl}/${notificationId}/mark_as_read/`, {}).pipe(
-      tap(() => {
-        // Update the global list
+  markAsRead(notificationId: number): Observable<MarkAsReadResult> {
+    return this.http.post<MarkAsReadResult>(`${this.apiUrl}/${notificationId}/mark_as_read/`, {}).pipe(
+      tap(result => {
+        // Update the group of the notification in the global list
         const currentNotifications = this.notifications.getValue();
-        const updatedNotifications = currentNotifications.map(notification => 
-          notification.notification_ids.includes(notificationId)
-            ? { ...notification, is_read: true }
+        const updatedNotifications = currentNotifications.map(notification =>
+          notification.id === result.group_id
+            ? { ...notification, is_read: result.group_is_read }
             : notification
         );
         // Ensure image URLs are processed
         const processedNotifications = updatedNotifications.map(notification => this.addImageUrls(notification));
         this.notifications.next(processedNotifications);
-        
-        // Update unread count
-        this.refreshUnreadCount();
+
+        // The response carries the new count, so it holds even if the socket push is missed
+        this.unreadCount.next(result.unread_count);
       })
     );
   }
 
-  markGroupAsRead(notificationIds: number[]): Observable<void> {
-    return this.http.post<void>(`${this.apiUrl}/mark_group_as_read/`, { notification_ids: notificationIds }).pipe(
+  markGroupAsRead(groupIds: number[]): Observable<void> {
+    return this.http.post<void>(`${this.apiUrl}/mark_group_as_read/`, { group_ids: groupIds }).pipe(
       tap(() => {
         // Update the global list
         const currentNotifications = this.notifications.getValue();
         const updatedNotifications = currentNotifications.map(notification => 
-          notification.notification_ids.some(id => notificationIds.includes(id))
+          groupIds.includes(notification.id)
             ? { ...notification, is_read: true }
             : notification
         );
@@ -306,8 +337,10 @@ export class NotificationService {
         const processedNotifications = updatedNotifications.map(notification => this.addImageUrls(notification));
         this.notifications.next(processedNotifications);
         
-        // Update unread count
-        this.refreshUnreadCount();
+        // The new unread count is pushed over the socket; ask for it only when offline
+        if (!this.socket$) {
+          this.refreshUnreadCount();
+        }
       })
     );
   }
@@ -324,8 +357,10 @@ export class NotificationService {
         const processedNotifications = updatedNotifications.map(notification => this.addImageUrls(notification));
         this.notifications.next(processedNotifications);
         
-        // Update unread count
-        this.refreshUnreadCount();
+        // The new unread count is pushed over the socket; ask for it only when offline
+        if (!this.socket$) {
+          this.refreshUnreadCount();
+        }
       })
     );
   }